@@ -0,0 +1,2 @@
+"""Arc2Phi 的命令行入口及批量转换流程。
+"""
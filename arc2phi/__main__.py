@@ -0,0 +1,7 @@
+"""该模块使 Arc2Phi 可以通过 python -m arc2phi 运行。
+"""
+import sys
+
+from arc2phi.cli import main
+
+sys.exit(main())
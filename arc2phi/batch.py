@@ -0,0 +1,368 @@
+"""这个模块用来批量转换整个曲包中的 Arcaea 谱面。
+
+每个谱面文件与其所在文件夹中的音频文件组成一个转换任务，由进程池并行执行。
+每完成一个任务，其结果即追加写入输出文件夹中的任务清单，因此中断后再次运行时将跳过已完成的谱面。
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import nullcontext
+from typing import NamedTuple
+
+from arcaea.assets import ConversionContext
+from arcaea.assets.profiler import Profiler, phase, profile
+from arcaea.chartparser import parse_chart
+
+CHART_EXTENSION = ".aff"
+AUDIO_EXTENSIONS = (".ogg", ".wav", ".mp3")
+MANIFEST_FILE = "manifest.jsonl"
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+DONE = "done"
+FAILED = "failed"
+
+# 批量转换中额外统计的阶段
+PHASE_PARSE = "parse_chart"
+PHASE_EXPORT = "export"
+
+
+class ConversionJob(NamedTuple):
+    """一个谱面转换任务。
+
+    chart 为谱面文件相对曲包文件夹的路径，同时也是该任务在任务清单中的标识。
+    """
+
+    chart: str
+    chart_path: str
+    audio_path: str
+    output_dir: str
+    chart_hash: str
+
+
+class JobResult(NamedTuple):
+    """一个谱面转换任务的结果。
+
+    diagnostics 为该谱面中每个存在问题的 Timing Group 中各类问题的数量，参见 ParsedChart.diagnostics。
+    失败的任务没有诊断结果，diagnostics 为 None，写入任务清单时记为空字典。
+    profile 为启用统计时该任务的各阶段耗时和计数，参见 Profiler.to_dict。它不会写入任务清单。
+    """
+
+    chart: str
+    chart_hash: str
+    status: str
+    notes: int
+    seconds: float
+    error: str
+    diagnostics: dict = None
+    profile: dict = None
+
+
+def _find_audio(directory: str, file_names: list[str]) -> str:
+    """该函数用来在谱面所在的文件夹中查找音频文件，优先使用 Arcaea 曲包中的 base.ogg。
+
+    Args:
+        directory (str): 谱面所在的文件夹路径。
+        file_names (list[str]): 该文件夹中的所有文件名。
+
+    Returns:
+        str: 音频文件的路径。没有找到时返回空字符串。
+    """
+    audio_names = sorted(name for name in file_names if name.lower().endswith(AUDIO_EXTENSIONS))
+    if "base.ogg" in audio_names:
+        return os.path.join(directory, "base.ogg")
+    return os.path.join(directory, audio_names[0]) if audio_names else ""
+
+
+def file_hash(path: str) -> str:
+    """该函数用来计算文件内容的哈希值，以判断谱面在两次运行之间是否被修改。
+
+    Args:
+        path (str): 文件路径。
+
+    Returns:
+        str: 文件内容的 SHA-256 值。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_jobs(songs_dir: str, output_dir: str) -> Iterator[ConversionJob]:
+    """该函数用来在曲包文件夹中查找所有谱面文件与音频文件的组合。
+
+    Args:
+        songs_dir (str): 曲包文件夹路径，其中每首歌曲的谱面和音频位于同一个文件夹中。
+        output_dir (str): 输出文件夹路径。每个谱面的转换结果写入其中与谱面相对路径相同（不含扩展名）的文件夹。
+
+    Yields:
+        ConversionJob: 按路径排序的转换任务。
+    """
+    for directory, directory_names, file_names in os.walk(songs_dir):
+        directory_names.sort()
+        audio_path = _find_audio(directory, file_names)
+        for file_name in sorted(file_names):
+            if not file_name.lower().endswith(CHART_EXTENSION):
+                continue
+            chart_path = os.path.join(directory, file_name)
+            chart = os.path.relpath(chart_path, songs_dir).replace(os.sep, "/")
+            yield ConversionJob(
+                chart, chart_path, audio_path, os.path.join(output_dir, os.path.splitext(chart)[0]),
+                file_hash(chart_path))
+
+
+def read_manifest(manifest_path: str) -> dict[str, dict]:
+    """该函数用来读取任务清单中每个谱面最后一次的转换结果。
+
+    被中断时写入了一半的最后一行将被忽略。
+
+    Args:
+        manifest_path (str): 任务清单文件路径。
+
+    Returns:
+        dict[str, dict]: 键为谱面相对路径，值为其最后一次的转换结果。
+    """
+    entries = {}
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, "r", encoding="utf-8") as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry["chart"]] = entry
+    return entries
+
+
+def _init_worker(memory_limit: int, log_level: int):
+    """该函数用来初始化进程池中的每个进程：限制其可以使用的内存，并设置其日志级别。
+
+    每个进程同时只执行一个任务，因此内存限制即为每个任务的内存上限。内存限制仅在支持 resource 模块的系统上生效。
+
+    Args:
+        memory_limit (int): 内存上限（字节）。为 None 时不限制。
+        log_level (int): 子进程中的日志级别，与主进程相同。
+    """
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger().setLevel(log_level)
+    if memory_limit is None:
+        return
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def convert_job(
+    job: ConversionJob, context_settings: dict = None, profiling: bool = False, trace_memory: bool = False
+) -> JobResult:
+    """该函数用来执行一个谱面转换任务：解析谱面，并将解析结果写入输出文件夹。
+
+    歌曲总时长从谱面所在文件夹中的 song_total_time.txt 读取。该函数不会抛出异常，任何错误都将记录在返回的结果中。
+
+    Args:
+        job (ConversionJob): 转换任务。
+        context_settings (dict, optional): 其余的谱面转换设定，参见 ConversionContext.__init__。
+        profiling (bool, optional): 是否统计该任务各阶段的耗时和计数。
+        trace_memory (bool, optional): 统计时是否同时统计每个阶段的内存峰值。
+
+    Returns:
+        JobResult: 该任务的结果。
+    """
+    start_time = time.perf_counter()
+    try:
+        with profile(trace_memory) if profiling else nullcontext() as profiler:
+            context = ConversionContext.from_file(
+                os.path.join(os.path.dirname(job.chart_path), "song_total_time.txt"), **(context_settings or {}))
+            with open(job.chart_path, "r", encoding="utf-8-sig") as chart_file, phase(PHASE_PARSE) as record:
+                parsed_chart = parse_chart(chart_file, context)
+                record.add_notes(len(parsed_chart))
+            with phase(PHASE_EXPORT):
+                parsed_chart.export(job.output_dir)
+    except MemoryError:
+        return JobResult(job.chart, job.chart_hash, FAILED, 0, time.perf_counter() - start_time, "超出内存上限")
+    except Exception as error:  # pylint: disable=broad-except
+        return JobResult(
+            job.chart, job.chart_hash, FAILED, 0, time.perf_counter() - start_time, f"{type(error).__name__}: {error}")
+    return JobResult(
+        job.chart, job.chart_hash, DONE, len(parsed_chart), time.perf_counter() - start_time, "",
+        {str(tg_num): issues for tg_num, issues in parsed_chart.diagnostics.items()},
+        profiler.to_dict() if profiler is not None else None)
+
+
+class BatchConverter:
+    """该类用来在进程池中批量执行谱面转换任务，并维护可续传的任务清单。
+    """
+
+    def __init__(
+        self, output_dir: str, workers: int = None, memory_limit: int = None, context_settings: dict = None,
+        resume: bool = True, profiling: bool = False, trace_memory: bool = False
+    ) -> None:
+        """该函数用来创建一个批量转换器。
+
+        Args:
+            output_dir (str): 输出文件夹路径，任务清单也写入该文件夹。
+            workers (int, optional): 进程池中的进程数。未给出时使用 CPU 核心数。为 1 时在当前进程中依次执行。
+            memory_limit (int, optional): 每个任务的内存上限（字节）。未给出时不限制。
+            context_settings (dict, optional): 其余的谱面转换设定，参见 ConversionContext.__init__。
+            resume (bool, optional): 是否跳过任务清单中已完成且谱面未被修改的任务。
+            profiling (bool, optional): 是否统计每个任务各阶段的耗时和计数，参见 BatchConverter.export_profile。
+            trace_memory (bool, optional): 统计时是否同时统计每个阶段的内存峰值。
+        """
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit
+        self.context_settings = context_settings or {}
+        self.resume = resume
+        self.profiling = profiling
+        self.trace_memory = trace_memory
+        self.manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        self.results: list[JobResult] = []
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    def pending_jobs(self, jobs: Iterable[ConversionJob]) -> list[ConversionJob]:
+        """该函数用来筛选出尚未完成的任务。
+
+        Args:
+            jobs (Iterable[ConversionJob]): 全部任务。
+
+        Returns:
+            list[ConversionJob]: 需要执行的任务。
+        """
+        jobs = list(jobs)
+        if not self.resume:
+            return jobs
+        finished = read_manifest(self.manifest_path)
+        pending = [
+            job for job in jobs
+            if finished.get(job.chart, {}).get("status") != DONE or finished[job.chart]["chart_hash"] != job.chart_hash]
+        self.skipped += len(jobs) - len(pending)
+        return pending
+
+    def run(self, jobs: Iterable[ConversionJob]) -> list[JobResult]:
+        """该函数用来执行全部尚未完成的任务，并在每个任务完成时报告进度和吞吐量。
+
+        Args:
+            jobs (Iterable[ConversionJob]): 全部任务。
+
+        Returns:
+            list[JobResult]: 本次执行的任务的结果，按完成顺序排列。
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        pending = self.pending_jobs(jobs)
+        start_time = time.perf_counter()
+        if not self.resume and os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+            for result in self._execute(pending):
+                entry = result._asdict()
+                del entry["profile"]
+                entry["diagnostics"] = entry["diagnostics"] or {}
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                self.results.append(result)
+                self.elapsed = time.perf_counter() - start_time
+                self._report_progress(result, len(pending))
+        self.elapsed = time.perf_counter() - start_time
+        return self.results
+
+    def _execute(self, jobs: list[ConversionJob]) -> Iterator[JobResult]:
+        if self.workers == 1 and self.memory_limit is None:
+            for job in jobs:
+                yield convert_job(job, self.context_settings, self.profiling, self.trace_memory)
+            return
+        # 进程池会加载 multiprocessing，只在需要时导入，以免拖慢 lint 等不需要进程池的子命令的启动
+        from concurrent.futures.process import (  # pylint: disable=import-outside-toplevel
+            BrokenProcessPool, ProcessPoolExecutor
+        )
+
+        def pool(workers: int) -> ProcessPoolExecutor:
+            return ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(self.memory_limit, logging.getLogger().getEffectiveLevel()))
+
+        queue = list(reversed(jobs))
+        while queue:
+            suspects: list[ConversionJob] = []
+            with pool(self.workers) as executor:
+                # 同时提交的任务数有上限，使任务清单和内存占用都不会随曲包大小增长
+                running: dict[Future, ConversionJob] = {}
+                while (queue or running) and not suspects:
+                    while queue and len(running) < 2 * self.workers:
+                        job = queue.pop()
+                        running[executor.submit(
+                            convert_job, job, self.context_settings, self.profiling, self.trace_memory)] = job
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            suspects.append(job)
+                            continue
+                        yield result
+                # 一个子进程意外退出时，进程池中所有未完成的任务都会失败，无法得知是哪一个任务导致的
+                suspects.extend(running.values())
+            # 在新的进程池中逐个单独执行这些任务，只有单独执行时仍使进程退出的任务才记为失败
+            for job in suspects:
+                with pool(1) as executor:
+                    future = executor.submit(convert_job, job, self.context_settings, self.profiling, self.trace_memory)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        yield JobResult(job.chart, job.chart_hash, FAILED, 0, 0.0, "转换进程意外退出")
+
+    def _report_progress(self, result: JobResult, total: int):
+        finished = len(self.results)
+        message = f"完成 {result.chart}（{result.notes} 个 Note，耗时 {result.seconds:.2f}s）"
+        if result.status == FAILED:
+            message = f"转换 {result.chart} 时失败：{result.error}"
+        logger.log(
+            logging.WARNING if result.status == FAILED else logging.INFO, "[%d/%d] %s，当前速度 %.2f 个谱面/s",
+            finished, total, message, finished / max(self.elapsed, 1e-9))
+
+    def summary(self) -> str:
+        """该函数用来生成本次批量转换的吞吐量报告。
+
+        Returns:
+            str: 吞吐量报告。
+        """
+        done = [result for result in self.results if result.status == DONE]
+        notes = sum(result.notes for result in done)
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"共转换 {len(done)} 个谱面，失败 {len(self.results) - len(done)} 个，跳过已完成的 {self.skipped} 个。"
+            f"总耗时 {self.elapsed:.2f}s，平均 {len(self.results) / elapsed:.2f} 个谱面/s，{notes / elapsed:.0f} 个 Note/s。")
+
+    def export_profile(self, file: str):
+        """该函数用来将本次批量转换的统计结果写入 JSON 文件。
+
+        写入的内容包括所有任务各阶段统计的总和（total），以及每个任务的统计（jobs，键为谱面相对路径）。
+        其中 wall_time 和 cpu_time 为各任务之和，max_rss 为各进程最大常驻内存中的最大值。
+
+        Args:
+            file (str): 写入的文件路径。
+        """
+        total = Profiler()
+        jobs = {}
+        for result in self.results:
+            if result.profile is not None:
+                total.merge_dict(result.profile)
+                jobs[result.chart] = result.profile
+        with open(file, "w", encoding="utf-8") as profile_file:
+            json.dump({
+                "elapsed": self.elapsed,
+                "workers": self.workers,
+                "total": total.to_dict(),
+                "jobs": jobs,
+            }, profile_file, ensure_ascii=False, indent=2)
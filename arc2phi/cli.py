@@ -0,0 +1,230 @@
+"""这个模块用来解析 Arc2Phi 的命令行参数。
+
+用法示例：
+
+    python -m arc2phi convert songs -o output -j 16 --memory-limit 2048
+    python -m arc2phi preview songs/song/2.aff -o preview.mp4 --size 1280x720
+    python -m arc2phi lint songs --errors-only
+    python -m arc2phi serve --port 8765 --workers 4
+"""
+import argparse
+import logging
+import os
+from collections.abc import Iterator
+
+from arc2phi.batch import CHART_EXTENSION, BatchConverter, find_jobs
+from arcaea.assets import ERROR, ConversionContext
+from arcaea.chartparser import parse_chart
+from arcaea.chartparser.lint import lint_chart
+
+logger = logging.getLogger(__name__)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """该函数用来创建命令行参数解析器。
+
+    Returns:
+        argparse.ArgumentParser: 命令行参数解析器。
+    """
+    parser = argparse.ArgumentParser(prog="arc2phi", description="将 Arcaea 谱面转换为 Phigros 谱面。")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="输出逐行解析日志。")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="只输出警告和错误。")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="批量转换曲包文件夹中的所有谱面。")
+    convert_parser.add_argument("songs_dir", help="曲包文件夹路径，其中每首歌曲的谱面和音频位于同一个文件夹中。")
+    convert_parser.add_argument("-o", "--output", default="output", help="输出文件夹路径，默认为 output。")
+    convert_parser.add_argument("-j", "--jobs", type=int, default=None, help="并行执行的进程数，默认为 CPU 核心数。")
+    convert_parser.add_argument("--memory-limit", type=int, default=None, metavar="MB", help="每个任务的内存上限（MB）。")
+    convert_parser.add_argument("--frame-rate", type=int, default=60, help="输出的帧率，默认为 60。")
+    convert_parser.add_argument("--no-resume", action="store_true", help="忽略已有的任务清单，重新转换所有谱面。")
+    convert_parser.add_argument(
+        "--profile", default=None, metavar="FILE", help="统计每个任务各阶段的耗时和计数，并写入该 JSON 文件。")
+    convert_parser.add_argument("--profile-memory", action="store_true", help="统计时同时统计每个阶段的内存峰值（较慢）。")
+
+    preview_parser = commands.add_parser("preview", help="将一个谱面绘制为预览视频（不含音频）。")
+    preview_parser.add_argument("chart", help="谱面文件路径。歌曲总时长从其所在文件夹中的 song_total_time.txt 读取。")
+    preview_parser.add_argument("-o", "--output", default="preview.mp4", help="输出视频路径，默认为 preview.mp4。")
+    preview_parser.add_argument(
+        "--size", type=parse_size, default=(1920, 1080), metavar="WxH", help="视频大小，默认为 1920x1080。")
+    preview_parser.add_argument("--frame-rate", type=int, default=60, help="视频帧率，默认为 60。")
+    preview_parser.add_argument("--threads", type=int, default=None, help="绘制线程数，默认为 CPU 核心数。")
+
+    lint_parser = commands.add_parser("lint", help="检查谱面文件或曲包文件夹中的所有谱面，报告其中的所有问题。")
+    lint_parser.add_argument("paths", nargs="+", help="谱面文件或曲包文件夹路径。")
+    lint_parser.add_argument("--errors-only", action="store_true", help="只报告错误，不报告警告。")
+    lint_parser.add_argument("--fail-on-warnings", action="store_true", help="存在警告时也以退出码 1 退出。")
+
+    serve_parser = commands.add_parser("serve", help="启动本地谱面转换服务，按需转换通过 HTTP 提交的谱面。")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听的地址，默认为 127.0.0.1。")
+    serve_parser.add_argument("--port", type=int, default=8765, help="监听的端口，默认为 8765。")
+    serve_parser.add_argument("--unix", default=None, metavar="PATH", help="改为监听该路径的 Unix 套接字。")
+    serve_parser.add_argument("--workers", type=int, default=None, help="同时执行的转换数量，默认为 CPU 核心数。")
+    serve_parser.add_argument(
+        "--max-pending", type=int, default=None, help="等待和执行中的请求总数上限，超出时拒绝新的请求。默认为工作线程数的 4 倍。")
+    return parser
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    """该函数用来解析 WxH 形式的视频大小。
+
+    Args:
+        text (str): 视频大小，例如 1920x1080。
+
+    Raises:
+        argparse.ArgumentTypeError: 当视频大小的格式不正确时，抛出该异常。
+
+    Returns:
+        tuple[int, int]: 视频的宽和高。
+    """
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f"无法识别视频大小 {text}，应为 WxH 的形式。") from error
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"视频大小必须为正数，而不是 {text}。")
+    return width, height
+
+
+def convert(args: argparse.Namespace) -> int:
+    """该函数用来执行 convert 子命令。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+
+    Returns:
+        int: 退出码。存在失败的任务时为 1。
+    """
+    if not os.path.isdir(args.songs_dir):
+        logger.error("找不到曲包文件夹 %s。", args.songs_dir)
+        return 2
+    converter = BatchConverter(
+        args.output, args.jobs, args.memory_limit * 1024 * 1024 if args.memory_limit else None,
+        {"frame_rate": args.frame_rate}, not args.no_resume, args.profile is not None, args.profile_memory)
+    results = converter.run(find_jobs(args.songs_dir, args.output))
+    print(converter.summary())
+    if args.profile is not None:
+        converter.export_profile(args.profile)
+    return 1 if any(result.error for result in results) else 0
+
+
+def preview(args: argparse.Namespace) -> int:
+    """该函数用来执行 preview 子命令。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+
+    Returns:
+        int: 退出码。
+    """
+    # 预览视频需要 OpenCV，只在使用该子命令时导入
+    from phigros.video.encoder import encode_preview  # pylint: disable=import-outside-toplevel
+
+    if not os.path.isfile(args.chart):
+        logger.error("找不到谱面文件 %s。", args.chart)
+        return 2
+    context = ConversionContext.from_file(
+        os.path.join(os.path.dirname(args.chart), "song_total_time.txt"), frame_rate=args.frame_rate)
+    with open(args.chart, "r", encoding="utf-8-sig") as chart_file:
+        parsed_chart = parse_chart(chart_file, context)
+    encode_preview(parsed_chart, args.output, size=args.size, render_threads=args.threads)
+    return 0
+
+
+def find_charts(paths: list[str]) -> Iterator[str]:
+    """该函数用来找出给定路径中的所有谱面文件。
+
+    Args:
+        paths (list[str]): 谱面文件或曲包文件夹路径。
+
+    Yields:
+        str: 谱面文件路径。文件夹中的谱面按路径排序。
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, directory_names, file_names in os.walk(path):
+            directory_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(CHART_EXTENSION):
+                    yield os.path.join(directory, file_name)
+
+
+def lint(args: argparse.Namespace) -> int:
+    """该函数用来执行 lint 子命令。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+
+    Returns:
+        int: 退出码。存在错误（或在 --fail-on-warnings 时存在警告）的谱面时为 1，存在无法读取的文件时为 2。
+    """
+    severity = ERROR if args.errors_only else None
+    charts, failed_charts, exit_code = 0, 0, 0
+    for chart_path in find_charts(args.paths):
+        try:
+            with open(chart_path, "r", encoding="utf-8-sig") as chart_file:
+                report = lint_chart(chart_file)
+        except (OSError, UnicodeDecodeError) as error:
+            logger.error("无法读取谱面文件 %s：%s", chart_path, error)
+            exit_code = 2
+            continue
+        charts += 1
+        if report.errors or (args.fail_on_warnings and report):
+            failed_charts += 1
+            exit_code = exit_code or 1
+        text = report.format(severity)
+        if text:
+            print(f"{chart_path}：{len(report.errors)} 个错误，{len(report.warnings)} 个警告\n{text}")
+    print(f"共检查 {charts} 个谱面，其中 {failed_charts} 个未通过检查。")
+    return exit_code
+
+
+def serve(args: argparse.Namespace) -> int:
+    """该函数用来执行 serve 子命令。
+
+    Args:
+        args (argparse.Namespace): 命令行参数。
+
+    Returns:
+        int: 退出码。
+    """
+    # 服务只在使用该子命令时导入，不影响其余子命令的启动时间
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    from arc2phi.service import serve as run_service  # pylint: disable=import-outside-toplevel
+
+    try:
+        asyncio.run(run_service(args.host, args.port, args.unix, workers=args.workers, max_pending=args.max_pending))
+    except ValueError as error:
+        logger.error("%s", error)
+        return 2
+    except KeyboardInterrupt:
+        logger.info("谱面转换服务已停止。")
+    return 0
+
+
+def main(argv: list[str] = None) -> int:
+    """该函数是 Arc2Phi 的命令行入口。
+
+    Args:
+        argv (list[str], optional): 命令行参数。未给出时使用 sys.argv。
+
+    Returns:
+        int: 退出码。
+    """
+    args = build_parser().parse_args(argv)
+    # 默认只输出进度和谱面问题汇总，逐行日志只在 --verbose 时生成
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO)
+    if args.command == "convert":
+        return convert(args)
+    if args.command == "preview":
+        return preview(args)
+    if args.command == "lint":
+        return lint(args)
+    if args.command == "serve":
+        return serve(args)
+    return 0
@@ -0,0 +1,493 @@
+"""这个模块以常驻本地服务的形式提供按需的谱面转换。
+
+服务基于 asyncio，在本机的 TCP 端口或 Unix 套接字上接受 HTTP 请求。每个请求的谱面内容在线程池中依次经过
+解析和编译两个阶段，编译结果一边生成一边以分块传输编码返回给客户端。所有请求共享同一个进程中的缓存：
+
+    同一个谱面（以 X-Chart-Id 请求头标识）的多次请求共用一个 IncrementalParser，内容未改变的 Timing Group
+    连同其 BPM 时间轴和各项缓存直接复用；所有请求共用一个 JudgeLineCache，内容相同的 Timing Group 的
+    Arc 缓动计算和自适应采样只进行一次。
+
+同时执行的转换数量不超过线程数，等待和执行中的请求总数超过上限时，新的请求立即以 503 拒绝。返回编译结果时，
+工作线程最多领先客户端若干个数据块，客户端读取缓慢时编译随之暂停；客户端断开连接（连接被重置或写入失败，
+而不是只关闭其写入端）时，等待中的请求被取消，执行中的编译在下一个数据块处停止。
+
+用法示例：
+
+    python -m arc2phi serve --port 8765
+    curl --data-binary @2.aff -H "X-Chart-Id: song/2" "http://127.0.0.1:8765/convert?song_total_time=120000"
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from arcaea.assets import ArcChartException, ConversionContext
+from arcaea.chartparser import ParsedChart, parse_chart
+from arcaea.chartparser.incremental import IncrementalParser
+from phigros.chart.compiler import JudgeLineCache, compile_chart
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 请求体（谱面内容）的默认大小上限（字节）
+DEFAULT_MAX_BODY = 16 * 1024 * 1024
+# 返回编译结果时每个数据块的大小（字节），以及工作线程最多领先客户端的数据块数量
+CHUNK_SIZE = 64 * 1024
+MAX_BUFFERED_CHUNKS = 4
+# 工作线程等待客户端读取时，检查请求是否已被取消的间隔（秒）
+_CANCEL_POLL_INTERVAL = 0.05
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    503: "Service Unavailable"}
+
+
+class _HttpError(Exception):
+    """该异常用来以错误状态码回应请求。
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class _ConversionCancelled(Exception):
+    """客户端断开连接后，用来停止等待中的请求和工作线程中的编译。
+    """
+
+
+class _Request(NamedTuple):
+    """一个 HTTP 请求。请求头的名称均为小写。
+    """
+
+    method: str
+    path: str
+    query: dict[str, str]
+    headers: dict[str, str]
+    body: bytes
+
+
+class _ChunkSink:
+    """该类以文件的形式接收工作线程中编译器写入的文本，并将其按块交给事件循环中的连接。
+
+    工作线程每交出一个数据块都需要一个许可，连接将数据块写入客户端后归还许可，因此工作线程最多领先客户端
+    max_buffered 个数据块。请求被取消后，工作线程在下一次交出数据块时停止。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, chunk_size: int, max_buffered: int) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.cancelled = threading.Event()
+        self._loop = loop
+        self._chunk_size = chunk_size
+        self._credits = threading.Semaphore(max_buffered)
+        self._parts = []
+        self._size = 0
+
+    def write(self, text: str):
+        """该函数用来写入一段文本，累积的文本达到数据块大小时交给连接。
+        """
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def writelines(self, lines):
+        """该函数用来依次写入多段文本。
+        """
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        """该函数用来将累积的文本作为一个数据块交给连接。没有可用的许可时，等待连接写出之前的数据块。
+
+        Raises:
+            _ConversionCancelled: 当请求已被取消时，抛出该异常。
+        """
+        if not self._parts:
+            return
+        chunk = "".join(self._parts).encode("utf-8")
+        self._parts, self._size = [], 0
+        while not self._credits.acquire(timeout=_CANCEL_POLL_INTERVAL):
+            if self.cancelled.is_set():
+                raise _ConversionCancelled()
+        if self.cancelled.is_set():
+            raise _ConversionCancelled()
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, chunk)
+
+    def finish(self):
+        """该函数用来通知连接已没有更多的数据块。
+        """
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+    def release(self):
+        """该函数用来在一个数据块写入客户端后归还许可。
+        """
+        self._credits.release()
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[_Request]:
+    """该函数用来读取一个 HTTP 请求。
+
+    Args:
+        reader (asyncio.StreamReader): 连接的读取端。
+        max_body (int): 请求体的大小上限（字节）。
+
+    Raises:
+        _HttpError: 当请求格式不正确或请求体过大时，抛出该异常。
+
+    Returns:
+        _Request | None: 读取的请求。客户端未发送完整的请求就关闭连接时为 None。
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError as error:
+        raise _HttpError(400, "请求头过长") from error
+    request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+    try:
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        for header_line in header_lines:
+            name, value = header_line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+    except ValueError as error:
+        raise _HttpError(400, "无法解析请求") from error
+    if "transfer-encoding" in headers:
+        raise _HttpError(400, "请以 Content-Length 指定请求体的大小")
+    if length > max_body:
+        raise _HttpError(413, f"请求体不能超过 {max_body} 字节")
+    try:
+        body = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    url = urlsplit(target)
+    return _Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body)
+
+
+async def _wait_disconnect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """该函数用来等待客户端断开连接。请求之后多余的数据将被忽略。
+
+    客户端可以在发送请求后关闭其写入端，并继续读取响应，因此读到 EOF 并不表示客户端已断开连接。
+    只有读取时连接被重置，或向连接写入失败而使其关闭时，才视为断开连接。
+
+    Args:
+        reader (asyncio.StreamReader): 连接的读取端。
+        writer (asyncio.StreamWriter): 连接的写入端。
+    """
+    try:
+        while await reader.read(4096):
+            pass
+        await writer.wait_closed()
+    except OSError:
+        pass
+
+
+def _response_head(status: int, headers: dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", "Connection: close"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _json_response(status: int, payload: dict, headers: dict[str, str] = None) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return _response_head(status, {
+        "Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body)), **(headers or {})}) + body
+
+
+class ConversionService:
+    """谱面转换服务类。
+
+    用法示例：
+
+        async with ConversionService(workers=4) as service:
+            host, port = await service.start(port=0)
+            await service.serve_forever()
+    """
+
+    def __init__(
+        self, workers: int = None, max_pending: int = None, max_body: int = DEFAULT_MAX_BODY,
+        max_parsers: int = 64, max_judge_lines: int = 4096, chunk_size: int = CHUNK_SIZE,
+        max_buffered_chunks: int = MAX_BUFFERED_CHUNKS
+    ) -> None:
+        """该函数用来创建一个谱面转换服务。
+
+        Args:
+            workers (int, optional): 工作线程数，即同时执行的转换数量上限。未给出时为 CPU 核心数。
+            max_pending (int, optional): 等待和执行中的请求总数上限，不能小于 workers。未给出时为 workers 的 4 倍。
+            max_body (int, optional): 谱面内容的大小上限（字节）。
+            max_parsers (int, optional): 保留的 IncrementalParser 数量上限，超出时淘汰最久未使用的谱面。
+            max_judge_lines (int, optional): 判定线缓存的条目数上限。
+            chunk_size (int, optional): 返回编译结果时每个数据块的大小（字节）。
+            max_buffered_chunks (int, optional): 工作线程最多领先客户端的数据块数量。
+
+        Raises:
+            ValueError: 当各项上限不为正整数，或 max_pending 小于 workers 时，抛出该异常。
+        """
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.max_pending = max_pending if max_pending is not None else 4 * self.workers
+        if self.workers < 1 or max_parsers < 1 or chunk_size < 1 or max_buffered_chunks < 1:
+            raise ValueError("工作线程数和各项缓存、缓冲区的上限必须为正整数。")
+        if self.max_pending < self.workers:
+            raise ValueError(f"请求总数上限 {self.max_pending} 不能小于工作线程数 {self.workers}。")
+        self.max_body = max_body
+        self.max_parsers = max_parsers
+        self.chunk_size = chunk_size
+        self.max_buffered_chunks = max_buffered_chunks
+        self.judge_lines = JudgeLineCache(max_judge_lines)
+        self.stats = Counter()
+        self._parsers: OrderedDict[str, tuple[IncrementalParser, threading.Lock]] = OrderedDict()
+        self._parsers_lock = threading.Lock()
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def __aenter__(self) -> "ConversionService":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: str = None):
+        """该函数用来开始在本机监听请求。
+
+        Args:
+            host (str, optional): 监听的地址。
+            port (int, optional): 监听的端口。为 0 时由系统分配。
+            unix_path (str, optional): 给出时改为监听该路径的 Unix 套接字，并忽略 host 和 port。
+
+        Returns:
+            tuple | str: 实际监听的地址和端口，或 Unix 套接字的路径。
+        """
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="arc2phi-service")
+        self._slots = asyncio.Semaphore(self.workers)
+        if unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        address = self._server.sockets[0].getsockname()
+        logger.info("谱面转换服务已启动：%s，%d 个工作线程", address, self.workers)
+        return address
+
+    async def serve_forever(self):
+        """该函数用来持续处理请求，直到服务被关闭。
+        """
+        await self._server.serve_forever()
+
+    async def close(self):
+        """该函数用来停止监听，并等待工作线程结束。
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    def status(self) -> dict:
+        """该函数用来取得服务的运行状态。
+
+        Returns:
+            dict: 工作线程数、请求总数上限、当前的请求数、各类请求的计数以及各项缓存的状态。
+        """
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "requests": dict(self.stats),
+            "parsers": len(self._parsers),
+            "judge_lines": {
+                "entries": len(self.judge_lines), "hits": self.judge_lines.hits, "misses": self.judge_lines.misses},
+        }
+
+    def _parser(self, chart_id: str, context: ConversionContext) -> tuple[IncrementalParser, threading.Lock]:
+        with self._parsers_lock:
+            entry = self._parsers.get(chart_id)
+            if entry is None or entry[0].context != context:
+                entry = IncrementalParser(context), threading.Lock()
+                self._parsers[chart_id] = entry
+            self._parsers.move_to_end(chart_id)
+            while len(self._parsers) > self.max_parsers:
+                self._parsers.popitem(last=False)
+            return entry
+
+    def _parse(self, chart_bytes: bytes, context: ConversionContext, chart_id: str = None) -> tuple[ParsedChart, list]:
+        """该函数在工作线程中解析谱面。
+
+        Args:
+            chart_bytes (bytes): 谱面文件的内容。
+            context (ConversionContext): 该谱面的转换设定。
+            chart_id (str, optional): 谱面标识。给出时使用该谱面的 IncrementalParser。
+
+        Raises:
+            ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
+            UnicodeDecodeError: 当谱面内容不是 UTF-8 编码时，抛出该异常。
+
+        Returns:
+            tuple[ParsedChart, list]: 谱面解析结果，以及被重新创建的 Timing Group 的编号。
+        """
+        file_lines = chart_bytes.decode("utf-8-sig").splitlines()
+        if chart_id is None:
+            parsed_chart = parse_chart(file_lines, context)
+            return parsed_chart, [timing_group.tg_num for timing_group in parsed_chart.timing_group_list]
+        parser, lock = self._parser(chart_id, context)
+        with lock:
+            return parser.parse(file_lines), list(parser.rebuilt)
+
+    def _compile(self, parsed_chart: ParsedChart, speed: float, sink: _ChunkSink):
+        """该函数在工作线程中编译谱面，并将结果写入 sink。
+
+        Args:
+            parsed_chart (ParsedChart): 谱面解析结果。
+            speed (float): 流速倍率。
+            sink (_ChunkSink): 接收编译结果的数据块队列。
+
+        Raises:
+            _ConversionCancelled: 当请求被取消时，抛出该异常。
+        """
+        try:
+            compile_chart(parsed_chart, sink, speed, self.judge_lines)
+            sink.flush()
+        finally:
+            sink.finish()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await _read_request(reader, self.max_body)
+            if request is None:
+                return
+            if request.path == "/status":
+                if request.method != "GET":
+                    raise _HttpError(405, "请使用 GET 方法")
+                writer.write(_json_response(200, self.status()))
+            elif request.path == "/convert":
+                if request.method != "POST":
+                    raise _HttpError(405, "请使用 POST 方法")
+                await self._convert(request, reader, writer)
+            else:
+                raise _HttpError(404, f"不存在的路径 {request.path}")
+        except _HttpError as error:
+            writer.write(_json_response(error.status, {"error": error.message}))
+        except ConnectionError:
+            return
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _convert(self, request: _Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            speed = float(request.query.get("speed", 1.0))
+            context = ConversionContext(float(request.query.get("song_total_time", 0)))
+        except ValueError as error:
+            raise _HttpError(400, f"无法识别的参数：{error}") from error
+        chart_id = request.headers.get("x-chart-id")
+
+        self.stats["requests"] += 1
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            writer.write(_json_response(503, {"error": "服务繁忙，请稍后重试"}, {"Retry-After": "1"}))
+            return
+        self._pending += 1
+        disconnected = asyncio.ensure_future(_wait_disconnect(reader, writer))
+        try:
+            await self._acquire_slot(disconnected)
+            try:
+                await self._run(request.body, context, chart_id, speed, writer, disconnected)
+            finally:
+                self._slots.release()
+        except _ConversionCancelled:
+            self.stats["cancelled"] += 1
+            logger.debug("客户端已断开连接，取消谱面 %s 的转换", chart_id)
+        finally:
+            self._pending -= 1
+            disconnected.cancel()
+
+    async def _acquire_slot(self, disconnected: asyncio.Future):
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        await asyncio.wait({acquire, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if acquire.done():
+            return
+        acquire.cancel()
+        try:
+            await acquire
+        except asyncio.CancelledError:
+            raise _ConversionCancelled() from None
+        # 取消前已经取得了执行名额
+        self._slots.release()
+        raise _ConversionCancelled()
+
+    async def _run(
+        self, chart_bytes: bytes, context: ConversionContext, chart_id: Optional[str], speed: float,
+        writer: asyncio.StreamWriter, disconnected: asyncio.Future
+    ):
+        loop = asyncio.get_running_loop()
+        parsing = loop.run_in_executor(self._executor, self._parse, chart_bytes, context, chart_id)
+        await asyncio.wait({parsing, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if not parsing.done():
+            # 解析无法中途停止。等待其结束后再丢弃结果，使同时执行的转换数量不超过上限
+            await asyncio.gather(parsing, return_exceptions=True)
+            raise _ConversionCancelled()
+        try:
+            parsed_chart, rebuilt = parsing.result()
+        except (ArcChartException, UnicodeDecodeError) as error:
+            self.stats["failed"] += 1
+            raise _HttpError(400, str(error).splitlines()[0]) from error
+
+        sink = _ChunkSink(loop, self.chunk_size, self.max_buffered_chunks)
+        compiling = loop.run_in_executor(self._executor, self._compile, parsed_chart, speed, sink)
+        writer.write(_response_head(200, {
+            "Content-Type": "application/json; charset=utf-8", "Transfer-Encoding": "chunked",
+            "X-Rebuilt-Groups": ",".join(str(tg_num) for tg_num in rebuilt)}))
+        try:
+            while True:
+                getting = asyncio.ensure_future(sink.queue.get())
+                await asyncio.wait({getting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not getting.done():
+                    getting.cancel()
+                    raise _ConversionCancelled()
+                chunk = getting.result()
+                if chunk is None:
+                    break
+                writer.write(b"%x\r\n%b\r\n" % (len(chunk), chunk))
+                await writer.drain()
+                sink.release()
+            await compiling
+        except (_ConversionCancelled, ConnectionError) as error:
+            sink.cancelled.set()
+            # 等待工作线程停止，使同时执行的转换数量不超过上限
+            await asyncio.gather(compiling, return_exceptions=True)
+            raise _ConversionCancelled() from error
+        except Exception:  # pylint: disable=broad-except
+            # 响应已经开始，只能以不完整的响应告知客户端
+            self.stats["failed"] += 1
+            logger.exception("编译谱面 %s 时发生错误", chart_id)
+            return
+        writer.write(b"0\r\n\r\n")
+        self.stats["completed"] += 1
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: str = None, **settings):
+    """该函数用来启动谱面转换服务，并持续处理请求。
+
+    Args:
+        host (str, optional): 监听的地址。
+        port (int, optional): 监听的端口。
+        unix_path (str, optional): 给出时改为监听该路径的 Unix 套接字。
+        **settings: 服务的其余设定，参见 ConversionService.__init__。
+    """
+    async with ConversionService(**settings) as service:
+        await service.start(host, port, unix_path)
+        await service.serve_forever()
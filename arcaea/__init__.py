@@ -0,0 +1,7 @@
+"""Arcaea 谱面的解析与转换。
+
+该包中的所有模块都通过 logging 输出日志，且默认不输出任何内容。如需查看解析过程，请为名为 arcaea 的 Logger 配置处理器。
+"""
+import logging
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -4,9 +4,30 @@
 """
 
 
-from bisect import bisect_left
-from arcfutil.aff.easing import slicer
+import logging
 import os
+from collections import Counter
+from typing import Union
+
+import numpy as np
+
+from arcaea.assets.context import ConversionContext
+from arcaea.assets.easing import arc_positions, sample_arc_times, slice_positions
+from arcaea.assets.profiler import (
+    PHASE_ARC_EASING, PHASE_BPM, PHASE_FRONT_POSITION, PHASE_NOTES, PHASE_SPLIT, phase, timed_iter
+)
+from arcaea.assets.sampling import adaptive_arc_keyframes
+from arcaea.assets.table import EASING_TYPES, MOVEMENT_TYPES, TIMING_DTYPE, NoteTable, split_movement_type
+from arcaea.assets.timeline import BpmTimeline, FramePositions
+from arcaea.assets.validation import (
+    ERROR, FIRST_TIMING_NOT_AT_ZERO, MISSING_TIMING, NEGATIVE_DURATION, OUTSIDE_ARC, OVERLAPPING_HOLDS, STRUCTURE_ERROR,
+    TIMING_OUT_OF_ORDER, TRACE_OUT_OF_RANGE, UNRECOGNIZED_LINE, WARNING, X_OUT_OF_RANGE, Y_OUT_OF_RANGE, ZERO_DURATION,
+    ChartIssue, ValidationReport, validate_notes, validate_timings
+)
+from arcaea.assets.visibility import DEFAULT_VISIBLE_TIME, IntervalIndex, VisibilityIndex, visible_depth
+
+logger = logging.getLogger(__name__)
+
 
 class ArcChartException(Exception):
     """这个类用来抛出解析 Arcaea 谱面时的异常。
@@ -24,6 +45,10 @@ class ArcChartException(Exception):
     def __str__(self):
         return self.exception_info
 
+    def __reduce__(self):
+        # 该异常的 args 中包含其自身，无法按默认方式序列化。为使其能在进程之间传递，只序列化说明文本。
+        return Exception.__new__, (type(self),), self.__dict__
+
 
 def validate_trace(touch_time: float, note_type: str, trace: int):
     """该函数用来校验 Note 所在的轨道是否越界。
@@ -43,106 +68,105 @@ def validate_trace(touch_time: float, note_type: str, trace: int):
             f"在处理打击时间为 {touch_time}s 的 {note_type} 时出现问题：轨道 {trace} 超出允许范围。")
 
 
-def validate_position(touch_time: float, note_type: str, x_position: float, y_position: float):
+def validate_position(
+    touch_time: float, note_type: str, x_position: float, y_position: float, diagnostics: Counter = None
+) -> bool:
     """该函数用来校验 Note 是否为超界的。
 
+    超界的 Note 仍然允许出现在谱面中，因此只记录 DEBUG 级别的日志，并在 diagnostics 中计数，以供汇总报告。
+
     Args:
         touch_time (float): 该 Note 被打击或最初被打击的时间。
         note_type (str): 该 Note 的类型。
         x_position (float): 该 Note 被打击，刚开始被打击或结束被打击的横向位置。
         y_position (float): 该 Note 被打击，刚开始被打击或结束被打击的纵向位置。
+        diagnostics (Counter, optional): 用来统计超界 Note 数量的计数器，键为 “Note 类型 问题” 形式的字符串。
+
+    Returns:
+        bool: 该 Note 是否未超界。
     """
-    if x_position < 0 or x_position > 1:
-        print(
-            f"谱面时间为 {touch_time} 时，处于打击的 {note_type} 是非正常的超界 Note。其横向坐标为 {x_position}。")
-    if y_position < 0 or y_position > 1:
-        print(
-            f"谱面时间为 {touch_time} 时，处于打击的 {note_type} 是非正常的超界 Note。其纵向坐标为 {y_position}。")
+    x_out_of_range = x_position < 0 or x_position > 1
+    y_out_of_range = y_position < 0 or y_position > 1
+    if x_out_of_range:
+        logger.debug(
+            "谱面时间为 %s 时，处于打击的 %s 是非正常的超界 Note。其横向坐标为 %s。", touch_time, note_type, x_position)
+        if diagnostics is not None:
+            diagnostics[f"{note_type} {X_OUT_OF_RANGE}"] += 1
+    if y_out_of_range:
+        logger.debug(
+            "谱面时间为 %s 时，处于打击的 %s 是非正常的超界 Note。其纵向坐标为 %s。", touch_time, note_type, y_position)
+        if diagnostics is not None:
+            diagnostics[f"{note_type} {Y_OUT_OF_RANGE}"] += 1
+    return not (x_out_of_range or y_out_of_range)
 
 
 class NoteBase:
     """所有 Note 的基类。
     """
 
-    def __init__(self, touch_time: float, note_type: int, bpm_list: dict[float, float]) -> None:
+    def __init__(
+        self, touch_time: float, note_type: int, bpm_list: Union[dict[float, float], BpmTimeline],
+        context: ConversionContext = None
+    ) -> None:
         """该函数用来初始化生成所有 Note。
 
         Args:
             touch_time (float): 该 Note 被打击或最初被打击的时间。
             note_type (int): 该 Note 的按键类型：地键/Tap 为 1，长条/Hold 为 2，天键/Sky Note 为 3
                 音弧/Arc 为 4，将会被最终转为黄键/Drag (5).
-            bpm_list (dict): 该谱面的 BPM 列表。各子类初始化函数将会根据该字典来计算相对位置。
+            bpm_list (dict | BpmTimeline): 该 Note 所在 Timing Group 的 BPM 时间轴。各子类初始化函数将会根据该时间轴来计算相对位置。
+                传入 BPM 列表字典时，将为该 Note 单独创建时间轴。
+            context (ConversionContext, optional): 该谱面的转换设定。未给出时，将从当前目录下的 song_total_time.txt 读取歌曲总时长。
         """
         self.time_0_position = None
-        self.bpm_list = bpm_list
+        if not isinstance(bpm_list, BpmTimeline):
+            bpm_list = BpmTimeline(bpm_list)
+        self.bpm_timeline = bpm_list
         self.touch_time = touch_time
         self.note_type = note_type
-        self.pos_per_frame = {}
-        with open(os.path.abspath(r"song_total_time.txt"), "r", encoding="utf-8") as time_:
-            self.song_total_time = float(time_.read())
-        # with open("../../song_total_time.txt", 'r', encoding="utf-8") as time_:
-        #     self.song_total_time = time_.read()
-        self.get_note_front_position(self.bpm_list)
-        # print(os.path.realpath(r"D:\Development\Arc2Phi\song_total_time.txt"))
+        self.pos_per_frame: FramePositions = None
+        if context is None:
+            context = ConversionContext.from_file(os.path.abspath(r"song_total_time.txt"))
+        self.context = context
+        self.song_total_time = context.song_total_time
+        self.get_note_front_position(self.bpm_timeline)
 
 
-    def get_note_front_position(self, bpm_list: dict):
+    def get_note_front_position(self, bpm_timeline: BpmTimeline):
         """该函数用来计算 Note 的前端位置。
 
         Args:
-            bpm_list (dict): 该谱面的 BPM 列表。各子类初始化函数将会根据该字典来计算相对位置。
+            bpm_timeline (BpmTimeline): 该 Note 所在 Timing Group 的 BPM 时间轴。
         """
         # 以下内容的实现逻辑：
-        # 1. 通过 bpm_list 中，每一组 BPM 的持续时间和 BPM 值来逆推出每一个 Note 的起始位置。
-        # 2. 通过 Note 的起始位置，来计算出每一帧，Note 的所在位置。
-        # 该实现逻辑较为丑陋，需要后期优化。
-
-        # 我们为该函数传入 bpm_list，并让它使用自身的 touch_time 去计算它的初始位置。
-        # 此函数首先判断自己被打击时位于哪个 BPM 组，随后使用该 BPM 组及其前面的 BPM 组的持续时间和 BPM 值来计算自己的初始位置。
-        # 随后该函数将会计算每 0.001s 时，Note 的相对位置。将其保存在自身的 pos_per_frame 字典中。
-
-        # 初始化一个 Note 的起始位置。
-        initial_position = 0
-        # 计算需要计算的次数，即计算自己被打击时位于的 BPM 组是第几个。
-        calculation_times = bisect_left(list(bpm_list.keys()), self.touch_time)
-        # 将 bpm_list 中的所有 BPM 组的持续时间和 BPM 值，分别存入两个列表中。
-        value_list, key_list = list(bpm_list.values()), list(bpm_list.keys())
-        # 使用每一个 BPM 组的值，计算出该 Note 的初始位置。
-        for which_bpm_item in range(0, calculation_times - 1, 1):
-            initial_position += value_list[which_bpm_item] * \
-                (key_list[which_bpm_item+1] - key_list[which_bpm_item])
-        initial_position += value_list[calculation_times - 1] * \
-            (self.touch_time - key_list[calculation_times - 1])
-        # 将该 Note 的初始位置，保存在自身的 time_0_position 中。
-        self.time_0_position = 0.001 * 0.001 * initial_position
-
-        # this_frame_position 表示该 Note 在当前帧的位置。
-        # 以下的计算从第 0 帧开始，故当前帧的位置就是该 Note 的初始位置。
-        this_frame_position = self.time_0_position
-        # 开始计算每一帧的位置。
-        for play_time in range(0, self.song_total_time + 1.0):
-            if play_time == self.song_total_time:
-                self.pos_per_frame[play_time] = 0
-            else:
-                self.pos_per_frame[play_time] = this_frame_position
-            # 将这一帧的位置保留给下一次计算。
-            this_frame_position -= 0.001 * 0.001 * \
-                value_list[bisect_left(list(bpm_list.keys()), play_time) - 1]
+        # 1. 通过 BPM 时间轴中预先计算的累计位置，直接求出该 Note 被打击时的位置，即它的起始位置。
+        # 2. 每一帧 Note 的所在位置，即为它的起始位置减去该帧在时间轴上的累计位置。
+        # 逐帧累计位置表由时间轴按需计算一次后，在同一个 Timing Group 的所有 Note 之间共享。
+
+        with phase(PHASE_FRONT_POSITION) as record:
+            # 将该 Note 的初始位置，保存在自身的 time_0_position 中。
+            self.time_0_position = bpm_timeline.position_at(self.touch_time)
+            # pos_per_frame 仅是一个视图，每一帧的位置只在被读取时才计算。
+            self.pos_per_frame = FramePositions(bpm_timeline, self.time_0_position, self.context.last_frame)
+            record.add_notes(1)
 
 
 class Tap(NoteBase):
     """Tap Note 类
     """
 
-    def __init__(self, touch_time: float, trace: int, bpm_list: dict[float, float]) -> None:
+    def __init__(
+        self, touch_time: float, trace: int, bpm_list: dict[float, float], context: ConversionContext = None
+    ) -> None:
         """该函数用来生成一个 Tap Note。
 
         Args:
             touch_time (float): 该 Tap 被打击的时间。
             trace (int): 该 Tap 落在轨道的编号，以 1-4 中的一个整数表示。
+            context (ConversionContext, optional): 该谱面的转换设定。
         """
         validate_trace(touch_time, "Tap", trace)
-        super().__init__(touch_time, 1, bpm_list)
+        super().__init__(touch_time, 1, bpm_list, context)
         self.trace = trace
 
 
@@ -150,16 +174,19 @@ class Hold(NoteBase):
     """Hold Note 类
     """
 
-    def __init__(self, start_time: float, end_time: float, trace: int, bpm_list: dict) -> None:
+    def __init__(
+        self, start_time: float, end_time: float, trace: int, bpm_list: dict, context: ConversionContext = None
+    ) -> None:
         """该函数用来生成一个 Hold Note。
 
         Args:
             start_time (float): 该 Hold 被开始打击的时间。
             end_time (float): 该 Hold 被结束打击的时间。
             trace (int): 该 Hold 落在轨道的编号。以 1-4 中的一个整数表示。
+            context (ConversionContext, optional): 该谱面的转换设定。
         """
         validate_trace(start_time, "Hold", trace)
-        super().__init__(start_time, 2, bpm_list)
+        super().__init__(start_time, 2, bpm_list, context)
         self.end_time, self.trace = end_time, trace
 
 
@@ -167,17 +194,21 @@ class SkyNote(NoteBase):
     """Sky Note 类
     """
 
-    def __init__(self, touch_time: float, x_position: float, y_position: float, bpm_list: dict) -> None:
+    def __init__(
+        self, touch_time: float, x_position: float, y_position: float, bpm_list: dict,
+        context: ConversionContext = None
+    ) -> None:
         """该函数用来生成一个 Sky Note。
 
         Args:
             touch_time (float): 该 Sky Note 被打击的时间。
             x_position (float): 该 Sky Note 被打击时落在的位置。
             y_position (float): 该 Sky Note 被打击时落在的位置。
-            bpm_list (dict): 该谱面的 BPM 列表。各子类初始化函数将会根据该字典来计算相对位置。
+            bpm_list (dict | BpmTimeline): 该 Note 所在 Timing Group 的 BPM 时间轴。
+            context (ConversionContext, optional): 该谱面的转换设定。
         """
         validate_position(touch_time, "Sky Note", x_position, y_position)
-        super().__init__(touch_time, 3, bpm_list)
+        super().__init__(touch_time, 3, bpm_list, context)
         self.x_position, self.y_position = x_position, y_position
 
 
@@ -187,7 +218,8 @@ class Arc(NoteBase):
 
     def __init__(
         self, start_time: float, end_time: float, x_start_pos: float, y_start_pos: float, movement_type: str,
-        x_end_pos: float, y_end_pos: float, arc_color: int, none_value: str, is_trace: bool, bpm_list: dict
+        x_end_pos: float, y_end_pos: float, arc_color: int, none_value: str, is_trace: bool, bpm_list: dict,
+        context: ConversionContext = None
     ) -> None:
         """该函数用来生成一个 Arc Note。
 
@@ -202,7 +234,8 @@ class Arc(NoteBase):
             arc_color (int): 该 Arc 的颜色（0 为蓝色，1 为红色，2 为绿色）
             none_value (str): 该 Arc 的 NONE 值。
             is_trace (bool): 该 Arc 是否为黑线。
-            bpm_list (dict): 该谱面的 BPM 列表。各子类初始化函数将会根据该字典来计算相对位置。
+            bpm_list (dict | BpmTimeline): 该 Note 所在 Timing Group 的 BPM 时间轴。
+            context (ConversionContext, optional): 该谱面的转换设定。
         """
         # 验证轨道编号是否合法。
         validate_position(start_time, "Arc", x_start_pos, y_start_pos)
@@ -210,10 +243,10 @@ class Arc(NoteBase):
         self.end_time, self.x_start_pos, self.y_start_pos, self.movement_type, self.x_end_pos, self.y_end_pos, \
             self.arc_color, self.none_value, self.is_trace = end_time, x_start_pos, y_start_pos, movement_type, \
             x_end_pos, y_end_pos, arc_color, none_value, is_trace
-        super().__init__(start_time, 4, bpm_list)
+        super().__init__(start_time, 4, bpm_list, context)
         self.duration = end_time - start_time
-        self.xy_relative_position: dict = None
-        self.z_relative_position: dict = None
+        self.xy_relative_position: np.ndarray = None
+        self.z_relative_position: np.ndarray = None
         if self.duration < 0:
             # 如果结束时间小于开始时间，抛出异常。
             raise ArcChartException("谱面时间为 0 时，处于打击的 Arc 具有不受支持的负持续时间。")
@@ -223,31 +256,27 @@ class Arc(NoteBase):
         # 每一个 Arc 的缓动类型由 x 轴缓动和 y 轴缓动组成，例如 sisi 表示 x 轴为 sine 缓动，y 轴为 sine 缓动。
         # 特别地，如果 y 轴的缓动类型是 s，那么 y 轴的缓动类型可以省略不写，而只写 x 轴的缓动类型。
         # 例如，若一个 Arc 的 x 轴缓动类型为 b，y 轴缓动类型为 s，则该 Arc 的缓动类型理应为 bs：但可以省略为 b。
-
-        # 若 y 轴的缓动类型不是 s
-        if len(str(self.movement_type)) == 4:
-            self.movement_for_x = self.movement_type[0:2]
-            self.movement_for_y = self.movement_type[2:4]
-        # 若 y 轴的缓动类型是 s
-        elif len(str(self.movement_type)) == 2:
-            if self.movement_type[1] == "i":
-                self.movement_for_x = "si"
-                self.movement_for_y = "s"
-            elif self.movement_type[1] == "o":
-                self.movement_for_x = "so"
-                self.movement_for_y = "s"
-        elif len(str(self.movement_type)) == 1:
-            if self.movement_type == "b":
-                self.movement_for_x = "b"
-                self.movement_for_y = "s"
-            elif self.movement_type == "s":
-                self.movement_for_x = "s"
-                self.movement_for_y = "s"
+        try:
+            self.movement_for_x, self.movement_for_y = split_movement_type(str(self.movement_type))
+        except ValueError as error:
+            raise ArcChartException(f"谱面时间为 {start_time} 时，处于打击的 Arc 无法被识别：{error}") from error
 
     def get_self_relative_position(self):
         """该函数用来计算该 Arc 的相对位置。
+
+        xy_relative_position 为每个采样时横向和纵向位置组成的 (采样数, 2) 数组，由批量缓动函数一次性求得。
+        z 轴的相对位置直接由共享的逐帧累计位置表切片求得，而不逐帧读取 pos_per_frame。
+        采样间隔由转换设定中的 sampling_resolution 决定。
         """
-        for touch_time in range(0, self.duration + 1):
-            self.xy_relative_position[touch_time] = (slicer(touch_time, 0, self.duration, self.x_start_pos, self.x_end_pos, self.movement_for_x), slicer(
-                touch_time, 0, self.duration, self.y_start_pos, self.y_end_pos, self.movement_for_y))
-            self.z_relative_position[touch_time] = 0 - self.pos_per_frame[touch_time + self.start_time]
+        start_frame = int(self.touch_time)
+        resolution = self.context.sampling_resolution
+        sample_time = np.arange(0, int(self.duration) + 1, resolution, dtype=np.float64)
+        self.xy_relative_position = np.stack((
+            slice_positions(
+                sample_time, 0, self.duration, self.x_start_pos, self.x_end_pos,
+                EASING_TYPES.index(self.movement_for_x)),
+            slice_positions(
+                sample_time, 0, self.duration, self.y_start_pos, self.y_end_pos,
+                EASING_TYPES.index(self.movement_for_y))), axis=1)
+        self.z_relative_position = self.pos_per_frame.shared_slice(
+            start_frame, start_frame + int(self.duration) + 1)[::resolution] - self.time_0_position
@@ -0,0 +1,78 @@
+"""这个模块用来描述一次谱面转换的全局设定。
+
+每个谱面只创建一个 ConversionContext，并依次传递给 ArcChart，TimingGroup 和各个 Note，
+因此不同时长的歌曲可以在同一个进程中同时转换，且创建 Note 时无需读取任何文件。
+"""
+import os
+
+
+class ConversionContext:
+    """谱面转换设定类。
+    """
+
+    def __init__(
+        self, song_total_time: float, frame_rate: int = 60, audio_offset: int = None, sampling_resolution: int = 1,
+        arc_tolerance: float = 0.002
+    ) -> None:
+        """该函数用来创建一个谱面转换设定。
+
+        Args:
+            song_total_time (float): 歌曲总时长（毫秒），同时也是逐帧位置表的最后一帧编号。
+            frame_rate (int, optional): 输出视频或谱面的帧率。
+            audio_offset (int, optional): 谱面音乐延迟（毫秒）。为 None 时使用谱面文件中 AudioOffset 的值。
+            sampling_resolution (int, optional): 计算 Arc 相对位置时的采样间隔（毫秒）。
+            arc_tolerance (float, optional): 自适应采样 Arc 时，Arc 坐标空间中允许的最大位置误差。
+        """
+        if sampling_resolution < 1:
+            raise ValueError(f"采样间隔必须为正整数，而不是 {sampling_resolution}。")
+        self.song_total_time = float(song_total_time)
+        self.frame_rate = frame_rate
+        self.audio_offset = audio_offset
+        self.sampling_resolution = int(sampling_resolution)
+        self.arc_tolerance = float(arc_tolerance)
+
+    @classmethod
+    def from_file(cls, file: str = "song_total_time.txt", **settings) -> "ConversionContext":
+        """该函数用来由保存歌曲总时长的文件创建谱面转换设定。
+
+        Args:
+            file (str, optional): 保存歌曲总时长的文件路径。
+            **settings: 其余的谱面转换设定，参见 ConversionContext.__init__。
+
+        Returns:
+            ConversionContext: 创建的谱面转换设定。文件不存在时，歌曲总时长为 0。
+        """
+        song_total_time = 0.0
+        if os.path.exists(file):
+            with open(file, "r", encoding="utf-8") as time_:
+                song_total_time = float(time_.read())
+        return cls(song_total_time, **settings)
+
+    @property
+    def last_frame(self) -> int:
+        """int: 逐帧位置表的最后一帧编号。
+        """
+        return int(self.song_total_time)
+
+    def replace(self, **changes) -> "ConversionContext":
+        """该函数用来创建一个修改了部分设定的新谱面转换设定，而不修改自身。
+
+        Args:
+            **changes: 需要修改的设定，参见 ConversionContext.__init__。
+
+        Returns:
+            ConversionContext: 新的谱面转换设定。
+        """
+        settings = dict(self.__dict__)
+        settings.update(changes)
+        return ConversionContext(**settings)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ConversionContext) and self.__dict__ == other.__dict__
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.__dict__.values()))
+
+    def __repr__(self) -> str:
+        settings = ", ".join(f"{name}={value!r}" for name, value in self.__dict__.items())
+        return f"ConversionContext({settings})"
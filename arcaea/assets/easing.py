@@ -0,0 +1,97 @@
+"""这个模块用来批量计算 Arc 的缓动位置。
+
+所有函数都接受 NumPy 数组，一次调用即可计算任意多个 Arc 在任意多个时间的位置。
+计算结果与 arcfutil 的 slicer 在浮点误差范围内一致。
+"""
+import numpy as np
+
+from arcaea.assets.table import EASING_TYPES
+
+EASING_S = EASING_TYPES.index("s")
+EASING_B = EASING_TYPES.index("b")
+EASING_SI = EASING_TYPES.index("si")
+EASING_SO = EASING_TYPES.index("so")
+
+
+def ease(percent, easing_code) -> np.ndarray:
+    """该函数用来批量计算缓动函数的值。
+
+    Args:
+        percent (np.ndarray): 经过的时间占总时长的比例。
+        easing_code (np.ndarray): 缓动类型在 EASING_TYPES 中的编号，可以与 percent 广播。
+
+    Returns:
+        np.ndarray: 缓动函数的值。
+    """
+    percent = np.asarray(percent, dtype=np.float64)
+    easing_code = np.asarray(easing_code)
+    half_pi_percent = percent * (np.pi / 2)
+    # arcfutil 的 b 缓动使用控制点 (1/3, 0) 和 (2/3, 1)，此时贝塞尔曲线的横坐标恰好等于参数本身，
+    # 因此无需迭代求解，其纵坐标为 3p² - 2p³。
+    return np.select(
+        [easing_code == EASING_SI, easing_code == EASING_SO, easing_code == EASING_B],
+        [np.sin(half_pi_percent), 1 - np.cos(half_pi_percent), percent * percent * (3 - 2 * percent)],
+        default=percent)
+
+
+def slice_positions(play_time, start_time, end_time, start_position, end_position, easing_code) -> np.ndarray:
+    """该函数用来批量计算 Arc 在某一时间的位置，是 arcfutil 中 slicer 的向量化版本。
+
+    所有参数都可以是数组，并按照 NumPy 的规则广播。持续时间为 0 的 Arc 将返回其结束位置。
+
+    Args:
+        play_time (np.ndarray): 需要计算的时间。
+        start_time (np.ndarray): Arc 的开始时间。
+        end_time (np.ndarray): Arc 的结束时间。
+        start_position (np.ndarray): Arc 的开始位置。
+        end_position (np.ndarray): Arc 的结束位置。
+        easing_code (np.ndarray): 缓动类型在 EASING_TYPES 中的编号。
+
+    Returns:
+        np.ndarray: Arc 在该时间的位置。
+    """
+    elapsed_time, duration = np.broadcast_arrays(
+        np.asarray(play_time, dtype=np.float64) - start_time, np.asarray(end_time, dtype=np.float64) - start_time)
+    percent = np.divide(elapsed_time, duration, out=np.ones(elapsed_time.shape), where=duration != 0)
+    return start_position + (np.asarray(end_position) - start_position) * ease(percent, easing_code)
+
+
+def sample_arc_times(start_times: np.ndarray, end_times: np.ndarray, resolution: int = 1):
+    """该函数用来为多个 Arc 生成从开始时间到结束时间，间隔固定的采样时间。
+
+    Args:
+        start_times (np.ndarray): 每个 Arc 的开始时间。
+        end_times (np.ndarray): 每个 Arc 的结束时间。
+        resolution (int, optional): 采样间隔（毫秒）。
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: 每个采样所属 Arc 的编号，以及每个采样的时间。
+    """
+    start_times = np.asarray(start_times, dtype=np.float64)
+    sample_counts = (np.maximum(np.asarray(end_times) - start_times, 0) // resolution).astype(np.int64) + 1
+    arc_index = np.repeat(np.arange(len(start_times)), sample_counts)
+    # 每个采样在其所属 Arc 中的序号
+    first_sample = np.cumsum(sample_counts) - sample_counts
+    sample_num = np.arange(len(arc_index)) - np.repeat(first_sample, sample_counts)
+    return arc_index, start_times[arc_index] + sample_num * resolution
+
+
+def arc_positions(arcs: np.ndarray, play_time, arc_index) -> tuple[np.ndarray, np.ndarray]:
+    """该函数用来批量计算 Note 列表中的 Arc 在给定时间的横向和纵向位置。
+
+    Args:
+        arcs (np.ndarray): NoteTable 中所有 Arc 组成的结构化数组。
+        play_time (np.ndarray): 需要计算的时间。
+        arc_index (np.ndarray): 每个时间所对应 Arc 的编号，与 play_time 广播。
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Arc 在这些时间的横向位置和纵向位置。
+    """
+    selected = arcs[arc_index]
+    x_position = slice_positions(
+        play_time, selected["touch_time"], selected["end_time"], selected["x_start_pos"], selected["x_end_pos"],
+        selected["movement_for_x"])
+    y_position = slice_positions(
+        play_time, selected["touch_time"], selected["end_time"], selected["y_start_pos"], selected["y_end_pos"],
+        selected["movement_for_y"])
+    return x_position, y_position
@@ -0,0 +1,304 @@
+"""这个模块用来统计谱面转换各个阶段的耗时和计数。
+
+转换流程中的各个阶段都以 phase 标记。只有在 profile 上下文中，这些标记才会记录墙钟时间、CPU 时间、调用次数、
+处理的 Note 数量和内存峰值；否则 phase 只返回一个共享的空记录，几乎没有开销。
+
+用法示例：
+
+    with profile() as profiler:
+        parse_chart(chart_lines, context)
+    profiler.export("profile.json")
+"""
+import contextvars
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 各个阶段的名称
+PHASE_SPLIT = "split_timing_groups"
+PHASE_BPM = "bpm_timeline"
+PHASE_NOTES = "note_table"
+PHASE_FRONT_POSITION = "note_front_position"
+PHASE_FRAME_POSITIONS = "frame_positions"
+PHASE_ARC_EASING = "arc_easing"
+
+_ACTIVE_PROFILER: contextvars.ContextVar[Optional["Profiler"]] = contextvars.ContextVar(
+    "active_profiler", default=None)
+
+
+class PhaseStats:
+    """单个阶段的累计统计。
+    """
+
+    def __init__(self) -> None:
+        """该函数用来创建一个空的阶段统计。
+        """
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.calls = 0
+        self.notes = 0
+        self.peak_memory = 0
+
+    def merge(self, other: "PhaseStats"):
+        """该函数用来将另一个阶段统计累加到自身。
+
+        Args:
+            other (PhaseStats): 需要累加的阶段统计。
+        """
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        self.calls += other.calls
+        self.notes += other.notes
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+
+    def to_dict(self) -> dict:
+        """该函数用来将阶段统计转换为可以写入 JSON 的字典。
+
+        Returns:
+            dict: 以 wall_time，cpu_time（秒），calls，notes 和 peak_memory（字节）为键的字典。
+        """
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "PhaseStats":
+        """该函数用来由 PhaseStats.to_dict 生成的字典重新创建阶段统计。
+
+        Args:
+            values (dict): 阶段统计字典。
+
+        Returns:
+            PhaseStats: 重新创建的阶段统计。
+        """
+        stats = cls()
+        stats.__dict__.update(values)
+        return stats
+
+
+class PhaseRecord:
+    """一次阶段执行的记录，在 with 语句中由 phase 返回。
+    """
+
+    def __init__(self, profiler: "Profiler", name: str, tg_num: Optional[int]) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.tg_num = tg_num
+        self.notes = 0
+        self.peak_memory = 0
+        self._wall_start = 0.0
+        self._cpu_start = 0.0
+
+    def add_notes(self, count: int):
+        """该函数用来记录该阶段处理的 Note 数量。
+
+        Args:
+            count (int): 处理的 Note 数量。
+        """
+        self.notes += count
+
+    def __enter__(self) -> "PhaseRecord":
+        self.profiler._enter(self)  # pylint: disable=protected-access
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        stats = PhaseStats()
+        stats.wall_time = time.perf_counter() - self._wall_start
+        stats.cpu_time = time.process_time() - self._cpu_start
+        stats.calls = 1
+        stats.notes = self.notes
+        self.profiler._exit(self, stats)  # pylint: disable=protected-access
+
+
+class _NullRecord:
+    """未启用统计时 phase 返回的空记录。
+    """
+
+    def add_notes(self, count: int):
+        """该函数不做任何事。
+        """
+
+    def __enter__(self) -> "_NullRecord":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_RECORD = _NullRecord()
+
+
+class Profiler:
+    """转换流程统计类。
+
+    统计结果按阶段汇总，同时按 Timing Group 编号分别汇总。只统计当前进程中的阶段。
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        """该函数用来创建一个转换流程统计。
+
+        Args:
+            trace_memory (bool, optional): 是否使用 tracemalloc 统计每个阶段的内存峰值。
+                该统计会明显拖慢转换，因此默认只记录整个进程的最大常驻内存。
+        """
+        self.trace_memory = trace_memory
+        self.phases: dict[str, PhaseStats] = {}
+        self.timing_groups: dict[int, dict[str, PhaseStats]] = {}
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.max_rss = 0
+        self._stack: list[PhaseRecord] = []
+
+    def phase(self, name: str, tg_num: int = None) -> PhaseRecord:
+        """该函数用来标记一个阶段。
+
+        Args:
+            name (str): 阶段名称。
+            tg_num (int, optional): 该阶段所属 Timing Group 的编号。
+
+        Returns:
+            PhaseRecord: 在 with 语句中使用的阶段记录。
+        """
+        return PhaseRecord(self, name, tg_num)
+
+    def _enter(self, record: PhaseRecord):
+        if self.trace_memory:
+            # 外层阶段的内存峰值需要在重置前保存
+            if self._stack:
+                self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(record)
+
+    def _exit(self, record: PhaseRecord, stats: PhaseStats):
+        self._stack.pop()
+        if self.trace_memory:
+            record.peak_memory = max(record.peak_memory, tracemalloc.get_traced_memory()[1])
+            stats.peak_memory = record.peak_memory
+            if self._stack:
+                self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, record.peak_memory)
+        self.phases.setdefault(record.name, PhaseStats()).merge(stats)
+        if record.tg_num is not None:
+            self.timing_groups.setdefault(record.tg_num, {}).setdefault(record.name, PhaseStats()).merge(stats)
+
+    def to_dict(self) -> dict:
+        """该函数用来将统计结果转换为可以写入 JSON 的字典。
+
+        Returns:
+            dict: 统计结果。
+        """
+        return {
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "max_rss": self.max_rss,
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+            "timing_groups": {
+                str(tg_num): {name: stats.to_dict() for name, stats in phases.items()}
+                for tg_num, phases in sorted(self.timing_groups.items())},
+        }
+
+    def merge_dict(self, values: dict):
+        """该函数用来将另一个统计结果（例如子进程中的统计）累加到自身。Timing Group 统计不参与累加。
+
+        Args:
+            values (dict): 由 Profiler.to_dict 生成的统计结果。
+        """
+        self.wall_time += values["wall_time"]
+        self.cpu_time += values["cpu_time"]
+        self.max_rss = max(self.max_rss, values["max_rss"])
+        for name, stats in values["phases"].items():
+            self.phases.setdefault(name, PhaseStats()).merge(PhaseStats.from_dict(stats))
+
+    def export(self, file: str):
+        """该函数用来将统计结果写入 JSON 文件。
+
+        Args:
+            file (str): 写入的文件路径。
+        """
+        with open(file, "w", encoding="utf-8") as profile_file:
+            json.dump(self.to_dict(), profile_file, ensure_ascii=False, indent=2)
+
+
+def _max_rss() -> int:
+    if resource is None:
+        return 0
+    # Linux 上 ru_maxrss 的单位为 KB，macOS 上为字节
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+@contextmanager
+def profile(trace_memory: bool = False):
+    """该函数用来在 with 语句中启用转换流程统计。
+
+    Args:
+        trace_memory (bool, optional): 是否统计每个阶段的内存峰值，参见 Profiler.__init__。
+
+    Yields:
+        Profiler: 统计结果。with 语句结束后，其中包含整个过程的耗时和进程的最大常驻内存。
+    """
+    profiler = Profiler(trace_memory)
+    token = _ACTIVE_PROFILER.set(profiler)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield profiler
+    finally:
+        profiler.wall_time = time.perf_counter() - wall_start
+        profiler.cpu_time = time.process_time() - cpu_start
+        profiler.max_rss = _max_rss()
+        if started_tracing:
+            tracemalloc.stop()
+        _ACTIVE_PROFILER.reset(token)
+
+
+def phase(name: str, tg_num: int = None):
+    """该函数用来在转换流程中标记一个阶段。未启用统计时，返回一个共享的空记录。
+
+    Args:
+        name (str): 阶段名称。
+        tg_num (int, optional): 该阶段所属 Timing Group 的编号。
+
+    Returns:
+        PhaseRecord: 在 with 语句中使用的阶段记录，可以通过其 add_notes 方法记录处理的 Note 数量。
+    """
+    profiler = _ACTIVE_PROFILER.get()
+    if profiler is None:
+        return _NULL_RECORD
+    return profiler.phase(name, tg_num)
+
+
+def timed_iter(iterable, name: str):
+    """该函数用来统计从可迭代对象中取出每一项所花费的时间，例如由生成器完成的拆分 Timing Group。
+
+    未启用统计时，直接返回该可迭代对象本身。
+
+    Args:
+        iterable (Iterable): 需要统计的可迭代对象。
+        name (str): 阶段名称。
+
+    Returns:
+        Iterable: 产出相同内容的可迭代对象。
+    """
+    if _ACTIVE_PROFILER.get() is None:
+        return iterable
+    return _timed_iter(iter(iterable), name)
+
+
+def _timed_iter(iterator, name: str):
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,89 @@
+"""这个模块用来以误差有界的自适应方式对 Arc 进行采样。
+
+在两个关键帧之间，Arc 的位置将被视为线性变化。对于一段时间跨度为 h 的线段，曲线与其弦之间的距离不超过
+h² / 8 × max|f''|，因此只需在这一上界超过允许误差时二分该线段。直线 Arc 的二阶导数为 0，只保留两个端点。
+"""
+import numpy as np
+
+from arcaea.assets.easing import EASING_B, EASING_SI, EASING_SO, ease
+
+_HALF_PI_SQUARED = (np.pi / 2) ** 2
+
+
+def _easing_curvature_bound(start_percent: np.ndarray, end_percent: np.ndarray, easing_code: np.ndarray) -> np.ndarray:
+    """该函数用来计算缓动函数在一段比例区间内二阶导数绝对值的上界。
+
+    在 [0, 1] 上，si 的二阶导数绝对值单调递增，so 的单调递减，b 的为 |6 - 12p|，因此上界总在区间端点处取得。
+
+    Args:
+        start_percent (np.ndarray): 区间开始处的比例。
+        end_percent (np.ndarray): 区间结束处的比例。
+        easing_code (np.ndarray): 缓动类型在 EASING_TYPES 中的编号。
+
+    Returns:
+        np.ndarray: 二阶导数绝对值的上界。
+    """
+    start_percent, end_percent = np.clip(start_percent, 0, 1), np.clip(end_percent, 0, 1)
+    return np.select(
+        [easing_code == EASING_SI, easing_code == EASING_SO, easing_code == EASING_B],
+        [_HALF_PI_SQUARED * np.sin(end_percent * (np.pi / 2)),
+         _HALF_PI_SQUARED * np.cos(start_percent * (np.pi / 2)),
+         np.maximum(np.abs(6 - 12 * start_percent), np.abs(6 - 12 * end_percent))],
+        default=0.0)
+
+
+def adaptive_arc_keyframes(arcs: np.ndarray, tolerance: float, min_interval: float = 1.0) -> dict[str, np.ndarray]:
+    """该函数用来为多个 Arc 生成误差不超过给定值的关键帧。
+
+    在相邻两个关键帧之间线性插值时，插值位置与 Arc 真实位置的距离不超过 tolerance。
+    为避免关键帧过密，时间跨度不超过 min_interval 的线段不再二分。
+
+    Args:
+        arcs (np.ndarray): NoteTable 中所有 Arc 组成的结构化数组。
+        tolerance (float): Arc 坐标空间中允许的最大位置误差。
+        min_interval (float, optional): 两个关键帧之间的最小时间间隔（毫秒）。
+
+    Returns:
+        dict[str, np.ndarray]: 以 arc（关键帧所属 Arc 的编号），time，x 和 y 为键的等长数组，
+            按 Arc 编号和时间排序。每个 Arc 至少包含其开始和结束两个关键帧。
+    """
+    arc_count = len(arcs)
+    durations = arcs["end_time"] - arcs["touch_time"]
+    x_distances = np.abs(arcs["x_end_pos"] - arcs["x_start_pos"])
+    y_distances = np.abs(arcs["y_end_pos"] - arcs["y_start_pos"])
+
+    # 每个 Arc 的开始和结束都是关键帧
+    keyframe_arcs = [np.arange(arc_count), np.arange(arc_count)]
+    keyframe_percents = [np.zeros(arc_count), np.ones(arc_count)]
+    segment_arcs, segment_starts, segment_ends = np.arange(arc_count), np.zeros(arc_count), np.ones(arc_count)
+
+    while len(segment_arcs):
+        segment_widths = segment_ends - segment_starts
+        # 比例空间中的二阶导数上界，时长在换算中被约去
+        curvature = np.hypot(
+            x_distances[segment_arcs] * _easing_curvature_bound(
+                segment_starts, segment_ends, arcs["movement_for_x"][segment_arcs]),
+            y_distances[segment_arcs] * _easing_curvature_bound(
+                segment_starts, segment_ends, arcs["movement_for_y"][segment_arcs]))
+        error_bound = segment_widths * segment_widths / 8 * curvature
+        split = (error_bound > tolerance) & (segment_widths * durations[segment_arcs] > min_interval)
+        segment_arcs, segment_starts, segment_ends = segment_arcs[split], segment_starts[split], segment_ends[split]
+        middles = (segment_starts + segment_ends) / 2
+        keyframe_arcs.append(segment_arcs)
+        keyframe_percents.append(middles)
+        segment_arcs = np.concatenate((segment_arcs, segment_arcs))
+        segment_starts = np.concatenate((segment_starts, middles))
+        segment_ends = np.concatenate((middles, segment_ends))
+
+    arc_index, percents = np.concatenate(keyframe_arcs), np.concatenate(keyframe_percents)
+    order = np.lexsort((percents, arc_index))
+    arc_index, percents = arc_index[order], percents[order]
+    selected = arcs[arc_index]
+    return {
+        "arc": arc_index,
+        "time": selected["touch_time"] + percents * durations[arc_index],
+        "x": selected["x_start_pos"] + (selected["x_end_pos"] - selected["x_start_pos"]) * ease(
+            percents, selected["movement_for_x"]),
+        "y": selected["y_start_pos"] + (selected["y_end_pos"] - selected["y_start_pos"]) * ease(
+            percents, selected["movement_for_y"]),
+    }
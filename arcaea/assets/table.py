@@ -0,0 +1,223 @@
+"""这个模块用来以列的形式保存一个 Timing Group 中的所有 Note。
+
+每一种 Note 的各项属性都保存在连续的 NumPy 结构化数组中，以便后续的坐标变换和编译等步骤按列批量处理，
+并使缓存或序列化谱面的开销尽可能小。
+"""
+import numpy as np
+
+# Arc 的全部坐标变化移动类型。在 NoteTable 中以其在该元组中的编号保存。
+MOVEMENT_TYPES = ("s", "b", "si", "so", "sisi", "siso", "sosi", "soso")
+# Arc 在单个坐标轴上的缓动类型。在 NoteTable 中以其在该元组中的编号保存。
+EASING_TYPES = ("s", "b", "si", "so")
+
+TAP_DTYPE = np.dtype([("touch_time", np.float64), ("trace", np.int8), ("line", np.int32)])
+HOLD_DTYPE = np.dtype([
+    ("touch_time", np.float64), ("end_time", np.float64), ("trace", np.int8), ("line", np.int32)])
+ARC_DTYPE = np.dtype([
+    ("touch_time", np.float64), ("end_time", np.float64),
+    ("x_start_pos", np.float64), ("y_start_pos", np.float64), ("x_end_pos", np.float64), ("y_end_pos", np.float64),
+    ("movement_type", np.int8), ("movement_for_x", np.int8), ("movement_for_y", np.int8),
+    ("arc_color", np.int8), ("none_value", "U16"), ("is_trace", np.bool_), ("line", np.int32)])
+ARCTAP_DTYPE = np.dtype([("touch_time", np.float64), ("arc", np.int32), ("line", np.int32)])
+# Timing Group 中按谱面文件顺序排列的 timing 行
+TIMING_DTYPE = np.dtype([("start_time", np.float64), ("line", np.int32)])
+
+NOTE_DTYPES = {"taps": TAP_DTYPE, "holds": HOLD_DTYPE, "arcs": ARC_DTYPE, "arctaps": ARCTAP_DTYPE}
+
+
+def split_movement_type(movement_type: str) -> tuple[str, str]:
+    """该函数用来将 Arc 的坐标变化移动类型拆分为 x 轴和 y 轴的缓动类型。
+
+    其中 b = bezier(), s = linear(), si = sine(), so = cosine()。
+    如果 y 轴的缓动类型是 s，那么它可以省略不写，例如 bs 可以省略为 b。
+
+    Args:
+        movement_type (str): 该 Arc 的坐标变化移动类型。
+
+    Raises:
+        ValueError: 该坐标变化移动类型无法识别。
+
+    Returns:
+        tuple[str, str]: x 轴和 y 轴的缓动类型。
+    """
+    if len(movement_type) == 4:
+        movement_for_x, movement_for_y = movement_type[0:2], movement_type[2:4]
+    else:
+        movement_for_x, movement_for_y = movement_type, "s"
+    if movement_type not in MOVEMENT_TYPES or movement_for_x not in EASING_TYPES \
+            or movement_for_y not in EASING_TYPES:
+        raise ValueError(f"无法识别的 Arc 坐标变化移动类型：{movement_type}")
+    return movement_for_x, movement_for_y
+
+
+class NoteTable:
+    """Note 列表类。
+
+    该类以列的形式保存一个 Timing Group 中的 Tap，Hold，Arc 和 Arctap。
+    新增的 Note 先暂存在行列表中，在第一次读取对应的列时一次性转换为结构化数组。
+    """
+
+    def __init__(self) -> None:
+        """该函数用来创建一个空的 Note 列表。
+        """
+        self._arrays = {name: np.empty(0, dtype=dtype) for name, dtype in NOTE_DTYPES.items()}
+        self._pending_rows = {name: [] for name in NOTE_DTYPES}
+        # 超出 int8 范围的轨道编号的原始值，以 Note 在该列中的编号为键
+        self.original_traces = {"taps": {}, "holds": {}}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> "NoteTable":
+        """该函数用来由已有的结构化数组创建 Note 列表，而不复制这些数组。
+
+        Args:
+            arrays (dict[str, np.ndarray]): 以 taps，holds，arcs 和 arctaps 为键的结构化数组。
+
+        Returns:
+            NoteTable: 创建的 Note 列表。
+        """
+        table = cls()
+        for name in NOTE_DTYPES:
+            if name in arrays:
+                table._arrays[name] = arrays[name]
+        return table
+
+    def __len__(self) -> int:
+        return sum(len(self._column(name)) for name in NOTE_DTYPES)
+
+    def __getstate__(self) -> dict:
+        return {"arrays": self.to_arrays(), "original_traces": self.original_traces}
+
+    def __setstate__(self, state: dict) -> None:
+        self._arrays = state["arrays"]
+        self._pending_rows = {name: [] for name in NOTE_DTYPES}
+        self.original_traces = state["original_traces"]
+
+    def _narrow_trace(self, name: str, trace: int) -> int:
+        """该函数用来将轨道编号收窄到 int8。
+
+        超出其范围的编号饱和到边界值，而不是回绕到 1-4 之中，使其仍能被批量校验发现；其原始值记录在
+        original_traces 中，使校验报告给出原始的轨道编号。
+
+        Args:
+            name (str): Note 种类，为 taps 或 holds。
+            trace (int): 轨道编号。
+
+        Returns:
+            int: 收窄后的轨道编号。
+        """
+        narrowed = min(max(trace, -128), 127)
+        if narrowed != trace:
+            self.original_traces[name][len(self._arrays[name]) + len(self._pending_rows[name])] = trace
+        return narrowed
+
+    def _column(self, name: str) -> np.ndarray:
+        """该函数用来取得某一种 Note 的结构化数组，并将暂存的行合并进去。
+
+        Args:
+            name (str): Note 种类，为 taps，holds，arcs 或 arctaps。
+
+        Returns:
+            np.ndarray: 该种 Note 的结构化数组。
+        """
+        pending_rows = self._pending_rows[name]
+        if pending_rows:
+            new_rows = np.array(pending_rows, dtype=NOTE_DTYPES[name])
+            self._arrays[name] = np.concatenate((self._arrays[name], new_rows))
+            pending_rows.clear()
+        return self._arrays[name]
+
+    @property
+    def taps(self) -> np.ndarray:
+        """np.ndarray: 所有 Tap 组成的结构化数组。
+        """
+        return self._column("taps")
+
+    @property
+    def holds(self) -> np.ndarray:
+        """np.ndarray: 所有 Hold 组成的结构化数组。
+        """
+        return self._column("holds")
+
+    @property
+    def arcs(self) -> np.ndarray:
+        """np.ndarray: 所有 Arc 组成的结构化数组。
+        """
+        return self._column("arcs")
+
+    @property
+    def arctaps(self) -> np.ndarray:
+        """np.ndarray: 所有 Arctap 组成的结构化数组。其中 arc 列为该 Arctap 所在 Arc 的编号。
+        """
+        return self._column("arctaps")
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """该函数用来取得所有种类的 Note 的结构化数组。
+
+        Returns:
+            dict[str, np.ndarray]: 以 taps，holds，arcs 和 arctaps 为键的结构化数组。
+        """
+        return {name: self._column(name) for name in NOTE_DTYPES}
+
+    def add_tap(self, touch_time: float, trace: int, line: int = 0):
+        """该函数用来添加一个 Tap。
+
+        Args:
+            touch_time (float): 该 Tap 被打击的时间。
+            trace (int): 该 Tap 落在轨道的编号。
+            line (int, optional): 该 Tap 在谱面文件中的行号。
+        """
+        self._pending_rows["taps"].append((touch_time, self._narrow_trace("taps", trace), line))
+
+    def add_hold(self, start_time: float, end_time: float, trace: int, line: int = 0):
+        """该函数用来添加一个 Hold。
+
+        Args:
+            start_time (float): 该 Hold 被开始打击的时间。
+            end_time (float): 该 Hold 被结束打击的时间。
+            trace (int): 该 Hold 落在轨道的编号。
+            line (int, optional): 该 Hold 在谱面文件中的行号。
+        """
+        self._pending_rows["holds"].append((start_time, end_time, self._narrow_trace("holds", trace), line))
+
+    def add_arc(
+        self, start_time: float, end_time: float, x_start_pos: float, y_start_pos: float, movement_type: str,
+        x_end_pos: float, y_end_pos: float, arc_color: int, none_value: str, is_trace: bool, line: int = 0
+    ) -> int:
+        """该函数用来添加一个 Arc。
+
+        Args:
+            start_time (float): 该 Arc 被开始打击的时间。
+            end_time (float): 该 Arc 被结束打击的时间。
+            x_start_pos (float): 该 Arc 被开始打击时的横向位置。
+            y_start_pos (float): 该 Arc 被开始打击时的纵向位置。
+            movement_type (str): 该 Arc 的坐标变化移动类型。
+            x_end_pos (float): 该 Arc 被结束打击时的横向位置。
+            y_end_pos (float): 该 Arc 被结束打击时的纵向位置。
+            arc_color (int): 该 Arc 的颜色。
+            none_value (str): 该 Arc 的 NONE 值。
+            is_trace (bool): 该 Arc 是否为黑线。
+            line (int, optional): 该 Arc 在谱面文件中的行号。
+
+        Raises:
+            ValueError: 该 Arc 的坐标变化移动类型无法识别。
+
+        Returns:
+            int: 该 Arc 在 Note 列表中的编号，用于添加位于其上的 Arctap。
+        """
+        movement_for_x, movement_for_y = split_movement_type(movement_type)
+        arc_rows = self._pending_rows["arcs"]
+        arc_rows.append((
+            start_time, end_time, x_start_pos, y_start_pos, x_end_pos, y_end_pos,
+            MOVEMENT_TYPES.index(movement_type), EASING_TYPES.index(movement_for_x),
+            EASING_TYPES.index(movement_for_y), arc_color, none_value, is_trace, line))
+        return len(self._arrays["arcs"]) + len(arc_rows) - 1
+
+    def add_arctap(self, touch_time: float, arc: int, line: int = 0):
+        """该函数用来添加一个位于 Arc 上的 Arctap。
+
+        Args:
+            touch_time (float): 该 Arctap 被打击的时间。
+            arc (int): 该 Arctap 所在 Arc 的编号。
+            line (int, optional): 该 Arctap 在谱面文件中的行号。
+        """
+        self._pending_rows["arctaps"].append((touch_time, arc, line))
@@ -0,0 +1,201 @@
+"""这个模块用来描述 Timing Group 的 BPM 时间轴。
+
+同一个 Timing Group 中的所有 Note 共用一个 BpmTimeline 实例，以避免每个 Note 重复计算 BPM 组的位置。
+"""
+from collections.abc import Iterator, Mapping
+
+import numpy as np
+
+from arcaea.assets.profiler import PHASE_FRAME_POSITIONS, phase
+
+# 谱面中的位置以 BPM × 毫秒 × 该系数 计算。
+POSITION_SCALE = 0.001 * 0.001
+
+
+class BpmTimeline:
+    """BPM 时间轴类。
+
+    该类在初始化时对 BPM 列表排序，并计算每一个 BPM 组开始时的累计位置（前缀和）。
+    此后任意时间的位置，或任意位置对应的时间，都只需要一次二分查找即可求得。
+    """
+
+    def __init__(self, bpm_list: dict[float, float]) -> None:
+        """该函数用来根据 BPM 列表创建 BPM 时间轴。
+
+        Args:
+            bpm_list (dict): 该 Timing Group 的 BPM 列表，键为 BPM 组的开始时间，值为 BPM 值。
+        """
+        segments = sorted((float(start_time), float(bpm)) for start_time, bpm in bpm_list.items())
+        # 没有 BPM 设定行的 Timing Group 视为从 0 开始、BPM 为 0 的时间轴，其中所有位置都为 0。
+        if not segments:
+            segments = [(0.0, 0.0)]
+        self.bpm_list = dict(segments)
+        self.start_times = np.array([segment[0] for segment in segments], dtype=np.float64)
+        self.bpms = np.array([segment[1] for segment in segments], dtype=np.float64)
+        # prefix_positions[i] 表示第 i 个 BPM 组开始时的累计位置。
+        self.prefix_positions = np.zeros(len(segments), dtype=np.float64)
+        np.cumsum(self.bpms[:-1] * np.diff(self.start_times) * POSITION_SCALE, out=self.prefix_positions[1:])
+        # 逐帧位置表在同一个 Timing Group 的所有 Note 之间共享，按需计算后缓存。
+        self._frame_positions_cache: dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_arrays(
+        cls, start_times: np.ndarray, bpms: np.ndarray, frame_positions: np.ndarray = None
+    ) -> "BpmTimeline":
+        """该函数用来由已保存的数组重新创建 BPM 时间轴。
+
+        Args:
+            start_times (np.ndarray): 每一个 BPM 组的开始时间。
+            bpms (np.ndarray): 每一个 BPM 组的 BPM 值。
+            frame_positions (np.ndarray, optional): 已计算的逐帧累计位置表。给出时将直接使用，而不重新计算。
+
+        Returns:
+            BpmTimeline: 重新创建的 BPM 时间轴。
+        """
+        timeline = cls(dict(zip(np.asarray(start_times).tolist(), np.asarray(bpms).tolist())))
+        if frame_positions is not None:
+            timeline._frame_positions_cache[len(frame_positions) - 1] = frame_positions
+        return timeline
+
+    def __len__(self) -> int:
+        return len(self.start_times)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BpmTimeline) and self.bpm_list == other.bpm_list
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.bpm_list.items()))
+
+    def segment_index(self, play_time):
+        """该函数用来查找某一时间所处的 BPM 组编号。
+
+        早于第一个 BPM 组的时间将被视为处于第一个 BPM 组中。
+
+        Args:
+            play_time (float | np.ndarray): 需要查找的时间，可以是单个数值或数组。
+
+        Returns:
+            int | np.ndarray: 该时间所处的 BPM 组编号。
+        """
+        index = np.searchsorted(self.start_times, play_time, side="right") - 1
+        return np.maximum(index, 0)
+
+    def position_at(self, play_time):
+        """该函数用来计算某一时间在该时间轴上的累计位置。
+
+        Args:
+            play_time (float | np.ndarray): 需要计算的时间，可以是单个数值或数组。
+
+        Returns:
+            float | np.ndarray: 该时间的累计位置。传入单个数值时返回 float，传入数组时返回同形状的数组。
+        """
+        index = self.segment_index(play_time)
+        position = self.prefix_positions[index] + \
+            self.bpms[index] * (np.asarray(play_time, dtype=np.float64) - self.start_times[index]) * POSITION_SCALE
+        if np.ndim(position) == 0:
+            return float(position)
+        return position
+
+    def time_at(self, position):
+        """该函数用来计算到达某一累计位置的最早时间，即 position_at 的反函数。
+
+        该计算要求时间轴的位置单调不减，即所有 BPM 值都不为负。对于含有负 BPM 的时间轴，其结果仅为近似值。
+        位于 BPM 为 0 的 BPM 组中的位置，将返回该 BPM 组的开始时间。
+
+        Args:
+            position (float | np.ndarray): 需要计算的累计位置，可以是单个数值或数组。
+
+        Returns:
+            float | np.ndarray: 到达该位置的时间。传入单个数值时返回 float，传入数组时返回同形状的数组。
+        """
+        position = np.asarray(position, dtype=np.float64)
+        index = np.maximum(np.searchsorted(self.prefix_positions, position, side="left") - 1, 0)
+        speed = self.bpms[index] * POSITION_SCALE
+        # 速度为 0 时，该 BPM 组中所有时间的位置都相同，直接取其开始时间。
+        safe_speed = np.where(speed == 0, 1.0, speed)
+        play_time = np.where(
+            speed == 0, self.start_times[index],
+            self.start_times[index] + (position - self.prefix_positions[index]) / safe_speed)
+        if np.ndim(play_time) == 0:
+            return float(play_time)
+        return play_time
+
+    def frame_positions(self, total_frames: int) -> np.ndarray:
+        """该函数用来计算从第 0 帧开始每一帧（每 0.001s）的累计位置。
+
+        Args:
+            total_frames (int): 需要计算的最后一帧编号。
+
+        Returns:
+            np.ndarray: 长度为 total_frames + 1 的只读累计位置数组。
+        """
+        positions = self._frame_positions_cache.get(total_frames)
+        if positions is None:
+            with phase(PHASE_FRAME_POSITIONS):
+                positions = self.position_at(np.arange(0, total_frames + 1, dtype=np.float64))
+            positions.flags.writeable = False
+            self._frame_positions_cache[total_frames] = positions
+        return positions
+
+
+class FramePositions(Mapping):
+    """单个 Note 的逐帧位置视图。
+
+    该视图本身不保存任何逐帧数据：第 t 帧时 Note 的位置，即为该 Note 的起始位置减去时间轴上第 t 帧的累计位置。
+    其中逐帧累计位置表由 BPM 时间轴计算一次后，在同一个 Timing Group 的所有 Note 之间共享。
+    """
+
+    def __init__(self, bpm_timeline: BpmTimeline, time_0_position: float, last_frame: int) -> None:
+        """该函数用来创建一个 Note 的逐帧位置视图。
+
+        Args:
+            bpm_timeline (BpmTimeline): 该 Note 所在 Timing Group 的 BPM 时间轴。
+            time_0_position (float): 该 Note 的起始位置。
+            last_frame (int): 歌曲最后一帧的编号。
+        """
+        self.bpm_timeline = bpm_timeline
+        self.time_0_position = time_0_position
+        self.last_frame = last_frame
+
+    @property
+    def shared_positions(self) -> np.ndarray:
+        """np.ndarray: 该视图所基于的、Timing Group 共享的只读逐帧累计位置表。
+        """
+        return self.bpm_timeline.frame_positions(self.last_frame)
+
+    def __getitem__(self, frame: int) -> float:
+        if not isinstance(frame, (int, np.integer)) or not 0 <= frame <= self.last_frame:
+            raise KeyError(frame)
+        return self.time_0_position - float(self.shared_positions[frame])
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.last_frame + 1))
+
+    def __len__(self) -> int:
+        return self.last_frame + 1
+
+    def shared_slice(self, start_frame: int, end_frame: int) -> np.ndarray:
+        """该函数用来取得共享的逐帧累计位置表中的一段，而不复制任何数据。
+
+        该 Note 在这些帧时的位置为 time_0_position 减去返回的数组。超出歌曲范围的帧将被忽略。
+
+        Args:
+            start_frame (int): 开始帧编号（包含）。
+            end_frame (int): 结束帧编号（不包含）。
+
+        Returns:
+            np.ndarray: 共享逐帧累计位置表的只读切片。
+        """
+        return self.shared_positions[max(start_frame, 0):max(end_frame, 0)]
+
+    def slice(self, start_frame: int, end_frame: int) -> np.ndarray:
+        """该函数用来计算该 Note 在一段帧中的位置。
+
+        Args:
+            start_frame (int): 开始帧编号（包含）。
+            end_frame (int): 结束帧编号（不包含）。
+
+        Returns:
+            np.ndarray: 该 Note 在这些帧时的位置。
+        """
+        return self.time_0_position - self.shared_slice(start_frame, end_frame)
@@ -0,0 +1,250 @@
+"""这个模块用来对一个 Timing Group 中的全部 Note 进行批量校验。
+
+校验直接作用于 NoteTable 中的结构化数组：每一项规则都是对整列数据的一次 NumPy 掩码运算，
+只有被标记出问题的 Note 才会逐个生成问题记录，因此校验的代价与 Note 数量近似成线性，且常数很小。
+问题分为错误和警告两种：存在错误的谱面无法被正确转换，而警告只记录在诊断报告中，不影响转换。
+"""
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+import numpy as np
+
+from arcaea.assets.table import NoteTable
+
+# 问题的严重程度
+ERROR = "错误"
+WARNING = "警告"
+
+# 谱面诊断报告中的问题名称
+X_OUT_OF_RANGE = "横向坐标超界"
+Y_OUT_OF_RANGE = "纵向坐标超界"
+TRACE_OUT_OF_RANGE = "轨道超出允许范围"
+NEGATIVE_DURATION = "负持续时间"
+ZERO_DURATION = "持续时间为 0"
+OUTSIDE_ARC = "不在 Arc 的时间范围内"
+OVERLAPPING_HOLDS = "与同一轨道上的 Hold 重叠"
+UNRECOGNIZED_LINE = "无法识别"
+STRUCTURE_ERROR = "结构错误"
+MISSING_TIMING = "缺失"
+FIRST_TIMING_NOT_AT_ZERO = "第一个 timing 不在 0 时刻"
+TIMING_OUT_OF_ORDER = "开始时间早于上一个 timing"
+
+
+class ChartIssue(NamedTuple):
+    """谱面中的一个问题。
+
+    tg_num 为问题所在 Timing Group 的编号，无法确定所在的 Timing Group 时为 None。
+    line 为问题所在的谱面文件行号（从 1 开始计数）。
+    """
+
+    tg_num: int
+    line: int
+    note_type: str
+    issue: str
+    severity: str
+    detail: str = ""
+
+    def __str__(self) -> str:
+        location = f"第 {self.line} 行" if self.tg_num is None else f"第 {self.line} 行（Timing Group {self.tg_num}）"
+        detail = f"：{self.detail}" if self.detail else ""
+        return f"[{self.severity}] {location}：{self.note_type} {self.issue}{detail}"
+
+
+class ValidationReport:
+    """谱面校验报告类。
+
+    该类按行号顺序保存一个或多个 Timing Group 中的全部问题。
+    """
+
+    def __init__(self, issues: Iterable[ChartIssue] = ()) -> None:
+        """该函数用来创建一个校验报告。
+
+        Args:
+            issues (Iterable[ChartIssue], optional): 报告中的问题。
+        """
+        self.issues = sorted(issues, key=lambda issue: (issue.line, -1 if issue.tg_num is None else issue.tg_num))
+
+    @classmethod
+    def merge(cls, reports: Iterable["ValidationReport"]) -> "ValidationReport":
+        """该函数用来合并多个校验报告。
+
+        Args:
+            reports (Iterable[ValidationReport]): 需要合并的校验报告。
+
+        Returns:
+            ValidationReport: 包含所有问题的校验报告。
+        """
+        return cls(issue for report in reports for issue in report.issues)
+
+    def __len__(self) -> int:
+        return len(self.issues)
+
+    def __iter__(self) -> Iterator[ChartIssue]:
+        return iter(self.issues)
+
+    @property
+    def errors(self) -> list[ChartIssue]:
+        """list[ChartIssue]: 报告中的所有错误。
+        """
+        return [issue for issue in self.issues if issue.severity == ERROR]
+
+    @property
+    def warnings(self) -> list[ChartIssue]:
+        """list[ChartIssue]: 报告中的所有警告。
+        """
+        return [issue for issue in self.issues if issue.severity == WARNING]
+
+    def counts(self, severity: str = None) -> Counter:
+        """该函数用来统计各类问题的数量。
+
+        Args:
+            severity (str, optional): 只统计该严重程度的问题。未给出时统计所有问题。
+
+        Returns:
+            Counter: 键为 “Note 类型 问题” 形式的字符串，与 TimingGroup.diagnostics 的格式相同。
+        """
+        return Counter(
+            f"{issue.note_type} {issue.issue}" for issue in self.issues
+            if severity is None or issue.severity == severity)
+
+    def format(self, severity: str = None) -> str:
+        """该函数用来生成每个问题一行的文本报告。
+
+        Args:
+            severity (str, optional): 只包含该严重程度的问题。未给出时包含所有问题。
+
+        Returns:
+            str: 文本报告。没有任何问题时为空字符串。
+        """
+        return "\n".join(str(issue) for issue in self.issues if severity is None or issue.severity == severity)
+
+
+def _collect(
+    issues: list[ChartIssue], tg_num: int, note_type: str, issue: str, severity: str, mask: np.ndarray,
+    rows: np.ndarray, details: Iterable[str] = None
+):
+    """该函数用来为掩码中被标记的每一个 Note 生成问题记录。
+
+    Args:
+        issues (list[ChartIssue]): 用来接收问题记录的列表。
+        tg_num (int): 这些 Note 所在 Timing Group 的编号。
+        note_type (str): 这些 Note 的类型。
+        issue (str): 问题名称。
+        severity (str): 问题的严重程度。
+        mask (np.ndarray): 与 rows 等长的布尔掩码。
+        rows (np.ndarray): 这些 Note 的结构化数组。
+        details (Iterable[str], optional): 每一个被标记的 Note 的问题说明。
+    """
+    if not mask.any():
+        return
+    lines = rows["line"][mask].tolist()
+    details = [""] * len(lines) if details is None else details
+    issues.extend(ChartIssue(tg_num, line, note_type, issue, severity, detail) for line, detail in zip(lines, details))
+
+
+def _position_issues(issues: list[ChartIssue], tg_num: int, arcs: np.ndarray):
+    for issue, axis in ((X_OUT_OF_RANGE, "x"), (Y_OUT_OF_RANGE, "y")):
+        for endpoint, name in (("start", "开始"), ("end", "结束")):
+            positions = arcs[f"{axis}_{endpoint}_pos"]
+            mask = (positions < 0) | (positions > 1)
+            _collect(issues, tg_num, "Arc", issue, WARNING, mask, arcs,
+                     (f"{name}坐标为 {position}" for position in positions[mask].tolist()))
+
+
+def _overlapping_holds(holds: np.ndarray) -> np.ndarray:
+    """该函数用来标记与同一轨道上更早开始的 Hold 重叠的 Hold。
+
+    将 Hold 按轨道和开始时间排序后，一个 Hold 与之前的某个 Hold 重叠，当且仅当它的开始时间早于
+    同一轨道上之前所有 Hold 的最晚结束时间。该最晚结束时间由分段的累计最大值一次求得。
+
+    Args:
+        holds (np.ndarray): Hold 的结构化数组。
+
+    Returns:
+        np.ndarray: 与 holds 等长的布尔掩码。
+    """
+    mask = np.zeros(len(holds), dtype=np.bool_)
+    if len(holds) < 2:
+        return mask
+    order = np.lexsort((holds["touch_time"], holds["trace"]))
+    traces = holds["trace"][order]
+    start_times = holds["touch_time"][order]
+    end_times = holds["end_time"][order]
+    # 每个轨道的结束时间加上递增的偏移量，使累计最大值不会跨越轨道
+    span = float(np.max(end_times) - np.min(np.minimum(start_times, end_times))) + 1.0
+    segment = np.concatenate(([0], np.cumsum(traces[1:] != traces[:-1])))
+    latest_end = np.maximum.accumulate(end_times + segment * span) - segment * span
+    overlapped = np.zeros(len(holds), dtype=np.bool_)
+    overlapped[1:] = (segment[1:] == segment[:-1]) & (start_times[1:] < latest_end[:-1])
+    mask[order] = overlapped
+    return mask
+
+
+def validate_notes(notes: NoteTable, tg_num: int = 0) -> ValidationReport:
+    """该函数用来批量校验一个 Timing Group 中的全部 Note。
+
+    错误：Tap 和 Hold 的轨道不是 1-4 中的整数，Hold 或 Arc 的结束时间早于开始时间。
+    警告：Arc 的坐标超出 [0, 1]，Hold 的持续时间为 0，Arctap 不在其所在 Arc 的时间范围内，
+    同一轨道上的 Hold 互相重叠。
+
+    Args:
+        notes (NoteTable): 该 Timing Group 的 Note 列表。
+        tg_num (int, optional): 该 Timing Group 的编号。
+
+    Returns:
+        ValidationReport: 该 Timing Group 的校验报告。
+    """
+    issues = []
+    taps, holds, arcs, arctaps = notes.taps, notes.holds, notes.arcs, notes.arctaps
+
+    for note_type, name, rows in (("Tap", "taps", taps), ("Hold", "holds", holds)):
+        traces = rows["trace"]
+        mask = (traces < 1) | (traces > 4)
+        # 超出 int8 范围的轨道编号已饱和到边界值，报告其原始值
+        original_traces = notes.original_traces[name]
+        _collect(issues, tg_num, note_type, TRACE_OUT_OF_RANGE, ERROR, mask, rows,
+                 (f"轨道为 {original_traces.get(row, trace)}"
+                  for row, trace in zip(np.flatnonzero(mask).tolist(), traces[mask].tolist())))
+
+    for note_type, rows in (("Hold", holds), ("Arc", arcs)):
+        _collect(issues, tg_num, note_type, NEGATIVE_DURATION, ERROR, rows["end_time"] < rows["touch_time"], rows)
+    _collect(issues, tg_num, "Hold", ZERO_DURATION, WARNING, holds["end_time"] == holds["touch_time"], holds)
+    _collect(issues, tg_num, "Hold", OVERLAPPING_HOLDS, WARNING, _overlapping_holds(holds), holds)
+
+    _position_issues(issues, tg_num, arcs)
+
+    if len(arctaps):
+        owners = arcs[arctaps["arc"]]
+        mask = (arctaps["touch_time"] < owners["touch_time"]) | (arctaps["touch_time"] > owners["end_time"])
+        _collect(issues, tg_num, "Arctap", OUTSIDE_ARC, WARNING, mask, arctaps,
+                 (f"打击时间为 {touch_time}" for touch_time in arctaps["touch_time"][mask].tolist()))
+
+    return ValidationReport(issues)
+
+
+def validate_timings(timings: np.ndarray, tg_num: int = 0, group_line: int = 0) -> ValidationReport:
+    """该函数用来批量校验一个 Timing Group 中的全部 timing 行。
+
+    错误：该 Timing Group 中没有 timing 行，第一个 timing 行的开始时间不为 0，
+    某个 timing 行的开始时间早于谱面文件中在它之前的 timing 行。
+
+    Args:
+        timings (np.ndarray): 按谱面文件顺序排列的 timing 行，其 dtype 为 TIMING_DTYPE。
+        tg_num (int, optional): 该 Timing Group 的编号。
+        group_line (int, optional): 没有 timing 行时，报告问题所用的行号。
+
+    Returns:
+        ValidationReport: 该 Timing Group 的 timing 行的校验报告。
+    """
+    if not len(timings):
+        return ValidationReport([ChartIssue(tg_num, group_line, "timing", MISSING_TIMING, ERROR)])
+    issues = []
+    start_times = timings["start_time"]
+    _collect(issues, tg_num, "timing", FIRST_TIMING_NOT_AT_ZERO, ERROR, start_times[:1] != 0, timings[:1],
+             (f"开始时间为 {start_times[0]}",))
+    mask = np.zeros(len(timings), dtype=np.bool_)
+    mask[1:] = start_times[1:] < start_times[:-1]
+    _collect(issues, tg_num, "timing", TIMING_OUT_OF_ORDER, ERROR, mask, timings,
+             (f"开始时间为 {start_time}" for start_time in start_times[mask].tolist()))
+    return ValidationReport(issues)
@@ -0,0 +1,190 @@
+"""这个模块用来按时间查找某一时刻或某一时间段中可见的 Note。
+
+一个 Note 从其位置与判定线位置之差首次不超过可见深度时出现，到其结束时间消失，这一时间段称为它的可见区间。
+IntervalIndex 按区间长度将区间分为若干层，第 j 层中的区间长度位于 [2^j, 2^(j+1)) 中，每层按开始时间排序。
+查询时间段 [t0, t1] 时，每层只需一次二分查找即可取出开始时间位于 [t0 - 2^(j+1), t1] 中的区间，其中与查询时间段
+不相交的区间在 t0 - 2^j 时必然可见，因此查询的代价为 O(层数 × log n + k)，只与画面中的 Note 密度有关，而与谱面大小无关。
+"""
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+
+from arcaea.assets.timeline import POSITION_SCALE, BpmTimeline
+
+# 以基准 BPM 计算时，Note 从出现到抵达判定线的默认时间（毫秒）。
+DEFAULT_VISIBLE_TIME = 800.0
+# 没有非零 BPM 的谱面所使用的基准 BPM。
+DEFAULT_BASE_BPM = 100.0
+
+
+def visible_depth(base_bpm: float, visible_time: float = DEFAULT_VISIBLE_TIME) -> float:
+    """该函数用来计算可见深度，即 Note 出现时其位置与判定线位置之差。
+
+    与 Arcaea 相同，流速由谱面的基准 BPM（Timing Group 0 的初始 BPM）决定。
+
+    Args:
+        base_bpm (float): 谱面的基准 BPM。
+        visible_time (float, optional): 以基准 BPM 计算时，Note 从出现到抵达判定线的时间（毫秒）。
+
+    Returns:
+        float: 可见深度。
+    """
+    return (abs(base_bpm) or DEFAULT_BASE_BPM) * visible_time * POSITION_SCALE
+
+
+def visibility_windows(
+    timeline: BpmTimeline, start_times: np.ndarray, end_times: np.ndarray, depth: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """该函数用来计算多个 Note 的可见区间。
+
+    Note 在其位置减去可见深度的位置被判定线到达时出现，该时间由 BpmTimeline.time_at 求得。
+    含有负 BPM 的时间轴中，位置不随时间单调增加，Note 可能多次出现，此时将出现时间视为负无穷。
+
+    Args:
+        timeline (BpmTimeline): Note 所在 Timing Group 的 BPM 时间轴。
+        start_times (np.ndarray): 每个 Note 的开始时间。
+        end_times (np.ndarray): 每个 Note 的结束时间。Tap 和 Arctap 与开始时间相同。
+        depth (float): 可见深度。
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: 每个 Note 的出现时间和消失时间。
+    """
+    start_times = np.asarray(start_times, dtype=np.float64)
+    if np.any(timeline.bpms < 0):
+        appear_times = np.full(len(start_times), -np.inf)
+    else:
+        appear_times = np.minimum(
+            np.asarray(timeline.time_at(timeline.position_at(start_times) - depth), dtype=np.float64), start_times)
+    return appear_times, np.asarray(end_times, dtype=np.float64).copy()
+
+
+class IntervalIndex:
+    """该类用来在一组闭区间中查找与某一时刻或某一时间段相交的区间。
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray) -> None:
+        """该函数用来由区间的开始和结束时间创建索引。
+
+        Args:
+            starts (np.ndarray): 每个区间的开始时间，可以为负无穷。
+            ends (np.ndarray): 每个区间的结束时间，不早于开始时间。
+        """
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        lengths = self.ends - self.starts
+        # 长度为无穷的区间单独成层，其余区间按长度以 2 的幂分层
+        unbounded = ~np.isfinite(lengths)
+        levels = np.zeros(len(lengths), dtype=np.int64)
+        bounded_lengths = lengths[~unbounded]
+        levels[~unbounded] = np.floor(np.log2(np.maximum(bounded_lengths, 1.0))).astype(np.int64)
+        self._levels = []
+        for level in np.unique(levels[~unbounded]).tolist():
+            members = np.flatnonzero(~unbounded & (levels == level))
+            members = members[np.argsort(self.starts[members], kind="stable")]
+            self._levels.append((2.0 ** (level + 1), members, self.starts[members]))
+        self._unbounded = np.flatnonzero(unbounded)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def query(self, start_time: float, end_time: float = None) -> np.ndarray:
+        """该函数用来查找与时间段 [start_time, end_time] 相交的所有区间。
+
+        Args:
+            start_time (float): 时间段的开始时间。
+            end_time (float, optional): 时间段的结束时间。未给出时查找包含 start_time 这一时刻的区间。
+
+        Returns:
+            np.ndarray: 相交区间的编号，按编号排序。
+        """
+        if end_time is None:
+            end_time = start_time
+        parts = [self._unbounded]
+        for max_length, members, starts in self._levels:
+            low = np.searchsorted(starts, start_time - max_length, side="left")
+            high = np.searchsorted(starts, end_time, side="right")
+            parts.append(members[low:high])
+        candidates = np.concatenate(parts)
+        hits = candidates[(self.ends[candidates] >= start_time) & (self.starts[candidates] <= end_time)]
+        hits.sort()
+        return hits
+
+    def sweep(self, times: Iterable[float]) -> Iterator[np.ndarray]:
+        """该函数用来依次查找包含各个时刻的区间。
+
+        扫描过程中维护当前可见的区间，每一个时刻只需加入新出现的区间并移除已经结束的区间，
+        因此依次处理所有帧的总代价与区间数量和各帧可见区间数量之和成正比。
+
+        Args:
+            times (Iterable[float]): 单调不减的时刻。
+
+        Raises:
+            ValueError: 当时刻不是单调不减时，抛出该异常。
+
+        Yields:
+            np.ndarray: 包含该时刻的区间的编号，按编号排序。
+        """
+        order = np.argsort(self.starts, kind="stable")
+        sorted_starts = self.starts[order]
+        active = np.empty(0, dtype=np.int64)
+        added = 0
+        last_time = -np.inf
+        for play_time in times:
+            if play_time < last_time:
+                raise ValueError(f"扫描的时刻必须单调不减，而 {play_time} 早于 {last_time}。")
+            last_time = play_time
+            new_added = int(np.searchsorted(sorted_starts, play_time, side="right"))
+            if new_added > added:
+                active = np.concatenate((active, order[added:new_added]))
+                active.sort()
+                added = new_added
+            active = active[self.ends[active] >= play_time]
+            yield active
+
+
+class VisibilityIndex:
+    """该类用来查找一个 Timing Group 中在某一时刻或某一时间段可见的 Tap、Hold、Arc 和 Arctap。
+    """
+
+    NOTE_KINDS = ("taps", "holds", "arcs", "arctaps")
+
+    def __init__(self, timeline: BpmTimeline, arrays: dict[str, np.ndarray], depth: float) -> None:
+        """该函数用来创建一个 Timing Group 的可见区间索引。
+
+        Args:
+            timeline (BpmTimeline): 该 Timing Group 的 BPM 时间轴。
+            arrays (dict[str, np.ndarray]): 以 taps，holds，arcs 和 arctaps 为键的 Note 列。
+            depth (float): 可见深度。
+        """
+        self.depth = depth
+        self.indexes = {}
+        for kind in self.NOTE_KINDS:
+            notes = arrays[kind]
+            end_times = notes["end_time"] if "end_time" in notes.dtype.names else notes["touch_time"]
+            self.indexes[kind] = IntervalIndex(*visibility_windows(timeline, notes["touch_time"], end_times, depth))
+
+    def query(self, start_time: float, end_time: float = None) -> dict[str, np.ndarray]:
+        """该函数用来查找在时间段 [start_time, end_time] 中任意时刻可见的 Note。
+
+        Args:
+            start_time (float): 时间段的开始时间（毫秒）。
+            end_time (float, optional): 时间段的结束时间。未给出时只查找 start_time 这一时刻。
+
+        Returns:
+            dict[str, np.ndarray]: 以 taps，holds，arcs 和 arctaps 为键，值为可见 Note 在 Note 列中的编号。
+        """
+        return {kind: index.query(start_time, end_time) for kind, index in self.indexes.items()}
+
+    def sweep(self, times: Iterable[float]) -> Iterator[dict[str, np.ndarray]]:
+        """该函数用来依次查找在各个时刻可见的 Note，参见 IntervalIndex.sweep。
+
+        Args:
+            times (Iterable[float]): 单调不减的时刻（毫秒）。
+
+        Yields:
+            dict[str, np.ndarray]: 与 query 格式相同的可见 Note。
+        """
+        times = np.fromiter(times, dtype=np.float64)
+        kinds = list(self.indexes)
+        for visible in zip(*(self.indexes[kind].sweep(times) for kind in kinds)):
+            yield dict(zip(kinds, visible))
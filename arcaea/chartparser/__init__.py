@@ -1,24 +1,20 @@
 """该模块用来解析 Arcaea 谱面。
 """
+import json
+import logging
 import os
-import pickle
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
 
-from arcaea.assets import *
-
-
-def write_list_to_file(file: str, list_: list):
-    """该函数可以使用 pickle 工具将列表写入文件。
+import numpy as np
 
-    Args:
-        file (str): 文件所在的路径。
-        list_ (list): 需要写入文件的列表。
-    """
+from arcaea.assets import *
+from arcaea.chartparser.lexer import (
+    ARC, EMPTY, GROUP_END, GROUP_START, HEADER, HOLD, IGNORED, SEPARATOR, TAP, TIMING, ChartToken, tokenize
+)
 
-    # 如果已经存在该文件则删除
-    if os.path.exists(file):
-        os.remove(file)
-    with open(file, "xb") as file:
-        pickle.dump(list_, file)
+logger = logging.getLogger(__name__)
 
 
 def write_str_to_file(file: str, str_: str):
@@ -34,220 +30,732 @@ def write_str_to_file(file: str, str_: str):
         file.write(str_)
 
 
+class ParsedChart:
+    """该类用来保存一个 Arcaea 谱面的解析结果。
+
+    解析结果只保存在内存中。解析过程不会写入任何文件，因此可以在同一个工作目录或同一个进程池中同时解析多个谱面。
+    """
+
+    def __init__(
+        self, offset: int, timing_group_list: list["TimingGroup"], headers: dict = None,
+        timing_group_value_dict: dict[int, int] = None, context: ConversionContext = None
+    ):
+        """该函数用来创建一个谱面解析结果。
+
+        Args:
+            offset (int): 谱面音乐延迟数值。
+            timing_group_list (list[TimingGroup]): 该谱面中按编号排列的所有 Timing Group。
+            headers (dict, optional): 该谱面的头部信息。
+            timing_group_value_dict (dict[int, int], optional): 每个 Timing Group 内容在谱面文件中的开始和结束下标。
+            context (ConversionContext, optional): 该谱面的转换设定。
+        """
+        self.offset = offset
+        self.context = context
+        self.timing_group_list = timing_group_list
+        self.headers = headers if headers is not None else {"AudioOffset": offset}
+        self.timing_group_value_dict = timing_group_value_dict if timing_group_value_dict is not None else {}
+
+    def __len__(self) -> int:
+        return sum(len(timing_group.notes) for timing_group in self.timing_group_list)
+
+    @property
+    def notes(self) -> list[NoteTable]:
+        """list[NoteTable]: 按 Timing Group 编号排列的 Note 列表。
+        """
+        return [timing_group.notes for timing_group in self.timing_group_list]
+
+    @property
+    def diagnostics(self) -> dict[int, dict[str, int]]:
+        """dict[int, dict[str, int]]: 每个存在问题的 Timing Group 中各类问题的数量，键为 Timing Group 编号。
+        """
+        return {
+            timing_group.tg_num: dict(timing_group.diagnostics)
+            for timing_group in self.timing_group_list if timing_group.diagnostics}
+
+    @property
+    def base_bpm(self) -> float:
+        """float: 谱面的基准 BPM，即 Timing Group 0 的初始 BPM，它决定了所有 Timing Group 的流速。
+        """
+        if not self.timing_group_list:
+            return 0.0
+        return float(self.timing_group_list[0].bpm_timeline.bpms[0])
+
+    def visible_notes(
+        self, start_time: float, end_time: float = None, visible_time: float = DEFAULT_VISIBLE_TIME
+    ) -> dict[int, dict[str, np.ndarray]]:
+        """该函数用来查找在某一时刻或某一时间段中可见的所有 Note。
+
+        Args:
+            start_time (float): 时间段的开始时间（毫秒）。
+            end_time (float, optional): 时间段的结束时间。未给出时只查找 start_time 这一时刻。
+            visible_time (float, optional): 以基准 BPM 计算时，Note 从出现到抵达判定线的时间（毫秒）。
+
+        Returns:
+            dict[int, dict[str, np.ndarray]]: 键为 Timing Group 编号，值参见 VisibilityIndex.query。
+        """
+        depth = visible_depth(self.base_bpm, visible_time)
+        return {
+            timing_group.tg_num: timing_group.visibility_index(depth).query(start_time, end_time)
+            for timing_group in self.timing_group_list}
+
+    def validate(self) -> ValidationReport:
+        """该函数用来批量校验该谱面中的全部 Note。
+
+        Returns:
+            ValidationReport: 所有 Timing Group 的校验报告合并而成的报告。
+        """
+        return ValidationReport.merge(timing_group.validate() for timing_group in self.timing_group_list)
+
+    def diagnostics_report(self) -> str:
+        """该函数用来生成该谱面中所有问题的汇总报告。
+
+        Returns:
+            str: 每个存在问题的 Timing Group 一行的汇总报告。没有任何问题时为空字符串。
+        """
+        return "\n".join(
+            f"Timing Group {tg_num}：" + "，".join(f"{issue} {count} 个" for issue, count in sorted(issues.items()))
+            for tg_num, issues in self.diagnostics.items())
+
+    def save(self, directory: str, total_frames: int = None):
+        """该函数用来将解析结果以紧凑的二进制格式写入文件夹。
+
+        每个 Timing Group 的 Note 列和 BPM 时间轴都保存为单独的 .npy 文件，并附带一个 header.json 说明文件。
+        这些文件可以由 ParsedChart.load 以内存映射的方式读取。
+
+        Args:
+            directory (str): 写入的文件夹路径。
+            total_frames (int, optional): 给出时，同时保存每个 Timing Group 到该帧为止的逐帧累计位置表。
+        """
+        os.makedirs(directory, exist_ok=True)
+        header = {
+            "format": STORAGE_FORMAT_VERSION,
+            "offset": self.offset,
+            "headers": self.headers,
+            "context": self.context.__dict__ if self.context is not None else None,
+            "timing_group_value_dict": list(self.timing_group_value_dict.items()),
+            "timing_groups": [],
+        }
+        for timing_group in self.timing_group_list:
+            arrays = timing_group.notes.to_arrays()
+            arrays["start_times"] = timing_group.bpm_timeline.start_times
+            arrays["bpms"] = timing_group.bpm_timeline.bpms
+            if total_frames is not None:
+                arrays["frame_positions"] = timing_group.bpm_timeline.frame_positions(total_frames)
+            for name, array in arrays.items():
+                np.save(os.path.join(directory, f"{timing_group.tg_num}.{name}.npy"), array)
+            header["timing_groups"].append({
+                "tg_num": timing_group.tg_num,
+                "attributes": list(timing_group.attributes),
+                "arrays": list(arrays),
+                "diagnostics": dict(timing_group.diagnostics),
+            })
+        with open(os.path.join(directory, "header.json"), "w", encoding="utf-8") as header_file:
+            json.dump(header, header_file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = "r", context: ConversionContext = None) -> "ParsedChart":
+        """该函数用来读取由 ParsedChart.save 写入的解析结果。
+
+        Args:
+            directory (str): 读取的文件夹路径。
+            mmap_mode (str, optional): 读取 .npy 文件时使用的内存映射模式。为 None 时将全部读入内存。
+            context (ConversionContext, optional): 读取后使用的转换设定。未给出时，使用保存时的转换设定。
+                其 audio_offset 为 None 时，使用谱面文件中 AudioOffset 的值。
+
+        Raises:
+            ArcChartException: 当该文件夹中的文件格式不受支持时，抛出该异常。
+
+        Returns:
+            ParsedChart: 读取的解析结果。
+        """
+        with open(os.path.join(directory, "header.json"), "r", encoding="utf-8") as header_file:
+            header = json.load(header_file)
+        if header.get("format") != STORAGE_FORMAT_VERSION:
+            raise ArcChartException(f"无法读取 {directory} 中的解析结果：不受支持的格式版本 {header.get('format')}。")
+        if context is None and header["context"] is not None:
+            context = ConversionContext(**header["context"])
+        # 与解析谱面时相同，未指定谱面音乐延迟的转换设定使用谱面文件中 AudioOffset 的值
+        if context is not None and context.audio_offset is None:
+            context = context.replace(audio_offset=header["offset"])
+        timing_group_list = []
+        for group_header in header["timing_groups"]:
+            arrays = {
+                name: np.load(os.path.join(directory, f"{group_header['tg_num']}.{name}.npy"), mmap_mode=mmap_mode)
+                for name in group_header["arrays"]}
+            bpm_timeline = BpmTimeline.from_arrays(
+                arrays.pop("start_times"), arrays.pop("bpms"), arrays.pop("frame_positions", None))
+            timing_group = TimingGroup.from_arrays(
+                group_header["tg_num"], tuple(group_header["attributes"]), bpm_timeline, arrays, context)
+            timing_group.diagnostics.update(group_header["diagnostics"])
+            timing_group_list.append(timing_group)
+        return cls(
+            header["offset"], timing_group_list, header["headers"],
+            {start: end for start, end in header["timing_group_value_dict"]}, context)
+
+    def export(self, directory: str):
+        """该函数用来将解析结果写入文件夹，以供后续流程读取。
+
+        将在该文件夹中写入由 ParsedChart.save 生成的二进制解析结果，以及 base_info_offset.txt（谱面音乐延迟）。
+
+        Args:
+            directory (str): 写入的文件夹路径。
+        """
+        self.save(directory)
+        write_str_to_file(os.path.join(directory, "base_info_offset.txt"), str(self.offset))
+
+
+# ParsedChart.save 写入的文件格式版本。当写入的内容发生变化时，应当增加该值。
+# 3：每个 Timing Group 附带 diagnostics。
+STORAGE_FORMAT_VERSION = 3
+
+
+def parse_chart(file_lines: Iterable[str], context: ConversionContext = None, workers: int = None) -> ParsedChart:
+    """该函数用来解析一个 Arcaea 谱面，并返回只保存在内存中的解析结果。
+
+    Args:
+        file_lines (Iterable[str]): 谱面文件内所有行组成的列表，或以文本模式打开的谱面文件。
+        context (ConversionContext, optional): 该谱面的转换设定。
+        workers (int, optional): 并行创建 Timing Group 的进程数，参见 ArcChart.__init__。
+
+    Raises:
+        ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
+
+    Returns:
+        ParsedChart: 该谱面的解析结果。
+    """
+    return ArcChart(file_lines, context, workers).result
+
+
+class TimingGroupSource(NamedTuple):
+    """一个已闭合的 Timing Group 在谱面文件中的范围及其全部谱面行的词法分析结果。
+
+    start 和 end 为该 Timing Group 内容在谱面文件行列表中的开始和结束下标（不包含结束下标）。
+    """
+
+    tg_num: int
+    start: int
+    end: int
+    attributes: tuple
+    tokens: list[ChartToken]
+
+
+def split_timing_groups(tokens: Iterable[ChartToken], headers: dict = None) -> Iterator[TimingGroupSource]:
+    """该函数用来将谱面行的词法分析结果按 Timing Group 拆分。
+
+    每一个 Timing Group 将在其结束标志出现时立即产出：Timing Group 0 在第一个 Timing Group 开始标志出现时，
+    或在谱面文件结束时产出。因此所需的内存只与最大的单个 Timing Group 有关。
+
+    Args:
+        tokens (Iterable[ChartToken]): 谱面行的词法分析结果。
+        headers (dict, optional): 用来接收 AudioOffset 等谱面头部信息的字典。
+
+    Raises:
+        ArcChartException: 当 Timing Group 未闭合，或谱面行出现在不允许的位置时，抛出该异常。
+
+    Yields:
+        TimingGroupSource: 每一个已闭合的 Timing Group。
+    """
+    if headers is None:
+        headers = {}
+    group_0_start = 0
+    group_0_tokens = []
+    this_group_tokens = None
+    this_attributes = ()
+    # this_start_line_num 为当前未闭合的 Timing Group 的开始行号，为 0 时表示当前位于 Timing Group 0 中。
+    this_start_line_num = 0
+    got_timing_group_0 = False
+    timing_group_num = 0
+    last_line_num = 0
+
+    for token in tokens:
+        kind = token.kind
+        last_line_num = token.line_num
+
+        # 取得 AudioOffset 等谱面头部信息
+        if kind == HEADER:
+            headers[token.fields[0]] = token.fields[1]
+
+        # 过滤间隔行
+        elif kind == SEPARATOR:
+            group_0_start = token.line_num
+
+        # 取得一个新的 Timing Group（注：Timing Group 从第 0 个开始计数）
+        elif kind == GROUP_START:
+
+            # 判断上一个 Timing Group 是否已闭合
+            if this_start_line_num:
+                raise ArcChartException(
+                    f"解析谱面文件的第 {token.line_num} 行时发生未知错误。它最有可能的触发原因是一个开始行为 "
+                    f"{this_start_line_num} 的 Timing Group 未完全闭合导致的。")
+
+            # 判断这是否是第 1 个 Timing Group。如果是，则界定 Timing Group 0。
+            if not got_timing_group_0:
+                logger.debug("解析谱面文件的第 %d 行时找到了 Timing Group 的开始标志。已经界定 Timing Group 0 的范围。", token.line_num)
+                got_timing_group_0 = True
+                yield TimingGroupSource(0, group_0_start, token.line_num - 1, (), group_0_tokens)
+                group_0_tokens = None
+                timing_group_num += 1
+            this_start_line_num = token.line_num
+            this_group_tokens = []
+            this_attributes = token.fields
+
+        # 判断该行是否为某个 Timing Group 的结束行
+        elif kind == GROUP_END:
+
+            # 判定这个 Timing Group 是否有开始标志
+            if not this_start_line_num:
+                raise ArcChartException(
+                    f"解析谱面文件的第 {token.line_num} 时发现了一个 Timing Group 的结束标志，但是并未找到开始标志。")
+            # 产出这个新的 Timing Group
+            yield TimingGroupSource(
+                timing_group_num, this_start_line_num, token.line_num, this_attributes, this_group_tokens)
+            timing_group_num += 1
+            this_start_line_num = 0
+            this_group_tokens = None
+
+        # 将 BPM 设定行和 Note 行交给其所在的 Timing Group
+        elif kind in (TIMING, TAP, HOLD, ARC):
+            if this_start_line_num:
+                this_group_tokens.append(token)
+            elif not got_timing_group_0:
+                group_0_tokens.append(token)
+            else:
+                raise ArcChartException(
+                    f"解析谱面文件的第 {token.line_num} 行时发现其位于所有 Timing Group 之外，"
+                    f"但 Timing Group 0 已在第一个 Timing Group 开始前结束。")
+
+    # 结束时判定谱面特殊异常情况
+    if this_start_line_num:
+        raise ArcChartException(
+            f"在对该谱面的 Timing Group 进行拆分时发生了未知错误，它最有可能的触发原因是一个开始行为 {this_start_line_num} "
+            f"的Timing Group 没有结束标志。")
+    if not got_timing_group_0:
+        yield TimingGroupSource(0, group_0_start, last_line_num, (), group_0_tokens)
+
+
+def iter_timing_groups(
+    fp: Iterable[str], headers: dict = None, context: ConversionContext = None
+) -> Iterator["TimingGroup"]:
+    """该函数用来从文件中逐行读取谱面，并在每一个 Timing Group 闭合时立即产出其实例。
+
+    Args:
+        fp (Iterable[str]): 以文本模式打开的谱面文件，或任意产出谱面文件行的可迭代对象。
+        headers (dict, optional): 用来接收 AudioOffset 等谱面头部信息的字典。
+        context (ConversionContext, optional): 该谱面的转换设定。
+
+    Raises:
+        ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
+
+    Yields:
+        TimingGroup: 按编号顺序产出的 Timing Group 实例。
+    """
+    for source in split_timing_groups(tokenize(fp), headers):
+        yield TimingGroup(source.tg_num, attributes=source.attributes, tokens=source.tokens, context=context)
+
+
 class ArcChart:
     """该类用来创建 Arcaea 谱面实例，以供解析。
     """
 
-    def __init__(self, file_lines: list):
+    def __init__(self, file_lines: Iterable[str], context: ConversionContext = None, workers: int = None):
         """该函数用来创建一个 Arcaea 谱面实例。
 
         Args:
-            file_lines (list): 谱面文件内所有行组成的列表。
+            file_lines (Iterable[str]): 谱面文件内所有行组成的列表，或任意产出谱面文件行的可迭代对象。
+            context (ConversionContext, optional): 该谱面的转换设定。未给出时，将从当前目录下的 song_total_time.txt
+                读取一次歌曲总时长。
+            workers (int, optional): 大于 1 时，使用该数量的进程并行创建各个 Timing Group 并计算其逐帧位置表，
+                其结果与在单个进程中解析的结果完全相同。未给出时在当前进程中依次解析。
 
         Raises:
             ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
+            ValueError: 当进程数小于 1 时，抛出该异常。
         """
+        if workers is not None and workers < 1:
+            raise ValueError(f"进程数必须为正整数，而不是 {workers}。")
 
-        # 设置该谱面实例的谱面文件，并初始化谱面文件行数计数器
-        self.file_lines = file_lines
-        line_num = 0
-
-        # 初始化谱面异常计数器变量
-        self.last_end_line_num = 0
-        self.this_end_line_num = 0
+        # 设置该谱面实例的谱面文件。对于逐行读取的文件，不保留其内容。
+        self.file_lines = file_lines if isinstance(file_lines, list) else None
+        self.offset = None
+        self.headers = {}
+        self.context = context if context is not None else ConversionContext.from_file("song_total_time.txt")
 
-        # 初始化谱面 Timing Group 构成列表
+        # 初始化谱面 Timing Group 构成列表。
+        # timing_group_value_dict 的键和值分别为该 Timing Group 内容在 file_lines 中的开始和结束下标（不包含结束下标）。
         self.timing_group_value_dict = {}
-        got_timing_group_0 = False
+        self.timing_group_list = []
+
+        timing_groups = None
+        if workers is not None and workers > 1:
+            # 延迟导入，以避免与 parallel 模块循环导入
+            from arcaea.chartparser.parallel import (  # pylint: disable=import-outside-toplevel
+                build_timing_groups, split_timing_group_lines
+            )
+            file_lines = file_lines if isinstance(file_lines, list) else list(file_lines)
+            # 主进程只拆分谱面行，词法分析在子进程中进行
+            with phase(PHASE_SPLIT):
+                group_lines = split_timing_group_lines(file_lines, self.headers)
+            if group_lines is not None:
+                timing_groups = build_timing_groups(group_lines, self.context, workers)
+        if timing_groups is None:
+            # 遍历文件，每一行只进行一次词法分析，并在每个 Timing Group 闭合时立即创建其实例
+            sources = timed_iter(split_timing_groups(tokenize(file_lines), self.headers), PHASE_SPLIT)
+            timing_groups = (
+                (source, TimingGroup(
+                    source.tg_num, attributes=source.attributes, tokens=source.tokens, context=self.context))
+                for source in sources)
+        for source, timing_group in timing_groups:
+            self.timing_group_value_dict[source.start] = source.end
+            self.timing_group_list.append(timing_group)
 
-        # 开始遍历文件
-        for line in self.file_lines:
-            line_num += 1
+        # 考虑没有 `AudioOffset` 的情况
+        self.set_offset(self.headers.get("AudioOffset", 0))
 
-            # 取得 AudioOffset 谱面音乐延迟
-            if line.startswith("AudioOffset"):
-                offset_value = line.replace("AudioOffset:", "")
-                self.offset = offset_value
-                self.set_offset(offset_value)
-                self.last_start_line_num = line_num
+        # 转换设定中未指定谱面音乐延迟时，使用谱面文件中的值
+        if self.context.audio_offset is None:
+            self.context = self.context.replace(audio_offset=self.offset)
+            for timing_group in self.timing_group_list:
+                timing_group.context = self.context
 
-            # 过滤间隔行
-            elif line.startswith("-"):
-                self.last_start_line_num = line_num
+        # 以一条日志汇总报告谱面中的问题
+        if logger.isEnabledFor(logging.INFO) and any(group.diagnostics for group in self.timing_group_list):
+            logger.info("谱面解析完成，发现以下问题：\n%s", self.result.diagnostics_report())
 
-            # 取得一个新的 Timing Group（注：Timing Group 从第 0 个开始计数）
-            elif line.startswith("timinggroup()"):
+    @classmethod
+    def from_stream(cls, fp: Iterable[str], context: ConversionContext = None, workers: int = None) -> "ArcChart":
+        """该函数用来从以文本模式打开的谱面文件中逐行读取，并创建 Arcaea 谱面实例。
 
-                # 判断上一个 Timing Group 是否已闭合
-                if not self.this_end_line_num == 0:
-                    raise ArcChartException(
-                        f"解析谱面文件的第 {line_num} 行时发生未知错误。它最有可能的触发原因是一个位于 {self.last_start_line_num} - "
-                        f"{self.last_end_line_num} 的 Timing Group 未完全闭合导致的。")
-
-                # 判断这是否是第 1 个 Timing Group。如果是，则界定 Timing Group 0。
-                if not got_timing_group_0:
-                    self.last_end_line_num = line_num - 1
-                    self.timing_group_value_dict[self.last_start_line_num] = self.last_end_line_num
-                    print(
-                        f"解析谱面文件的第 {line_num} 行时找到了 Timing Group 的开始标志。已经界定 Timing Group 0 的范围。")
-                    self.this_start_line_num = line_num
-                    got_timing_group_0 = True
-                elif got_timing_group_0:
-                    self.this_start_line_num = line_num
-
-            # 判断该行是否为某个 Timing Group 的结束行
-            elif line.startswith("}"):
-                self.this_end_line_num = line_num
-
-                # 判定这个 Timing Group 是否有开始标志
-                if not self.this_start_line_num:
-                    raise ArcChartException(
-                        f"解析谱面文件的第 {line_num} 时发现了一个 Timing Group 的结束标志，但是并未找到开始标志。")
-                else:
-                    # 保存这个新的 Timing Group
-                    self.timing_group_value_dict[self.this_start_line_num] = self.this_end_line_num
-
-                # 归零谱面异常计数器变量
-                self.last_start_line_num = self.this_start_line_num
-                self.last_end_line_num = self.this_end_line_num
-                self.this_end_line_num = 0
-                self.this_start_line_num = 0
-
-        # 结束时判定谱面特殊异常情况
-        if not got_timing_group_0:
-            self.timing_group_value_dict[self.last_start_line_num + 1] = len(self.file_lines)
-            self.this_start_line_num, self.this_end_line_num = 0, 0
-        if self.this_end_line_num != 0 or self.this_start_line_num != 0:
-            raise ArcChartException(
-                f"在对该谱面的 Timing Group 进行拆分时发生了未知错误，它最有可能的触发原因是一个开始行为 {self.this_start_line_num} 的Timing Group 没有结束标志。")
-        timing_group_num = 0
-        timing_group_list = []
+        与传入全部行组成的列表不同，该方式不会在内存中保留整个谱面文件。
 
-        # 遍历以创建 Timing Group 实例
-        for single_timing_group in self.timing_group_value_dict.items():
-            this_group_chart_start_line = single_timing_group[0]
-            this_group_chart_end_line = single_timing_group[1]
-            this_group_chart_lines = self.file_lines[this_group_chart_start_line: this_group_chart_end_line]
-            timing_group_list.append(
-                TimingGroup(
-                    timing_group_num, this_group_chart_lines))
-            timing_group_num += 1
+        Args:
+            fp (Iterable[str]): 以文本模式打开的谱面文件。
+            context (ConversionContext, optional): 该谱面的转换设定。
+            workers (int, optional): 并行创建 Timing Group 的进程数，参见 ArcChart.__init__。
 
-        # 将 Timing Group 实例保存至文件
-        file = "../timing_group_list.txt"
-        list_ = timing_group_list
-        write_list_to_file(file, list_)
+        Raises:
+            ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
 
-        # 考虑没有 `AudioOffset` 的情况
-        if not self.offset:
-            self.offset = 0
-            self.set_offset("0")
+        Returns:
+            ArcChart: 创建的 Arcaea 谱面实例。
+        """
+        return cls(fp, context, workers)
 
     def set_offset(self, offset):
-        """该函数用来将设定的谱面音乐延迟写入配置文件。
+        """该函数用来设定谱面音乐延迟。
+
+        该函数不再写入任何文件。如需将解析结果写入文件，请使用 ParsedChart.export。
 
         Args:
-            offset (str): 谱面音乐延迟数值。本应为 float，但鉴于该值由文件读取且写入文件，故不做类型转换。
+            offset (int): 谱面音乐延迟数值。
         """
         self.offset = offset
-        file = "../base_info_offset.txt"
-        what_to_write = self.offset
-        write_str_to_file(file, what_to_write)
+
+    @property
+    def result(self) -> ParsedChart:
+        """ParsedChart: 该谱面的解析结果。
+        """
+        return ParsedChart(
+            self.offset, self.timing_group_list, self.headers, self.timing_group_value_dict, self.context)
 
 
 class TimingGroup:
     """该类用来创建 Timing Group 的实例。
     """
 
-    def __init__(self, tg_num: int, chart_lines_list: list[str]):
+    def __init__(
+        self, tg_num: int, chart_lines_list: list[str] = None, attributes: tuple = (),
+        tokens: Iterable[ChartToken] = None, context: ConversionContext = None, strict: bool = True
+    ):
         """该函数用来创建 Timing Group 的实例。
 
+        全部 timing 行和 Note 读取完毕后，以 validate_timings 和 validate_notes 一次性批量校验。警告按种类计入 diagnostics，
+        错误在 strict 为 True 时以一个汇总了所有错误的异常抛出。
+
         Args:
             tg_num (int): 在该谱面中，Timing Group 的编号。
-            chart_lines_list (list[str]): 该 Timing Group 包含的谱面文件行。
+            chart_lines_list (list[str], optional): 该 Timing Group 包含的谱面文件行。
+            attributes (tuple, optional): 该 Timing Group 的属性，例如 noinput。
+            tokens (Iterable[ChartToken], optional): 该 Timing Group 包含的谱面行的词法分析结果。
+                给出该参数时，将不再对 chart_lines_list 进行词法分析。
+            context (ConversionContext, optional): 该谱面的转换设定。未给出时，将从当前目录下的 song_total_time.txt
+                读取一次歌曲总时长。
+            strict (bool, optional): 为 False 时，存在错误的 Note 也保留在 Note 列表中，错误只能由 validate 取得。
 
         Raises:
-            ArcChartException: 当存在无法识别的 Note 时，抛出该异常。
+            ArcChartException: 当存在无法识别的 Note，或 strict 为 True 且校验发现错误时，抛出该异常。
         """
 
         # 初始化变量
-        self.arctap_list = None
-        self.arc_list = []
-        self.bpm_list_line = []
+        self.attributes = attributes
+        self.context = context if context is not None else ConversionContext.from_file("song_total_time.txt")
         self.bpm_list_dict = {}
-        self.tap_list = []
+        self.bpm_timeline = None
+        self.notes = NoteTable()
+        self.timings = np.empty(0, dtype=TIMING_DTYPE)
         self.tg_num = tg_num
+        # 该 Timing Group 的第一个谱面行的行号，用于报告缺失 timing 行等不属于某一行的问题
+        self.first_line_num = 0
+        self._note_objects = {}
+        self._visibility_indexes = {}
+
+        # 超界 Note 等不影响解析的问题，只计数而不逐个报告
+        self.diagnostics = Counter()
+
+        # 报告日志。逐行日志只在启用 DEBUG 级别时才生成，以免拖慢解析。
+        logger.debug("已加载 Arcaea 谱面文件中第 %d 个 Timing Group。正在对其进行分析……", self.tg_num)
+        log_lines = logger.isEnabledFor(logging.DEBUG)
+
+        if tokens is None:
+            tokens = tokenize(chart_lines_list or [])
+
+        timing_rows = []
+        with phase(PHASE_NOTES, tg_num) as record:
+            # 按照顺序读取 BPM 设定行，并将对应谱面元素写入 Note 列表
+            for token in tokens:
+                kind = token.kind
+                if log_lines:
+                    logger.debug("正在分析行 %d 类型为 %s……", token.line_num, kind)
+                if not self.first_line_num:
+                    self.first_line_num = token.line_num
+
+                if kind == TIMING:
+                    self.bpm_list_dict[token.fields[0]] = token.fields[1]
+                    timing_rows.append((token.fields[0], token.line_num))
+                elif kind == TAP:
+                    self.tap(token)
+                elif kind == ARC:
+                    self.arc(token)
+                elif kind == HOLD:
+                    self.hold(token)
+                elif kind in (GROUP_END, EMPTY, IGNORED):
+                    continue
+
+                # 当遇到不应出现在 Timing Group 中的行时，抛出异常
+                else:
+                    raise ArcChartException(
+                        f"在谱面第 {tg_num} 个 Timing Group 中，第 {token.line_num} 行不应出现在 Timing Group 中。")
+            record.add_notes(len(self.notes))
+        self.timings = np.array(timing_rows, dtype=TIMING_DTYPE)
+
+        # 由 BPM 列表创建该 Timing Group 中所有 Note 共用的 BPM 时间轴
+        with phase(PHASE_BPM, tg_num):
+            self.bpm_timeline = BpmTimeline(self.bpm_list_dict)
+
+        # 以整列的掩码运算校验所有 Note，而不在读取每一行时逐个校验
+        report = self.validate()
+        if report:
+            self.diagnostics.update(report.counts(WARNING))
+            if log_lines:
+                for issue in report.warnings:
+                    logger.debug("%s", issue)
+            if strict and report.errors:
+                raise ArcChartException(
+                    f"在谱面第 {tg_num} 个 Timing Group 中发现 {len(report.errors)} 个错误：\n{report.format(ERROR)}")
 
-        # 报告日志
-        print(f"已加载 Arcaea 谱面文件中第 {self.tg_num} 个 Timing Group。正在对其进行分析……")
+    @classmethod
+    def from_arrays(
+        cls, tg_num: int, attributes: tuple, bpm_timeline: BpmTimeline, arrays: dict[str, np.ndarray],
+        context: ConversionContext = None
+    ) -> "TimingGroup":
+        """该函数用来由已保存的 BPM 时间轴和 Note 列重新创建 Timing Group 的实例。
 
-        # 读取整个 Timing Group 中的 BPM 设定行
-        line_num = 0
-        for line in chart_lines_list:
-            if line.startswith("timing"):
-                self.bpm_list_line.append(line)
-            else:
-                pass
-
-        # 将 BPM 设定行组成的列表重置为字典
-        for line in self.bpm_list_line:
-            one_line_bpm_info = line.replace("(", "").replace(
-                ")", "").replace("timing", "").split(",")
-            self.bpm_list_dict[one_line_bpm_info[0]] = one_line_bpm_info[1]
-
-        # 按照顺序实例化对应谱面元素
-        for line in chart_lines_list:
-            line_num += 1
-            print(f"正在分析行 {line_num} 内容为 {line}……")
-
-            if line.startswith("timing"):
-                print("这是一个 Timing 设定行 ↑ 已跳过。")
-            elif line.startswith("}"):
-                print("这是一个 Timing Group 结束行 ↑ 已跳过。")
-            elif line.startswith("("):
-                self.tap(line)
-            elif line.startswith("arc"):
-                self.arc(line)
-            elif line.startswith("hold"):
-                self.hold(line)
-
-            # 当遇到无法识别的 Note 类型时，抛出异常
-            else:
-                raise ArcChartException(
-                    f"在谱面第 {tg_num} 个 Timing Group 中，第 {line_num} 个 Note 无法被识别：{line}")
+        Args:
+            tg_num (int): 在该谱面中，Timing Group 的编号。
+            attributes (tuple): 该 Timing Group 的属性。
+            bpm_timeline (BpmTimeline): 该 Timing Group 的 BPM 时间轴。
+            arrays (dict[str, np.ndarray]): 以 taps，holds，arcs 和 arctaps 为键的 Note 列。
+            context (ConversionContext, optional): 该谱面的转换设定。
 
-    def arc(self, line: str):
-        """该函数用来生成一个音弧的实例。
+        Returns:
+            TimingGroup: 重新创建的 Timing Group 实例。
+        """
+        # 这些 Note 列和 BPM 时间轴已在创建时校验，此时不再有 timing 行
+        timing_group = cls(tg_num, attributes=attributes, tokens=(), context=context, strict=False)
+        timing_group.bpm_timeline = bpm_timeline
+        timing_group.bpm_list_dict = dict(bpm_timeline.bpm_list)
+        timing_group.notes = NoteTable.from_arrays(arrays)
+        # 原始的 timing 行已无法取得，由 BPM 时间轴还原
+        timing_group.timings = np.zeros(len(bpm_timeline.start_times), dtype=TIMING_DTYPE)
+        timing_group.timings["start_time"] = bpm_timeline.start_times
+        return timing_group
+
+    def validate(self) -> ValidationReport:
+        """该函数用来批量校验该 Timing Group 中的全部 timing 行和 Note，参见 validate_timings 和 validate_notes。
+
+        Returns:
+            ValidationReport: 该 Timing Group 的校验报告。
+        """
+        return ValidationReport.merge((
+            validate_timings(self.timings, self.tg_num, self.first_line_num), validate_notes(self.notes, self.tg_num)))
+
+    def __getstate__(self) -> dict:
+        # 由 Note 列表生成的 Note 实例不参与序列化，反序列化后将按需重新生成。
+        state = self.__dict__.copy()
+        state["_note_objects"] = {}
+        state["_visibility_indexes"] = {}
+        return state
+
+    def _get_note_objects(self, note_kind: str, create_note) -> list:
+        """该函数用来由 Note 列表中的某一列按需生成对应的 Note 实例，并将其缓存。
+
+        Args:
+            note_kind (str): Note 种类，为 taps，holds，arcs 或 arctaps。
+            create_note (Callable): 由结构化数组中某一行的编号和内容生成 Note 实例的函数。
+
+        Returns:
+            list: 生成的 Note 实例组成的列表。
+        """
+        note_objects = self._note_objects.get(note_kind)
+        if note_objects is None:
+            note_objects = [create_note(index, row) for index, row in enumerate(getattr(self.notes, note_kind))]
+            self._note_objects[note_kind] = note_objects
+        return note_objects
+
+    @property
+    def tap_list(self) -> list[Tap]:
+        """list[Tap]: 由 Note 列表生成的所有 Tap 实例，仅为兼容旧接口而保留。
+        """
+        return self._get_note_objects("taps", lambda _, row: Tap(
+            float(row["touch_time"]), int(row["trace"]), self.bpm_timeline, self.context))
+
+    @property
+    def hold_list(self) -> list[Hold]:
+        """list[Hold]: 由 Note 列表生成的所有 Hold 实例，仅为兼容旧接口而保留。
+        """
+        return self._get_note_objects("holds", lambda _, row: Hold(
+            float(row["touch_time"]), float(row["end_time"]), int(row["trace"]), self.bpm_timeline, self.context))
+
+    @property
+    def arc_list(self) -> list[Arc]:
+        """list[Arc]: 由 Note 列表生成的所有 Arc 实例，仅为兼容旧接口而保留。
+        """
+        arctaps = self.notes.arctaps
+
+        def create_arc(arc_index: int, row) -> Arc:
+            this_arc = Arc(
+                float(row["touch_time"]), float(row["end_time"]), float(row["x_start_pos"]),
+                float(row["y_start_pos"]), MOVEMENT_TYPES[row["movement_type"]], float(row["x_end_pos"]),
+                float(row["y_end_pos"]), int(row["arc_color"]), str(row["none_value"]), bool(row["is_trace"]),
+                self.bpm_timeline, self.context)
+            this_arc.arctap_list = arctaps["touch_time"][arctaps["arc"] == arc_index].tolist()
+            return this_arc
+
+        return self._get_note_objects("arcs", create_arc)
+
+    @property
+    def arctap_list(self) -> list[SkyNote]:
+        """list[SkyNote]: 由 Note 列表生成的所有 Arctap 实例，仅为兼容旧接口而保留。
+        """
+        arctaps = self.notes.arctaps
+        with phase(PHASE_ARC_EASING, self.tg_num):
+            x_positions, y_positions = arc_positions(self.notes.arcs, arctaps["touch_time"], arctaps["arc"])
+        return self._get_note_objects("arctaps", lambda arctap_index, row: SkyNote(
+            float(row["touch_time"]), float(x_positions[arctap_index]), float(y_positions[arctap_index]),
+            self.bpm_timeline, self.context))
+
+    def visibility_index(self, depth: float) -> VisibilityIndex:
+        """该函数用来取得该 Timing Group 中所有 Note 的可见区间索引。索引在第一次使用时创建，此后按可见深度缓存。
+
+        Args:
+            depth (float): 可见深度，参见 visible_depth。
+
+        Returns:
+            VisibilityIndex: 可见区间索引。
+        """
+        index = self._visibility_indexes.get(depth)
+        if index is None:
+            index = VisibilityIndex(self.bpm_timeline, self.notes.to_arrays(), depth)
+            self._visibility_indexes[depth] = index
+        return index
+
+    def arc_positions(self, resolution: int = None) -> dict[str, np.ndarray]:
+        """该函数用来一次性计算该 Timing Group 中所有 Arc 在每个采样时的相对位置。
+
+        Args:
+            resolution (int, optional): 采样间隔（毫秒）。未给出时使用转换设定中的 sampling_resolution。
+
+        Returns:
+            dict[str, np.ndarray]: 以 arc（采样所属 Arc 的编号），time（采样时间），x，y 和 z 为键的等长数组。
+                其中 z 为采样时 Arc 相对其开始时的位置差。
+        """
+        if resolution is None:
+            resolution = self.context.sampling_resolution
+        arcs = self.notes.arcs
+        with phase(PHASE_ARC_EASING, self.tg_num) as record:
+            arc_index, play_time = sample_arc_times(arcs["touch_time"], arcs["end_time"], resolution)
+            x_positions, y_positions = arc_positions(arcs, play_time, arc_index)
+            record.add_notes(len(arcs))
+            return {
+                "arc": arc_index, "time": play_time, "x": x_positions, "y": y_positions,
+                "z": self._arc_relative_depth(arc_index, play_time)}
+
+    def arc_keyframes(self, tolerance: float = None) -> dict[str, np.ndarray]:
+        """该函数用来为该 Timing Group 中的所有 Arc 生成误差有界的自适应关键帧。
+
+        在相邻两个关键帧之间线性插值时，横向和纵向位置的误差不超过 tolerance。直线 Arc 只保留两个端点。
+
+        Args:
+            tolerance (float, optional): 允许的最大位置误差。未给出时使用转换设定中的 arc_tolerance。
+
+        Returns:
+            dict[str, np.ndarray]: 与 arc_positions 格式相同的等长数组，按 Arc 编号和时间排序。
+        """
+        if tolerance is None:
+            tolerance = self.context.arc_tolerance
+        with phase(PHASE_ARC_EASING, self.tg_num) as record:
+            keyframes = adaptive_arc_keyframes(self.notes.arcs, tolerance, self.context.sampling_resolution)
+            keyframes["z"] = self._arc_relative_depth(keyframes["arc"], keyframes["time"])
+            record.add_notes(len(self.notes.arcs))
+            return keyframes
+
+    def _arc_relative_depth(self, arc_index: np.ndarray, play_time: np.ndarray) -> np.ndarray:
+        """该函数用来计算 Arc 在给定时间相对其开始时的位置差。
 
         Args:
-            line (str): 该音弧在谱面文件中的相关行。
+            arc_index (np.ndarray): 每个时间所对应 Arc 的编号。
+            play_time (np.ndarray): 需要计算的时间。
+
+        Returns:
+            np.ndarray: 位置差。
         """
+        start_positions = self.bpm_timeline.position_at(self.notes.arcs["touch_time"])
+        return self.bpm_timeline.position_at(play_time) - start_positions[arc_index]
 
-        arc_info: list = line.replace("(", "").replace(")", "").split(",")
-        this_arc = Arc(
-            float(arc_info[0]), float(arc_info[1]), float(arc_info[2]), float(arc_info[3]), str(arc_info[4]), float(
-                arc_info[5]), float(arc_info[6]), int(arc_info[7]), str(arc_info[8]), bool(arc_info[9]),
-            self.bpm_list_dict)
-        self.arc_list.append(this_arc)
-        if line.split("[")[1]:
-            arctap_info = line.replace("]", "").split("[")
-            arctap_list = arctap_info[0].split(",")
-            this_arc.arctap_list = arctap_list
+    def arc(self, token: ChartToken):
+        """该函数用来将一个音弧及位于其上的 Arctap 写入 Note 列表。
+
+        Args:
+            token (ChartToken): 该音弧在谱面文件中相关行的词法分析结果。
+
+        Raises:
+            ArcChartException: 当该音弧的坐标变化移动类型无法识别时，抛出该异常。
+        """
+        start_time, end_time, x_start_pos, x_end_pos, movement_type, y_start_pos, y_end_pos, arc_color, none_value, \
+            is_trace, arctap_times = token.fields
+        try:
+            arc_index = self.notes.add_arc(
+                start_time, end_time, x_start_pos, y_start_pos, movement_type, x_end_pos, y_end_pos, arc_color,
+                none_value, is_trace, token.line_num)
+        except ValueError as error:
+            raise ArcChartException(
+                f"在谱面第 {self.tg_num} 个 Timing Group 中，第 {token.line_num} 行的 Arc 无法被识别：{error}") from error
+        for arctap_time in arctap_times:
+            self.notes.add_arctap(arctap_time, arc_index, token.line_num)
 
-    def tap(self, line: str):
-        """该函数用来生成一个 Tap 的实例。
+    def tap(self, token: ChartToken):
+        """该函数用来将一个 Tap 写入 Note 列表。
 
         Args:
-            line (str): 该 Tap 在谱面文件中的相关行。
+            token (ChartToken): 该 Tap 在谱面文件中相关行的词法分析结果。
         """
-        tap_info = line.replace("(", "").replace(")", "").split(",")
-        self.tap_list.append(
-            Tap(float(tap_info[0]), int(tap_info[1]), self.bpm_list_dict))
+        touch_time, trace = token.fields
+        self.notes.add_tap(touch_time, trace, token.line_num)
 
-    def hold(self, line: str):
-        """该函数用来生成一个 Hold 的实例。
+    def hold(self, token: ChartToken):
+        """该函数用来将一个 Hold 写入 Note 列表。
 
         Args:
-            line (str): 该 Hold 在谱面文件中的相关行。
+            token (ChartToken): 该 Hold 在谱面文件中相关行的词法分析结果。
         """
-        pass
+        start_time, end_time, trace = token.fields
+        self.notes.add_hold(start_time, end_time, trace, token.line_num)
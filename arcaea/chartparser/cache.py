@@ -0,0 +1,159 @@
+"""这个模块用来缓存 Arcaea 谱面的解析结果。
+
+缓存以谱面文件内容、解析器版本和转换设定中歌曲总时长的哈希值为键，使用 ParsedChart.save 的二进制格式保存在磁盘上，
+并以内存映射的方式读取。缓存的总大小超过上限时，将按最近使用时间淘汰最久未使用的缓存。
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from arcaea.assets import ArcChartException, ConversionContext
+from arcaea.chartparser import STORAGE_FORMAT_VERSION, ParsedChart, parse_chart
+
+# 解析器版本。当解析结果发生变化时，应当增加该值，以使旧的缓存失效。
+# 2：解析时按 Timing Group 汇总各类问题的数量（diagnostics）。
+# 3：校验 timing 行的顺序，拒绝缺失 timing 行或第一个 timing 行不在 0 时刻的谱面。
+PARSER_VERSION = 3
+
+_HEADER_FILE = "header.json"
+_TEMP_PREFIX = ".tmp-"
+
+
+def _directory_size(directory: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+class ChartCache:
+    """谱面解析结果缓存类。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        """该函数用来创建一个谱面解析结果缓存。
+
+        Args:
+            directory (str): 缓存所在的文件夹路径。
+            max_bytes (int, optional): 缓存总大小的上限（字节）。
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(chart_bytes: bytes, context: ConversionContext) -> str:
+        """该函数用来计算一个谱面的缓存键。
+
+        Args:
+            chart_bytes (bytes): 谱面文件的内容。
+            context (ConversionContext): 该谱面的转换设定。
+
+        Returns:
+            str: 该谱面的缓存键。
+        """
+        digest = hashlib.sha256(chart_bytes)
+        digest.update(f"|{PARSER_VERSION}|{STORAGE_FORMAT_VERSION}|{context.last_frame}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, chart_bytes: bytes, context: ConversionContext) -> Optional[ParsedChart]:
+        """该函数用来读取一个谱面的缓存。
+
+        Args:
+            chart_bytes (bytes): 谱面文件的内容。
+            context (ConversionContext): 该谱面的转换设定。
+
+        Returns:
+            ParsedChart | None: 以内存映射方式读取的解析结果。没有对应的缓存时返回 None。
+        """
+        entry_path = self._entry_path(self.key(chart_bytes, context))
+        try:
+            parsed_chart = ParsedChart.load(entry_path, context=context)
+        except (OSError, ValueError, KeyError, ArcChartException):
+            # 缓存不存在，或由其他版本写入
+            return None
+        # 以 header.json 的修改时间记录最近使用时间
+        os.utime(os.path.join(entry_path, _HEADER_FILE))
+        return parsed_chart
+
+    def put(self, chart_bytes: bytes, context: ConversionContext, parsed_chart: ParsedChart):
+        """该函数用来写入一个谱面的缓存，并在超出大小上限时淘汰最久未使用的缓存。
+
+        缓存先写入临时文件夹，再整体重命名，因此多个进程可以同时写入同一个缓存文件夹。
+
+        Args:
+            chart_bytes (bytes): 谱面文件的内容。
+            context (ConversionContext): 该谱面的转换设定。
+            parsed_chart (ParsedChart): 该谱面的解析结果。
+        """
+        entry_path = self._entry_path(self.key(chart_bytes, context))
+        temp_path = tempfile.mkdtemp(prefix=_TEMP_PREFIX, dir=self.directory)
+        try:
+            parsed_chart.save(temp_path, context.last_frame)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            # 其他进程已经写入了同一个缓存
+            shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict(keep=entry_path)
+
+    def parse(self, chart_bytes: bytes, context: ConversionContext) -> ParsedChart:
+        """该函数用来解析一个谱面：命中缓存时直接读取，否则解析后写入缓存。
+
+        Args:
+            chart_bytes (bytes): 谱面文件的内容。
+            context (ConversionContext): 该谱面的转换设定。
+
+        Raises:
+            ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
+
+        Returns:
+            ParsedChart: 该谱面的解析结果。
+        """
+        parsed_chart = self.get(chart_bytes, context)
+        if parsed_chart is None:
+            parsed_chart = parse_chart(chart_bytes.decode("utf-8-sig").splitlines(), context)
+            self.put(chart_bytes, context, parsed_chart)
+        return parsed_chart
+
+    def entries(self) -> list[tuple[str, float, int]]:
+        """该函数用来列出所有缓存。
+
+        Returns:
+            list[tuple[str, float, int]]: 每个缓存的路径，最近使用时间和大小，按最近使用时间从早到晚排列。
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name.startswith(_TEMP_PREFIX):
+                continue
+            try:
+                last_used = os.stat(os.path.join(entry.path, _HEADER_FILE)).st_mtime
+                entries.append((entry.path, last_used, _directory_size(entry.path)))
+            except OSError:
+                continue
+        return sorted(entries, key=lambda cache_entry: cache_entry[1])
+
+    def size(self) -> int:
+        """该函数用来计算所有缓存的总大小。
+
+        Returns:
+            int: 所有缓存的总大小（字节）。
+        """
+        return sum(entry_size for _, _, entry_size in self.entries())
+
+    def evict(self, keep: str = None):
+        """该函数用来淘汰最久未使用的缓存，直到缓存总大小不超过上限。
+
+        Args:
+            keep (str, optional): 不被淘汰的缓存路径，通常为刚刚写入的缓存。
+        """
+        entries = self.entries()
+        total_size = sum(entry_size for _, _, entry_size in entries)
+        for entry_path, _, entry_size in entries:
+            if total_size <= self.max_bytes:
+                break
+            if entry_path == keep:
+                continue
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= entry_size
@@ -0,0 +1,139 @@
+"""这个模块用来在谱面文件被修改后增量地重新解析谱面。
+
+每个 Timing Group 在谱面文件中占据连续的若干行。IncrementalParser 先以 line_structure 快速找出每个 Timing Group
+的行范围，再以其内容的哈希值与上一次解析的结果比较：内容未改变的 Timing Group 直接复用上一次的实例，
+包括其 Note 列、BPM 时间轴以及已经计算的逐帧位置表等缓存，只有内容改变的 Timing Group 才会重新进行词法分析和解析。
+谱面结构不规则（例如缺少间隔行）时，退回到完整解析。
+"""
+import copy
+import logging
+from collections.abc import Sequence
+
+from arcaea.assets import ArcChartException, ConversionContext, NoteTable
+from arcaea.chartparser import ArcChart, ParsedChart, TimingGroup
+from arcaea.chartparser.lexer import tokenize, tokenize_line
+from arcaea.chartparser.structure import GroupRange, IrregularChart, scan_timing_groups
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalParser:
+    """该类用来反复解析同一个谱面的不同版本，并复用未改变的 Timing Group。
+
+    用法示例：
+
+        parser = IncrementalParser(context)
+        parsed_chart = parser.parse(file_lines)
+        ...  # 修改谱面文件
+        parsed_chart = parser.parse(edited_lines)  # 只重新解析被修改的 Timing Group
+    """
+
+    def __init__(self, context: ConversionContext = None) -> None:
+        """该函数用来创建一个增量解析器。
+
+        Args:
+            context (ConversionContext, optional): 该谱面的转换设定。未给出时，将从当前目录下的 song_total_time.txt
+                读取一次歌曲总时长。
+        """
+        self.context = context if context is not None else ConversionContext.from_file("song_total_time.txt")
+        # 键为 Timing Group 内容的哈希值，值为具有该内容的 Timing Group 及其开始行号
+        self._groups: dict[tuple[str, str], list[tuple[TimingGroup, int]]] = {}
+        self.rebuilt: list[int] = []
+
+    def reset(self):
+        """该函数用来清除上一次的解析结果，使下一次解析重新创建所有 Timing Group。
+        """
+        self._groups = {}
+        self.rebuilt = []
+
+    def parse(self, file_lines: Sequence[str]) -> ParsedChart:
+        """该函数用来解析谱面，并复用上一次解析中内容未改变的 Timing Group。
+
+        解析结果与 parse_chart 完全相同。被重新创建的 Timing Group 的编号记录在 rebuilt 中。
+
+        Args:
+            file_lines (Sequence[str]): 谱面文件中的所有行。
+
+        Raises:
+            ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。此时上一次的解析结果保持不变。
+
+        Returns:
+            ParsedChart: 该谱面的解析结果。
+        """
+        file_lines = file_lines if isinstance(file_lines, list) else list(file_lines)
+        headers = {}
+        try:
+            ranges = scan_timing_groups(file_lines, headers)
+            return self._parse_ranges(file_lines, ranges, headers)
+        except (IrregularChart, ArcChartException) as reason:
+            # 由完整解析给出与 parse_chart 相同的结果或异常
+            logger.debug("无法增量解析该谱面（%s），改为完整解析", reason)
+            parsed_chart = ArcChart(file_lines, self.context).result
+            self.reset()
+            self.rebuilt = [timing_group.tg_num for timing_group in parsed_chart.timing_group_list]
+            return parsed_chart
+
+    def _parse_ranges(self, file_lines: Sequence[str], ranges: list[GroupRange], headers: dict) -> ParsedChart:
+        offset = headers.get("AudioOffset", 0)
+        context = self.context
+        if context.audio_offset is None:
+            context = context.replace(audio_offset=offset)
+
+        previous_groups = {key: list(groups) for key, groups in self._groups.items()}
+        current_groups: dict[tuple[str, str], list[tuple[TimingGroup, int]]] = {}
+        timing_group_list, rebuilt = [], []
+        for group_range in ranges:
+            key = group_range.digest(file_lines)
+            candidates = previous_groups.get(key)
+            if candidates:
+                previous_group, previous_start = candidates.pop(0)
+                timing_group = _relocate(
+                    previous_group, group_range.tg_num, group_range.start - previous_start, context)
+            else:
+                attributes = tokenize_line(group_range.attributes_line, group_range.start).fields \
+                    if group_range.attributes_line is not None else ()
+                tokens = tokenize(
+                    file_lines[group_range.content_start:group_range.content_end], group_range.content_start + 1)
+                timing_group = TimingGroup(group_range.tg_num, attributes=attributes, tokens=tokens, context=context)
+                rebuilt.append(group_range.tg_num)
+            timing_group_list.append(timing_group)
+            current_groups.setdefault(key, []).append((timing_group, group_range.start))
+
+        self._groups = current_groups
+        self.rebuilt = rebuilt
+        logger.debug("增量解析完成：重新创建 %d 个 Timing Group，复用 %d 个", len(rebuilt),
+                     len(timing_group_list) - len(rebuilt))
+        parsed_chart = ParsedChart(
+            offset, timing_group_list, headers, {group_range.start: group_range.end for group_range in ranges}, context)
+        if logger.isEnabledFor(logging.INFO) and parsed_chart.diagnostics:
+            logger.info("谱面解析完成，发现以下问题：\n%s", parsed_chart.diagnostics_report())
+        return parsed_chart
+
+
+def _relocate(timing_group: TimingGroup, tg_num: int, line_delta: int, context: ConversionContext) -> TimingGroup:
+    """该函数用来复用一个 Timing Group，并更新其编号、timing 行和 Note 所在的行号以及转换设定。
+
+    Args:
+        timing_group (TimingGroup): 上一次解析得到的 Timing Group。
+        tg_num (int): 该 Timing Group 的新编号。
+        line_delta (int): 该 Timing Group 的开始行号的变化量。
+        context (ConversionContext): 新的转换设定。
+
+    Returns:
+        TimingGroup: 编号、行号和转换设定都未改变时返回原实例，否则返回共用 BPM 时间轴和各项缓存的副本。
+    """
+    if timing_group.tg_num == tg_num and line_delta == 0 and timing_group.context == context:
+        return timing_group
+    relocated = copy.copy(timing_group)
+    relocated.tg_num = tg_num
+    relocated.context = context
+    if line_delta:
+        arrays = {}
+        for name, array in timing_group.notes.to_arrays().items():
+            arrays[name] = array.copy()
+            arrays[name]["line"] += line_delta
+        relocated.notes = NoteTable.from_arrays(arrays)
+        relocated.timings = timing_group.timings.copy()
+        relocated.timings["line"] += line_delta
+        relocated.first_line_num += line_delta
+    return relocated
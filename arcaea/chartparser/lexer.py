@@ -0,0 +1,193 @@
+"""这个模块用来对 Arcaea 谱面文件进行逐行词法分析。
+
+每一行只根据其开头的关键字分类一次，随后使用预编译的正则表达式一次性取出该行的全部字段，并转换为对应的类型。
+"""
+import re
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+from arcaea.assets import ArcChartException
+
+# 谱面行的种类
+HEADER = "header"
+SEPARATOR = "separator"
+TIMING = "timing"
+TAP = "tap"
+HOLD = "hold"
+ARC = "arc"
+GROUP_START = "timinggroup"
+GROUP_END = "end"
+IGNORED = "ignored"
+EMPTY = "empty"
+
+_NUMBER = r"\s*(-?\d+(?:\.\d*)?)\s*"
+_INTEGER = r"\s*(-?\d+)\s*"
+_WORD = r"\s*([^,()\s]*)\s*"
+_END = r"\s*;?\s*$"
+
+_LEADING_WORD = re.compile(r"\s*([A-Za-z]*)")
+_HEADER = re.compile(r"\s*(\w+)\s*:\s*(.*?)\s*$")
+_SEPARATOR = re.compile(r"\s*-+\s*$")
+_TAP = re.compile(rf"\s*\({_NUMBER},{_INTEGER}\){_END}")
+_HOLD = re.compile(rf"\s*hold\({_NUMBER},{_NUMBER},{_INTEGER}\){_END}")
+_TIMING = re.compile(rf"\s*timing\({_NUMBER},{_NUMBER}(?:,{_NUMBER})?\){_END}")
+_ARC = re.compile(
+    rf"\s*arc\({_NUMBER},{_NUMBER},{_NUMBER},{_NUMBER},{_WORD},{_NUMBER},{_NUMBER},{_INTEGER},{_WORD},"
+    rf"\s*(true|false)\s*\)(?:\[([^\]]*)\])?{_END}")
+_ARCTAP = re.compile(rf"\s*arctap\({_NUMBER}\)\s*")
+_GROUP_START = re.compile(r"\s*timinggroup\(([^)]*)\)\s*\{\s*$")
+_GROUP_END = re.compile(r"\s*\}\s*;?\s*$")
+
+# 不影响 Note 位置，当前版本暂不处理的谱面行。
+_IGNORED_WORDS = frozenset(("scenecontrol", "camera"))
+
+
+class ChartToken(NamedTuple):
+    """谱面行的词法分析结果。
+
+    fields 中各字段的含义由 kind 决定：
+        header: (键, 值)，其中 AudioOffset 的值为 int，其余为 str。
+        timing: (开始时间, BPM, 节拍数)。
+        tap: (打击时间, 轨道)。
+        hold: (开始时间, 结束时间, 轨道)。
+        arc: (开始时间, 结束时间, 开始横向位置, 结束横向位置, 坐标变化移动类型, 开始纵向位置, 结束纵向位置,
+            颜色, NONE 值, 是否为黑线, 所有 Arctap 的打击时间组成的元组)。
+        timinggroup: Timing Group 的全部属性组成的元组。
+        其余种类的 fields 为空元组。
+    """
+
+    kind: str
+    line_num: int
+    fields: tuple
+
+
+def _line_error(line_num: int, line: str) -> ArcChartException:
+    return ArcChartException(f"解析谱面文件的第 {line_num} 行时发生错误：无法识别该行的内容 {line.strip()}")
+
+
+def _match(pattern: re.Pattern, line: str, line_num: int) -> re.Match:
+    matched = pattern.match(line)
+    if matched is None:
+        raise _line_error(line_num, line)
+    return matched
+
+
+def _tap(line: str, line_num: int) -> ChartToken:
+    touch_time, trace = _match(_TAP, line, line_num).groups()
+    return ChartToken(TAP, line_num, (float(touch_time), int(trace)))
+
+
+def _hold(line: str, line_num: int) -> ChartToken:
+    start_time, end_time, trace = _match(_HOLD, line, line_num).groups()
+    return ChartToken(HOLD, line_num, (float(start_time), float(end_time), int(trace)))
+
+
+def _timing(line: str, line_num: int) -> ChartToken:
+    start_time, bpm, beats = _match(_TIMING, line, line_num).groups()
+    return ChartToken(TIMING, line_num, (float(start_time), float(bpm), float(beats) if beats else 4.0))
+
+
+def _arc(line: str, line_num: int) -> ChartToken:
+    start_time, end_time, x_start_pos, x_end_pos, movement_type, y_start_pos, y_end_pos, arc_color, none_value, \
+        is_trace, arctaps = _match(_ARC, line, line_num).groups()
+    arctap_times = ()
+    if arctaps:
+        arctap_times = tuple(float(arctap_time) for arctap_time in _ARCTAP.findall(arctaps))
+        if len(arctap_times) != arctaps.count("arctap"):
+            raise _line_error(line_num, line)
+    return ChartToken(ARC, line_num, (
+        float(start_time), float(end_time), float(x_start_pos), float(x_end_pos), movement_type, float(y_start_pos),
+        float(y_end_pos), int(arc_color), none_value, is_trace == "true", arctap_times))
+
+
+def _timing_or_group(line: str, line_num: int) -> ChartToken:
+    group_start = _GROUP_START.match(line)
+    if group_start is None:
+        return _timing(line, line_num)
+    attributes = tuple(attribute.strip() for attribute in group_start.group(1).split("_") if attribute.strip())
+    return ChartToken(GROUP_START, line_num, attributes)
+
+
+# 以行首关键字分派的解析函数
+_DISPATCH = {
+    "arc": _arc,
+    "hold": _hold,
+    "timing": _timing,
+    "timinggroup": _timing_or_group,
+}
+
+
+def tokenize_line(line: str, line_num: int) -> ChartToken:
+    """该函数用来对谱面文件中的一行进行词法分析。
+
+    Args:
+        line (str): 谱面文件中的一行。
+        line_num (int): 该行在谱面文件中的行号（从 1 开始计数）。
+
+    Raises:
+        ArcChartException: 当该行的内容无法被识别时，抛出该异常。
+
+    Returns:
+        ChartToken: 该行的词法分析结果。
+    """
+    leading_word = _LEADING_WORD.match(line).group(1)
+    parser = _DISPATCH.get(leading_word)
+    if parser is not None:
+        return parser(line, line_num)
+    if leading_word in _IGNORED_WORDS:
+        return ChartToken(IGNORED, line_num, ())
+    if leading_word:
+        header = _match(_HEADER, line, line_num)
+        key, value = header.groups()
+        if key == "AudioOffset":
+            try:
+                return ChartToken(HEADER, line_num, (key, int(value)))
+            except ValueError as error:
+                raise _line_error(line_num, line) from error
+        return ChartToken(HEADER, line_num, (key, value))
+    if not line or line.isspace():
+        return ChartToken(EMPTY, line_num, ())
+    if _GROUP_END.match(line):
+        return ChartToken(GROUP_END, line_num, ())
+    if _SEPARATOR.match(line):
+        return ChartToken(SEPARATOR, line_num, ())
+    return _tap(line, line_num)
+
+
+def line_structure(line: str) -> str:
+    """该函数用来快速判断一行是否为划分 Timing Group 的结构行，而不解析其余行的字段。
+
+    Args:
+        line (str): 谱面文件中的一行。
+
+    Returns:
+        str: 为间隔行、Timing Group 开始行或结束行时，分别返回 SEPARATOR，GROUP_START 或 GROUP_END，否则返回空字符串。
+    """
+    stripped = line.lstrip()
+    if not stripped:
+        return ""
+    first_char = stripped[0]
+    if first_char == "}" and _GROUP_END.match(stripped):
+        return GROUP_END
+    if first_char == "-" and _SEPARATOR.match(stripped):
+        return SEPARATOR
+    if first_char == "t" and stripped.startswith("timinggroup") and _GROUP_START.match(stripped):
+        return GROUP_START
+    return ""
+
+
+def tokenize(lines: Iterable[str], first_line_num: int = 1) -> Iterator[ChartToken]:
+    """该函数用来对谱面文件中的多行依次进行词法分析。
+
+    Args:
+        lines (Iterable[str]): 谱面文件中的行。
+        first_line_num (int, optional): 第一行在谱面文件中的行号。
+
+    Raises:
+        ArcChartException: 当任意一行的内容无法被识别时，抛出该异常。
+
+    Yields:
+        ChartToken: 每一行的词法分析结果。
+    """
+    for line_num, line in enumerate(lines, first_line_num):
+        yield tokenize_line(line, line_num)
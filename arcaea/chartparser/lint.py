@@ -0,0 +1,72 @@
+"""这个模块用来在转换前快速检查谱面中的问题。
+
+与 parse_chart 在第一个错误处停止不同，lint_chart 会跳过无法识别的行和无法创建的 Timing Group 继续检查，
+并以 validate_notes 批量校验每个 Timing Group 的全部 Note，从而在一次遍历中报告谱面中的所有问题。
+检查只进行词法分析和 Note 列表的创建，不计算逐帧位置表等转换所需的数据，因此可以在转换大量谱面之前先行筛选。
+"""
+import logging
+from collections.abc import Iterable, Iterator
+
+from arcaea.assets import (
+    ERROR, STRUCTURE_ERROR, UNRECOGNIZED_LINE, ArcChartException, ChartIssue, ConversionContext, ValidationReport
+)
+from arcaea.chartparser import TimingGroup, split_timing_groups
+from arcaea.chartparser.lexer import ChartToken, tokenize_line
+
+logger = logging.getLogger(__name__)
+
+
+def _first_line(error: ArcChartException) -> str:
+    # 异常说明的第一行即问题本身，其后为反馈问题的提示
+    return str(error).splitlines()[0]
+
+
+def lint_chart(
+    file_lines: Iterable[str], context: ConversionContext = None, strict: bool = False
+) -> ValidationReport:
+    """该函数用来检查一个谱面，并报告其中的所有问题。
+
+    Args:
+        file_lines (Iterable[str]): 谱面文件内所有行组成的列表，或以文本模式打开的谱面文件。
+        context (ConversionContext, optional): 该谱面的转换设定。未给出时使用歌曲总时长为 0 的设定，检查结果与歌曲总时长无关。
+        strict (bool, optional): 为 True 时，谱面中存在错误则抛出异常；否则只在报告中记录。
+
+    Raises:
+        ArcChartException: 当 strict 为 True 且谱面中存在错误时，抛出该异常，其中列出所有错误。
+
+    Returns:
+        ValidationReport: 该谱面的检查报告。
+    """
+    context = context if context is not None else ConversionContext(0)
+    issues = []
+    last_line_num = 0
+
+    def tokens() -> Iterator[ChartToken]:
+        nonlocal last_line_num
+        for line_num, line in enumerate(file_lines, 1):
+            last_line_num = line_num
+            try:
+                yield tokenize_line(line, line_num)
+            except ArcChartException:
+                issues.append(ChartIssue(None, line_num, "谱面行", UNRECOGNIZED_LINE, ERROR, line.strip()))
+
+    reports = []
+    try:
+        for source in split_timing_groups(tokens()):
+            try:
+                timing_group = TimingGroup(
+                    source.tg_num, attributes=source.attributes, tokens=source.tokens, context=context, strict=False)
+            except ArcChartException as error:
+                issues.append(
+                    ChartIssue(source.tg_num, source.start, "Timing Group", STRUCTURE_ERROR, ERROR, _first_line(error)))
+                continue
+            reports.append(timing_group.validate())
+    except ArcChartException as error:
+        # Timing Group 未闭合等结构错误使其后的行无法划分，只能停止检查
+        issues.append(ChartIssue(None, last_line_num, "Timing Group", STRUCTURE_ERROR, ERROR, _first_line(error)))
+
+    report = ValidationReport.merge([ValidationReport(issues), *reports])
+    logger.debug("谱面检查完成：%d 个错误，%d 个警告", len(report.errors), len(report.warnings))
+    if strict and report.errors:
+        raise ArcChartException(f"谱面中存在 {len(report.errors)} 个错误：\n{report.format(ERROR)}")
+    return report
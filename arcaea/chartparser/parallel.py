@@ -0,0 +1,205 @@
+"""这个模块用来在多个进程中并行创建 Timing Group。
+
+每个 Timing Group 的 Note 列表和 BPM 时间轴都可以独立计算，因此由进程池中的各个进程分别创建。
+主进程只以 line_structure 找出每个 Timing Group 的行范围，并将其原始谱面行交给子进程，词法分析也在子进程中进行；
+子进程的结果数组写入共享内存后交还主进程，以避免序列化和传输大数组的开销。主进程按 Timing Group 编号的顺序重新组装结果，
+与在单个进程中解析的结果完全相同。
+"""
+import os
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from arcaea.assets import ArcChartException, BpmTimeline, ConversionContext
+from arcaea.chartparser import TimingGroup
+from arcaea.chartparser.structure import IrregularChart, scan_timing_groups
+from arcaea.chartparser.lexer import tokenize, tokenize_line
+
+# 共享内存中每个数组的开始位置按该字节数对齐。
+_ALIGNMENT = 64
+
+
+class SharedArrays:
+    """该类用来描述保存在一块共享内存中的多个数组。
+
+    该类本身只保存共享内存的名称和每个数组的位置，可以在进程之间以很小的开销传递。
+    """
+
+    def __init__(self, name: str, layout: list[tuple[str, np.dtype, tuple, int]]) -> None:
+        """该函数用来创建一个共享数组描述。
+
+        Args:
+            name (str): 共享内存的名称。
+            layout (list[tuple[str, np.dtype, tuple, int]]): 每个数组的名称、类型、形状和在共享内存中的开始位置。
+        """
+        self.name = name
+        self.layout = layout
+
+    @classmethod
+    def create(cls, arrays: dict[str, np.ndarray]) -> "SharedArrays":
+        """该函数用来将多个数组写入一块新的共享内存。
+
+        写入后，当前进程不再持有该共享内存，其释放由调用 SharedArrays.take 的进程负责。
+
+        Args:
+            arrays (dict[str, np.ndarray]): 需要写入的数组。
+
+        Returns:
+            SharedArrays: 写入的共享数组描述。
+        """
+        layout = []
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // _ALIGNMENT) * _ALIGNMENT
+            layout.append((name, array.dtype, array.shape, size))
+            size += array.nbytes
+        # 共享内存的大小不能为 0
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        # 共享内存的所有权交给读取它的进程，当前进程退出时不应将其回收（仅 POSIX 系统会跟踪共享内存）
+        if os.name == "posix":
+            resource_tracker.unregister(block._name, "shared_memory")  # pylint: disable=protected-access
+        try:
+            for name, dtype, shape, offset in layout:
+                np.ndarray(shape, dtype, buffer=block.buf, offset=offset)[...] = arrays[name]
+        except BaseException:
+            block.unlink()
+            raise
+        finally:
+            block.close()
+        return cls(block.name, layout)
+
+    def take(self) -> dict[str, np.ndarray]:
+        """该函数用来从共享内存中读出全部数组，并释放该共享内存。
+
+        Returns:
+            dict[str, np.ndarray]: 读出的数组。这些数组不再依赖共享内存。
+        """
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            return {
+                name: np.ndarray(shape, dtype, buffer=block.buf, offset=offset).copy()
+                for name, dtype, shape, offset in self.layout}
+        finally:
+            block.close()
+            block.unlink()
+
+    def release(self):
+        """该函数用来释放共享内存，而不读出任何数组。
+        """
+        block = shared_memory.SharedMemory(name=self.name)
+        block.close()
+        block.unlink()
+
+
+class TimingGroupLines(NamedTuple):
+    """一个 Timing Group 在谱面文件中的范围及其原始谱面行。
+
+    start 和 end 与 TimingGroupSource 相同，为该 Timing Group 内容在谱面文件行列表中的开始和结束下标。
+    first_line_num 为 lines 中第一行的行号（从 1 开始计数）。
+    """
+
+    tg_num: int
+    start: int
+    end: int
+    attributes: tuple
+    lines: list[str]
+    first_line_num: int
+
+
+def split_timing_group_lines(file_lines: Sequence[str], headers: dict) -> Optional[list[TimingGroupLines]]:
+    """该函数用来按 Timing Group 拆分谱面文件行，而不对 Timing Group 的内容进行词法分析。
+
+    Args:
+        file_lines (Sequence[str]): 谱面文件中的所有行。
+        headers (dict): 用来接收 AudioOffset 等谱面头部信息的字典。
+
+    Returns:
+        list[TimingGroupLines] | None: 按编号排列的每个 Timing Group 的原始谱面行。谱面结构不规则、
+            无法按行范围拆分时为 None，此时应当在单个进程中解析，以给出与其相同的结果或异常。
+    """
+    try:
+        ranges = scan_timing_groups(file_lines, headers)
+    except (IrregularChart, ArcChartException):
+        headers.clear()
+        return None
+    return [
+        TimingGroupLines(
+            group_range.tg_num, group_range.start, group_range.end,
+            tokenize_line(group_range.attributes_line, group_range.start).fields
+            if group_range.attributes_line is not None else (),
+            file_lines[group_range.content_start:group_range.content_end], group_range.content_start + 1)
+        for group_range in ranges]
+
+
+def build_timing_group_arrays(
+    source: TimingGroupLines, context: ConversionContext
+) -> tuple[SharedArrays, dict[str, int]]:
+    """该函数用来在子进程中创建一个 Timing Group，并将其 Note 列表和 BPM 时间轴写入共享内存。
+
+    该 Timing Group 的词法分析和逐帧累计位置表的计算也在子进程中进行。
+
+    Args:
+        source (TimingGroupLines): 该 Timing Group 在谱面文件中的范围及其原始谱面行。
+        context (ConversionContext): 该谱面的转换设定。
+
+    Raises:
+        ArcChartException: 当存在无法识别的谱面行或 Note 时，抛出该异常。
+
+    Returns:
+        tuple[SharedArrays, dict[str, int]]: 写入的共享数组描述，以及该 Timing Group 中各类问题的数量。
+    """
+    tokens = tokenize(source.lines, source.first_line_num)
+    timing_group = TimingGroup(source.tg_num, attributes=source.attributes, tokens=tokens, context=context)
+    arrays = timing_group.notes.to_arrays()
+    arrays["start_times"] = timing_group.bpm_timeline.start_times
+    arrays["bpms"] = timing_group.bpm_timeline.bpms
+    arrays["frame_positions"] = timing_group.bpm_timeline.frame_positions(context.last_frame)
+    return SharedArrays.create(arrays), dict(timing_group.diagnostics)
+
+
+def _restore_timing_group(source: TimingGroupLines, built: tuple[SharedArrays, dict[str, int]],
+                          context: ConversionContext) -> TimingGroup:
+    shared_arrays, diagnostics = built
+    arrays = shared_arrays.take()
+    frame_positions = arrays.pop("frame_positions")
+    frame_positions.flags.writeable = False
+    bpm_timeline = BpmTimeline.from_arrays(arrays.pop("start_times"), arrays.pop("bpms"), frame_positions)
+    timing_group = TimingGroup.from_arrays(source.tg_num, source.attributes, bpm_timeline, arrays, context)
+    timing_group.diagnostics.update(diagnostics)
+    return timing_group
+
+
+def build_timing_groups(
+    sources: Iterable[TimingGroupLines], context: ConversionContext, workers: int
+) -> Iterator[tuple[TimingGroupLines, TimingGroup]]:
+    """该函数用来在进程池中并行创建多个 Timing Group。
+
+    Args:
+        sources (Iterable[TimingGroupLines]): 按编号顺序排列的 Timing Group 范围及其原始谱面行。
+        context (ConversionContext): 该谱面的转换设定。
+        workers (int): 进程池中的进程数。
+
+    Raises:
+        ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。
+
+    Yields:
+        tuple[TimingGroupLines, TimingGroup]: 按编号顺序产出的 Timing Group 范围及其实例。
+    """
+    pending: list[tuple[TimingGroupLines, Future]] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            for source in sources:
+                pending.append((source, executor.submit(build_timing_group_arrays, source, context)))
+            while pending:
+                source, future = pending.pop(0)
+                yield source, _restore_timing_group(source, future.result(), context)
+        finally:
+            # 出现错误或提前结束时，取消尚未开始的任务，并释放已完成任务的共享内存
+            for _, future in pending:
+                future.cancel()
+            for _, future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    future.result()[0].release()
@@ -0,0 +1,99 @@
+"""这个模块用来在不进行完整词法分析的情况下，找出谱面文件中每个 Timing Group 的行范围。
+
+扫描只以 line_structure 判断每一行是否为间隔行或 Timing Group 的开始、结束标志，只有谱面头部和 Timing Group
+之间的少数行才进行词法分析。增量解析以此比较各个 Timing Group 的内容，并行解析以此将原始谱面行分给子进程。
+"""
+import hashlib
+from collections.abc import Sequence
+
+from arcaea.chartparser.lexer import (
+    EMPTY, GROUP_END, GROUP_START, HEADER, IGNORED, SEPARATOR, line_structure, tokenize, tokenize_line
+)
+
+
+class IrregularChart(Exception):
+    """谱面结构无法按行范围划分时，用来退回到完整解析。
+    """
+
+
+class GroupRange:
+    """一个 Timing Group 在谱面文件中的行范围。
+
+    content_start 和 content_end 为其内容在谱面文件行列表中的下标（不包含结束下标），
+    start 和 end 为 ParsedChart.timing_group_value_dict 中记录的开始和结束行号。
+    """
+
+    def __init__(self, tg_num: int, content_start: int, content_end: int, start: int, end: int,
+                 attributes_line: str = None) -> None:
+        self.tg_num = tg_num
+        self.content_start = content_start
+        self.content_end = content_end
+        self.start = start
+        self.end = end
+        self.attributes_line = attributes_line
+
+    def digest(self, file_lines: Sequence[str]) -> tuple[str, str]:
+        """该函数用来计算该 Timing Group 的内容的哈希值。
+
+        Args:
+            file_lines (Sequence[str]): 谱面文件中的所有行。
+
+        Returns:
+            tuple[str, str]: Timing Group 开始行和内容的哈希值。内容相同的 Timing Group 具有相同的哈希值，与其位置无关。
+        """
+        content = "\n".join(file_lines[self.content_start:self.content_end]).encode("utf-8")
+        return self.attributes_line or "", hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def scan_timing_groups(file_lines: Sequence[str], headers: dict) -> list[GroupRange]:
+    """该函数用来找出谱面文件中每个 Timing Group 的行范围，并读取谱面头部信息。
+
+    Args:
+        file_lines (Sequence[str]): 谱面文件中的所有行。
+        headers (dict): 用来接收谱面头部信息的字典。
+
+    Raises:
+        IrregularChart: 当谱面结构无法按行范围划分时，抛出该异常。
+
+    Returns:
+        list[GroupRange]: 按编号排列的每个 Timing Group 的行范围。
+    """
+    separator_index = next(
+        (index for index, line in enumerate(file_lines) if line_structure(line) == SEPARATOR), None)
+    if separator_index is None:
+        raise IrregularChart("谱面文件中没有间隔行")
+    for token in tokenize(file_lines[:separator_index]):
+        if token.kind == HEADER:
+            headers[token.fields[0]] = token.fields[1]
+        elif token.kind != EMPTY:
+            raise IrregularChart(f"第 {token.line_num} 行位于间隔行之前")
+
+    ranges = []
+    group_start = None
+    for index in range(separator_index + 1, len(file_lines)):
+        kind = line_structure(file_lines[index])
+        if kind == GROUP_START:
+            if group_start is not None:
+                raise IrregularChart(f"第 {index + 1} 行开始的 Timing Group 嵌套在另一个 Timing Group 中")
+            if not ranges:
+                ranges.append(GroupRange(0, separator_index + 1, index, separator_index + 1, index))
+            group_start = index
+        elif kind == GROUP_END:
+            if group_start is None:
+                raise IrregularChart(f"第 {index + 1} 行的结束标志没有对应的开始标志")
+            ranges.append(GroupRange(
+                len(ranges), group_start + 1, index + 1, group_start + 1, index + 1, file_lines[group_start]))
+            group_start = None
+        elif kind == SEPARATOR:
+            raise IrregularChart(f"第 {index + 1} 行为多余的间隔行")
+        elif ranges and group_start is None and file_lines[index].strip():
+            # 位于 Timing Group 之间的行只允许为被忽略的行
+            token = tokenize_line(file_lines[index], index + 1)
+            if token.kind != IGNORED:
+                raise IrregularChart(f"第 {index + 1} 行位于所有 Timing Group 之外")
+    if group_start is not None:
+        raise IrregularChart(f"第 {group_start + 1} 行开始的 Timing Group 没有结束标志")
+    if not ranges:
+        ranges.append(GroupRange(
+            0, separator_index + 1, len(file_lines), separator_index + 1, len(file_lines)))
+    return ranges
@@ -1,9 +1,120 @@
-import cv2
+"""这个模块用来将 Arcaea 谱面坐标透视变换到 Phigros 画面坐标。
+
+Arcaea 的轨道平面在画面中是一个梯形。在高度 y = 0 和 y = 0.5 处的梯形四个顶点已经测得，
+其余高度的梯形由这两个梯形按高度线性插值得到。每一个高度层的单应矩阵只在创建变换时计算一次，
+此后任意多个 Note 在一帧中的坐标都只需一次向量化计算即可全部变换。
+
+OpenCV 只在创建透视变换时才导入，因此只使用 trace_to_x 等坐标换算的模块（例如谱面编译器）无需加载 OpenCV。
+"""
+from functools import lru_cache
+
 import numpy as np
 
+# y = 0 时轨道平面四个顶点在画面中的坐标，依次为远端左、远端右、近端左、近端右。
+POINT_SET_Y_0 = np.array([[395, 275], [971, 275], [235, 445], [1135, 445]], dtype="float32")
+# y = 0.5 时轨道平面四个顶点在画面中的坐标。测量时的顺序为远端左、远端右、近端右、近端左，此处已调整为与 y = 0 相同的顺序。
+POINT_SET_Y_HALF = np.array([[380, 200], [986, 200], [201, 330], [1165, 330]], dtype="float32")
+
+# 轨道平面在 Arcaea 坐标中的横向范围，即 4 条轨道的左右边界。
+X_RANGE = (-0.5, 1.5)
+
+
+def trace_to_x(trace):
+    """该函数用来计算 Tap 或 Hold 所在轨道的中心在 Arcaea 横向坐标中的位置。
+
+    Args:
+        trace (int | np.ndarray): 轨道编号（1-4）。
+
+    Returns:
+        float | np.ndarray: 轨道中心的横向坐标。
+    """
+    return X_RANGE[0] + (np.asarray(trace, dtype=np.float64) - 0.5) * (X_RANGE[1] - X_RANGE[0]) / 4
+
+
+class PerspectiveTransform:
+    """透视变换类。
+
+    源坐标为 (x, z / depth)，其中 x 为 Arcaea 横向坐标，z 为 Note 与判定线之间的位置差（即 FramePositions 中的值）。
+    z = 0 对应轨道近端（判定线），z = depth 对应轨道远端。高度 y 被量化为 levels 层，每一层使用各自的单应矩阵。
+    """
+
+    def __init__(self, depth: float = 1.0, levels: int = 100) -> None:
+        """该函数用来创建一个透视变换，并预先计算每一个高度层的单应矩阵。
+
+        Args:
+            depth (float, optional): 轨道远端所对应的位置差。
+            levels (int, optional): 将 0 到 1 的高度等分的层数。
+        """
+        if depth <= 0 or levels < 1:
+            raise ValueError(f"轨道深度必须为正数，层数必须为正整数，而不是 {depth} 和 {levels}。")
+        import cv2  # pylint: disable=import-outside-toplevel
+
+        self.depth = depth
+        self.levels = levels
+        x_left, x_right = X_RANGE
+        source = np.array([[x_left, 1], [x_right, 1], [x_left, 0], [x_right, 0]], dtype="float32")
+        heights = np.arange(levels + 1) / levels
+        # 第 i 层为高度 i / levels 处的梯形。高于 0.5 的梯形由两个已知梯形线性外推得到。
+        quads = POINT_SET_Y_0 + (POINT_SET_Y_HALF - POINT_SET_Y_0) * (heights / 0.5)[:, None, None]
+        self.matrices = np.stack([cv2.getPerspectiveTransform(source, quad.astype("float32")) for quad in quads])
+        self.matrices.flags.writeable = False
+
+    def level_of(self, y_position) -> np.ndarray:
+        """该函数用来计算高度所在的层编号。超出 0 到 1 的高度将被视为最近的层。
+
+        Args:
+            y_position (float | np.ndarray): Arcaea 纵向坐标。
+
+        Returns:
+            np.ndarray: 层编号。
+        """
+        return np.clip(np.rint(np.asarray(y_position, dtype=np.float64) * self.levels), 0, self.levels).astype(np.intp)
+
+    def transform(self, x_position, y_position, z_position) -> np.ndarray:
+        """该函数用来将任意多个 Arcaea 坐标一次性变换到画面坐标。
+
+        三个参数可以是数值或数组，并按照 NumPy 的规则广播。
+
+        Args:
+            x_position (float | np.ndarray): Arcaea 横向坐标。
+            y_position (float | np.ndarray): Arcaea 纵向坐标（高度）。
+            z_position (float | np.ndarray): Note 与判定线之间的位置差。
+
+        Returns:
+            np.ndarray: 形状为 (..., 2) 的画面坐标（像素）。
+        """
+        x_position, y_position, z_position = np.broadcast_arrays(
+            np.asarray(x_position, dtype=np.float64), y_position, np.asarray(z_position, dtype=np.float64))
+        matrices = self.matrices[self.level_of(y_position)]
+        source = np.stack((x_position, z_position / self.depth, np.ones(x_position.shape)), axis=-1)
+        projected = np.einsum("...ij,...j->...i", matrices, source)
+        return projected[..., :2] / projected[..., 2:]
+
+    def transform_level(self, points: np.ndarray, level: int) -> np.ndarray:
+        """该函数用来将同一高度层中的多个点变换到画面坐标，用于绘制 Arc 的某一个切片图层。
+
+        Args:
+            points (np.ndarray): 形状为 (n, 2) 的源坐标，每一行为 (x, z)。
+            level (int): 高度层编号。
+
+        Returns:
+            np.ndarray: 形状为 (n, 2) 的画面坐标（像素）。
+        """
+        import cv2  # pylint: disable=import-outside-toplevel
+
+        source = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2) / (1.0, self.depth)
+        return cv2.perspectiveTransform(source, self.matrices[level]).reshape(-1, 2)
+
+
+@lru_cache(maxsize=None)
+def return_perspective_transform(depth: float = 1.0, levels: int = 100) -> PerspectiveTransform:
+    """该函数用来取得一个透视变换。相同参数的透视变换只创建一次，并在所有调用之间共享。
 
-def return_perspective_transform():
-    pass
+    Args:
+        depth (float, optional): 轨道远端所对应的位置差。
+        levels (int, optional): 将 0 到 1 的高度等分的层数。
 
-# point_set_a_0 = np.array([[395,275],[971,275],[235,445],[1135,445]], dtype = "float32")
-# point_set_a_half = np.array([[380,200],[986,200],[1165,330],[201,330]], dtype = "float32")
+    Returns:
+        PerspectiveTransform: 透视变换。
+    """
+    return PerspectiveTransform(depth, levels)
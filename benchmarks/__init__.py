@@ -0,0 +1,4 @@
+"""Arc2Phi 的性能基准测试。
+
+运行 python -m benchmarks run 以生成基准测试结果，运行 python -m benchmarks compare 以比较两次结果。
+"""
@@ -0,0 +1,59 @@
+"""该模块使基准测试可以通过 python -m benchmarks 运行。
+
+用法示例：
+
+    python -m benchmarks run -o baseline.json
+    python -m benchmarks run --quick -o current.json
+    python -m benchmarks compare baseline.json current.json
+"""
+import argparse
+import sys
+
+from benchmarks.suite import AXES, QUICK_AXES, compare, load, run, save
+
+
+def main(argv: list[str] = None) -> int:
+    """该函数是基准测试的命令行入口。
+
+    Args:
+        argv (list[str], optional): 命令行参数。未给出时使用 sys.argv。
+
+    Returns:
+        int: 退出码。compare 发现性能退化时为 1。
+    """
+    parser = argparse.ArgumentParser(prog="benchmarks", description="Arc2Phi 解析器的性能基准测试。")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="运行基准测试。")
+    run_parser.add_argument("-o", "--output", default="benchmark.json", help="结果文件路径，默认为 benchmark.json。")
+    run_parser.add_argument("--quick", action="store_true", help="只运行小规模的测试用例。")
+    run_parser.add_argument("--repeats", type=int, default=3, help="每个项目的执行次数，默认为 3。")
+    run_parser.add_argument("--axis", action="append", choices=list(AXES), help="只测量该参数的规模曲线，可以重复指定。")
+    run_parser.add_argument("--skip-note-objects", action="store_true", help="不测量旧接口中 Note 实例的生成。")
+    run_parser.add_argument("--skip-startup", action="store_true", help="不测量各入口模块的导入耗时。")
+    run_parser.add_argument("--skip-parallel", action="store_true", help="不比较单进程与多进程并行解析的耗时。")
+    compare_parser = commands.add_parser("compare", help="比较两次基准测试的结果。")
+    compare_parser.add_argument("baseline", help="作为基准的结果文件。")
+    compare_parser.add_argument("current", help="需要比较的结果文件。")
+    compare_parser.add_argument("--threshold", type=float, default=1.1, help="视为性能退化的耗时之比，默认为 1.1。")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        axes = QUICK_AXES if args.quick else AXES
+        if args.axis:
+            axes = {axis: values for axis, values in axes.items() if axis in args.axis}
+        results = run(
+            axes, args.repeats, not args.skip_note_objects, print, not args.skip_startup, not args.skip_parallel)
+        save(results, args.output)
+        for metric, exponents in results["scaling"].items():
+            print(f"{metric} 的增长阶数：" + "，".join(f"{axis} {exponent:.2f}" for axis, exponent in exponents.items()))
+        return 0
+
+    rows = compare(load(args.baseline), load(args.current), args.threshold)
+    for case, metric, base_time, current_time, ratio, regressed in rows:
+        print(f"{'退化' if regressed else '    '} {case:<22} {metric:<14} "
+              f"{base_time * 1000:10.2f}ms -> {current_time * 1000:10.2f}ms  x{ratio:.2f}")
+    return 1 if any(row[5] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""这个模块用来在不同规模的合成谱面上测量解析器各部分的耗时。
+
+每个测试用例只改变基准规格中的一个参数（Note 数量、BPM 变化数量、Timing Group 数量或歌曲时长），
+因此同一参数下的各个用例可以组成一条规模曲线。此外还比较单进程与多进程并行解析同一个大型谱面的耗时。
+结果以 JSON 保存，不同版本的结果可以用 compare 逐项比较。
+"""
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+from arcaea.assets import BpmTimeline, ConversionContext
+from arcaea.chartparser import ArcChart, TimingGroup
+from benchmarks.synthetic import ChartSpec, generate_chart
+
+# 结果文件的格式版本。当结果的结构发生变化时，应当增加该值。
+SCHEMA_VERSION = 1
+
+BASE_SPEC = ChartSpec(taps=2000, holds=400, arcs=400, arctaps=200, timing_groups=1, timing_changes=1, duration=120000)
+
+# 每个参数的取值。notes 为各种 Note 数量相对基准规格的倍数。
+AXES = {
+    "notes": (1, 4, 16),
+    "timing_changes": (1, 64, 1024),
+    "timing_groups": (1, 8, 32),
+    "duration": (60000, 240000, 600000),
+}
+QUICK_AXES = {
+    "notes": (1, 2),
+    "timing_changes": (1, 16),
+    "timing_groups": (1, 4),
+    "duration": (30000, 60000),
+}
+
+# 并行解析的测试谱面包含较多的 Timing Group，使各进程的工作量可以均衡；以及并行解析使用的进程数。
+PARALLEL_SPEC = ChartSpec(
+    taps=20000, holds=4000, arcs=4000, arctaps=2000, timing_groups=40, timing_changes=1, duration=120000)
+PARALLEL_WORKERS = (2, 4)
+
+# 只需解析或编译谱面的入口模块，以及这些模块在导入时不应加载的重量级依赖。
+STARTUP_MODULES = ("arcaea.chartparser", "arcaea.chartparser.lint", "phigros.chart.compiler", "arc2phi.cli")
+DEFERRED_MODULES = ("cv2", "arcfutil", "multiprocessing", "concurrent.futures.process")
+
+_STARTUP_PROBE = """
+import sys, time
+start_time = time.perf_counter()
+import {module}
+print(time.perf_counter() - start_time)
+print(",".join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+
+def build_grid(axes: dict[str, tuple] = None, base: ChartSpec = BASE_SPEC) -> list[tuple[str, str, int, ChartSpec]]:
+    """该函数用来生成测试用例。
+
+    Args:
+        axes (dict[str, tuple], optional): 每个参数的取值。未给出时使用 AXES。
+        base (ChartSpec, optional): 基准规格。
+
+    Returns:
+        list[tuple[str, str, int, ChartSpec]]: 每个测试用例的名称、参数名、参数值和谱面规格。
+    """
+    grid = []
+    for axis, values in (axes or AXES).items():
+        for value in values:
+            if axis == "notes":
+                spec = base.replace(
+                    taps=base.taps * value, holds=base.holds * value, arcs=base.arcs * value,
+                    arctaps=base.arctaps * value)
+            else:
+                spec = base.replace(**{axis: value})
+            grid.append((f"{axis}-{value}", axis, value, spec))
+    return grid
+
+
+def measure(function: Callable[[], object], repeats: int) -> dict[str, float]:
+    """该函数用来多次执行一个函数，并统计其耗时。
+
+    Args:
+        function (Callable[[], object]): 需要测量的函数。
+        repeats (int): 执行次数。
+
+    Returns:
+        dict[str, float]: 以 min 和 median 为键的耗时（秒）。
+    """
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return {"min": min(times), "median": statistics.median(times)}
+
+
+def _compute_positions(chart: ArcChart):
+    # 以新的 BPM 时间轴计算每个 Timing Group 的逐帧位置表和每个 Note 的起始位置，以免命中缓存
+    for timing_group in chart.timing_group_list:
+        timeline = BpmTimeline.from_arrays(timing_group.bpm_timeline.start_times, timing_group.bpm_timeline.bpms)
+        timeline.frame_positions(chart.context.last_frame)
+        for name, notes in timing_group.notes.to_arrays().items():
+            timeline.position_at(notes["touch_time"])
+            if name in ("holds", "arcs"):
+                timeline.position_at(notes["end_time"])
+
+
+def _create_note_objects(chart: ArcChart):
+    # 以新的 Timing Group 实例生成旧接口中的全部 Note 实例。Note 实例在首次访问 *_list 属性时才会生成
+    for timing_group in chart.timing_group_list:
+        fresh_group = TimingGroup.from_arrays(
+            timing_group.tg_num, timing_group.attributes, timing_group.bpm_timeline, timing_group.notes.to_arrays(),
+            chart.context)
+        note_count = sum(len(note_list) for note_list in (
+            fresh_group.tap_list, fresh_group.hold_list, fresh_group.arc_list, fresh_group.arctap_list))
+        assert note_count == len(fresh_group.notes)
+
+
+def run_case(spec: ChartSpec, repeats: int = 3, note_objects: bool = True) -> dict:
+    """该函数用来在一个合成谱面上测量解析器各部分的耗时。
+
+    测量的项目包括：
+        parse: 由谱面文件行创建 ArcChart。
+        positions: 计算逐帧位置表和每个 Note 的起始位置。
+        note_objects: 生成旧接口中的全部 Note 实例（包括每个 Note 的前端位置和每个 Arc 的相对位置）。
+        arc_sampling: 以 1 毫秒为间隔对所有 Arc 采样。
+        arc_keyframes: 对所有 Arc 进行误差有界的自适应采样。
+
+    Args:
+        spec (ChartSpec): 合成谱面的规格。
+        repeats (int, optional): 每个项目的执行次数。
+        note_objects (bool, optional): 是否测量 note_objects。该项目在大规模谱面上非常慢。
+
+    Returns:
+        dict: 以项目名称为键的耗时，参见 measure。
+    """
+    lines = generate_chart(spec)
+    context = ConversionContext(spec.duration, audio_offset=0)
+    chart = ArcChart(lines, context)
+    metrics = {
+        "parse": measure(lambda: ArcChart(lines, context), repeats),
+        "positions": measure(lambda: _compute_positions(chart), repeats),
+    }
+    if note_objects:
+        metrics["note_objects"] = measure(lambda: _create_note_objects(chart), repeats)
+    metrics["arc_sampling"] = measure(
+        lambda: [timing_group.arc_positions(1) for timing_group in chart.timing_group_list], repeats)
+    metrics["arc_keyframes"] = measure(
+        lambda: [timing_group.arc_keyframes() for timing_group in chart.timing_group_list], repeats)
+    return metrics
+
+
+def run_parallel_case(
+    spec: ChartSpec = PARALLEL_SPEC, workers: tuple[int, ...] = PARALLEL_WORKERS, repeats: int = 3
+) -> dict:
+    """该函数用来比较单进程解析与多进程并行解析同一个合成谱面的耗时。
+
+    测量的项目包括 serial（单进程解析），以及 workers-N（以 N 个进程并行解析，包括创建进程池的开销）。
+
+    Args:
+        spec (ChartSpec, optional): 合成谱面的规格。
+        workers (tuple[int, ...], optional): 并行解析使用的进程数。
+        repeats (int, optional): 每个项目的执行次数。
+
+    Returns:
+        dict: 包含谱面规格、以项目名称为键的耗时（参见 measure），以及每个进程数相对单进程解析的加速比。
+    """
+    lines = generate_chart(spec)
+    context = ConversionContext(spec.duration, audio_offset=0)
+    metrics = {"serial": measure(lambda: ArcChart(lines, context), repeats)}
+    for count in workers:
+        metrics[f"workers-{count}"] = measure(lambda count=count: ArcChart(lines, context, workers=count), repeats)
+    return {
+        "spec": spec.to_dict(),
+        "notes": spec.notes,
+        "metrics": metrics,
+        "speedup": {
+            f"workers-{count}": metrics["serial"]["min"] / max(metrics[f"workers-{count}"]["min"], 1e-12)
+            for count in workers},
+    }
+
+
+def import_startup(module: str) -> tuple[float, list[str]]:
+    """该函数用来在一个新的解释器中导入模块，测量其导入耗时，并找出导入时被加载的重量级依赖。
+
+    Args:
+        module (str): 模块名称。
+
+    Raises:
+        subprocess.CalledProcessError: 当导入失败时，抛出该异常。
+
+    Returns:
+        tuple[float, list[str]]: 导入耗时（秒），以及 DEFERRED_MODULES 中被加载的模块。
+    """
+    probe = _STARTUP_PROBE.format(module=module, deferred=DEFERRED_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.splitlines()
+    return float(output[0]), [name for name in output[1].split(",") if name]
+
+
+def measure_startup(module: str, repeats: int) -> dict[str, float]:
+    """该函数用来多次测量一个模块在新的解释器中的导入耗时。
+
+    Args:
+        module (str): 模块名称。
+        repeats (int): 测量次数。
+
+    Returns:
+        dict[str, float]: 以 min 和 median 为键的耗时（秒）。
+    """
+    times = [import_startup(module)[0] for _ in range(repeats)]
+    return {"min": min(times), "median": statistics.median(times)}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment() -> dict:
+    """该函数用来记录运行基准测试的环境，以便判断两次结果是否可以比较。
+
+    Returns:
+        dict: 运行环境。
+    """
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": _git_commit(),
+    }
+
+
+def scaling_exponents(results: list[dict], metric: str = "parse") -> dict[str, float]:
+    """该函数用来由规模曲线估计每个参数下耗时的增长阶数。
+
+    以参数值和耗时的对数做最小二乘拟合，斜率约为 1 时表示线性增长，约为 0 时表示与该参数无关。
+
+    Args:
+        results (list[dict]): run 返回的结果中的 results。
+        metric (str, optional): 需要拟合的项目。
+
+    Returns:
+        dict[str, float]: 每个参数的增长阶数。
+    """
+    exponents = {}
+    for axis in dict.fromkeys(result["axis"] for result in results):
+        points = [
+            (math.log(result["value"]), math.log(result["metrics"][metric]["min"]))
+            for result in results if result["axis"] == axis and result["metrics"][metric]["min"] > 0]
+        if len(points) >= 2:
+            exponents[axis] = float(np.polyfit(*zip(*points), 1)[0])
+    return exponents
+
+
+def run(
+    axes: dict[str, tuple] = None, repeats: int = 3, note_objects: bool = True, report: Callable[[str], None] = None,
+    startup: bool = True, parallel: bool = True
+) -> dict:
+    """该函数用来运行全部测试用例。
+
+    Args:
+        axes (dict[str, tuple], optional): 每个参数的取值。未给出时使用 AXES。
+        repeats (int, optional): 每个项目的执行次数。
+        note_objects (bool, optional): 是否测量 note_objects。
+        report (Callable[[str], None], optional): 每个测试用例完成后，用来报告其结果的函数。
+        startup (bool, optional): 是否测量 STARTUP_MODULES 中每个模块在新的解释器中的导入耗时。
+        parallel (bool, optional): 是否比较单进程与多进程并行解析 PARALLEL_SPEC 的耗时，参见 run_parallel_case。
+
+    Returns:
+        dict: 包含格式版本、运行环境、每个测试用例的结果、各参数增长阶数、各模块导入耗时和并行解析耗时的结果。
+    """
+    results = []
+    for name, axis, value, spec in build_grid(axes):
+        metrics = run_case(spec, repeats, note_objects)
+        results.append({
+            "case": name, "axis": axis, "value": value, "spec": spec.to_dict(), "notes": spec.notes,
+            "metrics": metrics})
+        if report is not None:
+            report(f"{name}: " + "，".join(f"{metric} {times['min'] * 1000:.1f}ms" for metric, times in metrics.items()))
+    startup_times = {}
+    for module in STARTUP_MODULES if startup else ():
+        startup_times[module] = measure_startup(module, repeats)
+        if report is not None:
+            report(f"startup {module}: {startup_times[module]['min'] * 1000:.1f}ms")
+    parallel_result = run_parallel_case(repeats=repeats) if parallel else {}
+    if parallel and report is not None:
+        report("parallel: " + "，".join(
+            f"{metric} {times['min'] * 1000:.1f}ms" + (
+                f"（x{parallel_result['speedup'][metric]:.2f}）" if metric in parallel_result["speedup"] else "")
+            for metric, times in parallel_result["metrics"].items()))
+    return {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "repeats": repeats,
+        "results": results,
+        "scaling": {metric: scaling_exponents(results, metric) for metric in results[0]["metrics"]} if results else {},
+        "startup": startup_times,
+        "parallel": parallel_result,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 1.1) -> list[tuple[str, str, float, float, float, bool]]:
+    """该函数用来逐项比较两次基准测试的结果。
+
+    Args:
+        baseline (dict): 作为基准的结果。
+        current (dict): 需要比较的结果。
+        threshold (float, optional): 耗时之比超过该值时视为性能退化。
+
+    Raises:
+        ValueError: 当两次结果的格式版本不同时，抛出该异常。
+
+    Returns:
+        list[tuple[str, str, float, float, float, bool]]: 两次结果中都存在的每个测试用例和项目的名称、
+            基准耗时、当前耗时、耗时之比（均取最小值）以及是否视为性能退化，按耗时之比从大到小排列。
+    """
+    if baseline.get("schema") != current.get("schema"):
+        raise ValueError(f"无法比较格式版本为 {baseline.get('schema')} 和 {current.get('schema')} 的基准测试结果。")
+    baseline_cases = {result["case"]: result["metrics"] for result in baseline["results"]}
+    # 各模块的导入耗时和并行解析耗时分别作为名为 startup 和 parallel 的测试用例参与比较
+    baseline_cases["startup"] = baseline.get("startup", {})
+    baseline_cases["parallel"] = baseline.get("parallel", {}).get("metrics", {})
+    rows = []
+    for result in current["results"] + [
+        {"case": "startup", "metrics": current.get("startup", {})},
+        {"case": "parallel", "metrics": current.get("parallel", {}).get("metrics", {})}
+    ]:
+        for metric, times in result["metrics"].items():
+            base_times = baseline_cases.get(result["case"], {}).get(metric)
+            if base_times is None:
+                continue
+            rows.append((
+                result["case"], metric, base_times["min"], times["min"], times["min"] / max(base_times["min"], 1e-12)))
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return [row + (row[4] > threshold,) for row in rows]
+
+
+def save(results: dict, file: str):
+    """该函数用来将基准测试结果写入 JSON 文件。
+
+    Args:
+        results (dict): run 返回的结果。
+        file (str): 写入的文件路径。
+    """
+    with open(file, "w", encoding="utf-8") as result_file:
+        json.dump(results, result_file, ensure_ascii=False, indent=2)
+
+
+def load(file: str) -> dict:
+    """该函数用来读取由 save 写入的基准测试结果。
+
+    Args:
+        file (str): 读取的文件路径。
+
+    Returns:
+        dict: 基准测试结果。
+    """
+    with open(file, "r", encoding="utf-8") as result_file:
+        return json.load(result_file)
@@ -0,0 +1,145 @@
+"""这个模块用来生成用于基准测试的合成 Arcaea 谱面。
+
+相同的参数和随机种子总是生成完全相同的谱面，因此不同版本之间的基准测试结果可以直接比较。
+"""
+import random
+
+from arcaea.assets import MOVEMENT_TYPES
+
+
+class ChartSpec:
+    """合成谱面的规格。
+    """
+
+    def __init__(
+        self, taps: int = 1000, holds: int = 200, arcs: int = 200, arctaps: int = 100, timing_groups: int = 1,
+        timing_changes: int = 1, duration: int = 120000, seed: int = 0
+    ) -> None:
+        """该函数用来创建一个合成谱面规格。
+
+        所有数量均为整个谱面中的总数，Note 和 BPM 变化将依次平均分配到各个 Timing Group 中。
+
+        Args:
+            taps (int, optional): Tap 的数量。
+            holds (int, optional): Hold 的数量。
+            arcs (int, optional): Arc 的数量。
+            arctaps (int, optional): Arctap 的数量。它们将被随机放置在黑线上。
+            timing_groups (int, optional): Timing Group 的数量（包括 Timing Group 0）。
+            timing_changes (int, optional): 每个 Timing Group 中 BPM 设定行的数量。
+            duration (int, optional): 歌曲时长（毫秒）。
+            seed (int, optional): 随机种子。
+        """
+        if timing_groups < 1 or timing_changes < 1:
+            raise ValueError("每个谱面至少包含一个 Timing Group，每个 Timing Group 至少包含一个 BPM 设定行。")
+        if arctaps and arcs < timing_groups:
+            raise ValueError("Arctap 必须位于同一个 Timing Group 中的 Arc 上，因此存在 Arctap 时，Arc 的数量不能少于 Timing Group 的数量。")
+        self.taps = taps
+        self.holds = holds
+        self.arcs = arcs
+        self.arctaps = arctaps
+        self.timing_groups = timing_groups
+        self.timing_changes = timing_changes
+        self.duration = duration
+        self.seed = seed
+
+    @property
+    def notes(self) -> int:
+        """int: 谱面中 Note 的总数。
+        """
+        return self.taps + self.holds + self.arcs + self.arctaps
+
+    def replace(self, **changes) -> "ChartSpec":
+        """该函数用来创建一个修改了部分参数的新规格。
+
+        Args:
+            **changes: 需要修改的参数，参见 ChartSpec.__init__。
+
+        Returns:
+            ChartSpec: 新的规格。
+        """
+        settings = dict(self.__dict__)
+        settings.update(changes)
+        return ChartSpec(**settings)
+
+    def to_dict(self) -> dict:
+        """该函数用来将规格转换为可以写入 JSON 的字典。
+
+        Returns:
+            dict: 规格的全部参数。
+        """
+        return dict(self.__dict__)
+
+
+def _split(count: int, parts: int) -> list[int]:
+    # 将 count 尽量平均地分为 parts 份
+    return [count // parts + (1 if part < count % parts else 0) for part in range(parts)]
+
+
+def _group_lines(spec: ChartSpec, rng: random.Random, taps: int, holds: int, arcs: int, arctaps: int) -> list[str]:
+    """该函数用来生成一个 Timing Group 中的全部谱面行（不含 Timing Group 的开始和结束行）。
+
+    Returns:
+        list[str]: 按时间排序的谱面行，第一行总是时间为 0 的 BPM 设定行。
+    """
+    duration = spec.duration
+    timed_lines: list[tuple[int, str]] = []
+    change_times = sorted(rng.randrange(1, duration) for _ in range(spec.timing_changes - 1))
+    for change_time in change_times:
+        timed_lines.append((change_time, f"timing({change_time},{rng.uniform(60, 240):.2f},4.00);"))
+    for _ in range(taps):
+        touch_time = rng.randrange(0, duration)
+        timed_lines.append((touch_time, f"({touch_time},{rng.randint(1, 4)});"))
+    for _ in range(holds):
+        start_time = rng.randrange(0, duration)
+        end_time = min(start_time + rng.randrange(100, 2000), duration)
+        timed_lines.append((start_time, f"hold({start_time},{end_time},{rng.randint(1, 4)});"))
+
+    # 前一半 Arc 为黑线，Arctap 只放置在黑线上
+    trace_arcs = arcs - arcs // 2 if arctaps else 0
+    arctap_counts = _split(arctaps, trace_arcs) if trace_arcs else []
+    for arc_num in range(arcs):
+        start_time = rng.randrange(0, duration)
+        end_time = min(start_time + rng.randrange(0, 3000), duration)
+        is_trace = arc_num < trace_arcs
+        arctap_times = sorted(
+            rng.randint(start_time, end_time) for _ in range(arctap_counts[arc_num] if is_trace else 0))
+        arctap_text = f"[{','.join(f'arctap({arctap_time})' for arctap_time in arctap_times)}]" if arctap_times else ""
+        timed_lines.append((start_time, (
+            f"arc({start_time},{end_time},{rng.uniform(-0.5, 1.5):.2f},{rng.uniform(-0.5, 1.5):.2f},"
+            f"{rng.choice(MOVEMENT_TYPES)},{rng.uniform(0, 1):.2f},{rng.uniform(0, 1):.2f},{rng.randint(0, 2)},"
+            f"none,{'true' if is_trace else 'false'}){arctap_text};")))
+
+    timed_lines.sort(key=lambda timed_line: timed_line[0])
+    return [f"timing(0,{rng.uniform(60, 240):.2f},4.00);"] + [line for _, line in timed_lines]
+
+
+def generate_chart(spec: ChartSpec) -> list[str]:
+    """该函数用来按照规格生成一个合成谱面。
+
+    Args:
+        spec (ChartSpec): 合成谱面的规格。
+
+    Returns:
+        list[str]: 谱面文件的所有行，可以直接传给 ArcChart 或写入 .aff 文件。
+    """
+    rng = random.Random(spec.seed)
+    lines = ["AudioOffset:0", "-"]
+    splits = zip(*(_split(count, spec.timing_groups) for count in (spec.taps, spec.holds, spec.arcs, spec.arctaps)))
+    for tg_num, (taps, holds, arcs, arctaps) in enumerate(splits):
+        group_lines = _group_lines(spec, rng, taps, holds, arcs, arctaps)
+        if tg_num == 0:
+            lines += group_lines
+        else:
+            lines += ["timinggroup(){"] + [f"  {line}" for line in group_lines] + ["};"]
+    return lines
+
+
+def write_chart(spec: ChartSpec, file: str):
+    """该函数用来按照规格生成一个合成谱面，并写入 .aff 文件。
+
+    Args:
+        spec (ChartSpec): 合成谱面的规格。
+        file (str): 写入的文件路径。
+    """
+    with open(file, "w", encoding="utf-8") as chart_file:
+        chart_file.write("\n".join(generate_chart(spec)) + "\n")
@@ -1,2 +1,8 @@
+"""Arc2Phi 的入口，与 python -m arc2phi 相同。
+"""
+import sys
 
+from arc2phi.cli import main
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""这个模块用来将 Arcaea 谱面的解析结果编译为 Phigros 谱面（formatVersion 3）。
+
+每一个 Timing Group 编译为一条判定线。判定线的速度事件直接由 BPM 组生成：Arcaea 中位置随时间的变化率与 BPM 成正比，
+因此每一个 BPM 组恰好对应一个速度恒定的速度事件，相邻且速度相同的事件被合并为一个。判定线的位置、角度和透明度
+在整首歌曲中保持不变，各只需要一个事件。因此编译结果的大小和耗时只与 BPM 变化和 Note 的数量有关，而与歌曲时长和帧率无关。
+
+谱面 JSON 按判定线和 Note 分块写入文件，编译过程中同一时间只有一个 Timing Group 的数据在内存中。
+"""
+import hashlib
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from typing import IO, NamedTuple
+
+import numpy as np
+
+from arcaea.assets import ConversionContext
+from arcaea.assets.easing import arc_positions
+from arcaea.assets.profiler import PHASE_ARC_EASING, phase
+from arcaea.assets.sampling import adaptive_arc_keyframes
+from arcaea.assets.timeline import POSITION_SCALE
+from arcaea.chartparser import ParsedChart, TimingGroup, iter_timing_groups
+from arcaea.transform.returnPerspecitveTransform import trace_to_x
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 3
+
+# Phigros 的 Note 类型
+NOTE_TAP = 1
+NOTE_DRAG = 2
+NOTE_HOLD = 3
+NOTE_FLICK = 4
+
+# Phigros 谱面中的时间以 1/32 拍为单位，即 1 个单位为 60000 / 32 / BPM = 1875 / BPM 毫秒。
+TIME_UNIT_SCALE = 1875.0
+# 持续到歌曲结束的事件所使用的结束时间。
+END_TIME = 999999999.0
+# Arcaea 横向坐标 0.5（第 2、3 条轨道的分界）对应判定线中心，横向坐标每变化 1 对应 Phigros 横向坐标变化该值。
+POSITION_X_SCALE = 4.0
+# 判定线在画面中的位置（横向、纵向比例，纵向以画面底端为 0）。
+JUDGE_LINE_POSITION = (0.5, 0.2)
+# 没有非零 BPM 的 Timing Group 所使用的判定线 BPM。
+DEFAULT_BPM = 120.0
+# 每次写入文件的 Note 数量。
+WRITE_CHUNK_SIZE = 4096
+
+_NOTE_FORMAT = '{"type":%d,"time":%r,"positionX":%r,"holdTime":%r,"speed":%r,"floorPosition":%r}'
+_SPEED_EVENT_FORMAT = '{"startTime":%r,"endTime":%r,"floorPosition":%r,"value":%r}'
+_MOVE_EVENT_FORMAT = '{"startTime":%r,"endTime":%r,"start":%r,"end":%r,"start2":%r,"end2":%r}'
+_VALUE_EVENT_FORMAT = '{"startTime":%r,"endTime":%r,"start":%r,"end":%r}'
+
+
+class CompileStats(NamedTuple):
+    """一次编译的统计结果。
+    """
+    judge_lines: int
+    notes: int
+    speed_events: int
+
+
+def merge_constant_events(start_times: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """该函数用来合并首尾相接的恒定事件中相邻且取值相同的事件。
+
+    每一个事件都从其开始时间持续到下一个事件的开始时间，在此期间取值恒定。合并后，每一个事件同样持续到下一个保留的事件。
+
+    Args:
+        start_times (np.ndarray): 按时间排序的每一个事件的开始时间。
+        values (np.ndarray): 每一个事件的取值。二维数组的每一行为一个事件的多个取值，所有取值都相同才会合并。
+
+    Returns:
+        np.ndarray: 合并后保留的事件的编号。
+    """
+    values = np.asarray(values).reshape(len(start_times), -1)
+    keep = np.ones(len(start_times), dtype=bool)
+    keep[1:] = np.any(values[1:] != values[:-1], axis=1)
+    return np.flatnonzero(keep)
+
+
+class JudgeLineCompiler:
+    """该类用来将一个 Timing Group 编译为一条 Phigros 判定线。
+
+    判定线的 BPM 取时间 0 所处的 BPM 组的 BPM，所有时间都以该 BPM 下的 1/32 拍为单位。速度事件的值为各 BPM 组的
+    BPM 与判定线 BPM 之比，因此 Note 的 floorPosition 与其在 Arcaea 中的累计位置成正比。
+    """
+
+    def __init__(self, timing_group: TimingGroup, context: ConversionContext, speed: float = 1.0) -> None:
+        """该函数用来创建一个判定线编译器。
+
+        Args:
+            timing_group (TimingGroup): 需要编译的 Timing Group。
+            context (ConversionContext): 该谱面的转换设定，其中的 arc_tolerance 用来确定 Arc 转换为 Drag 的密度。
+            speed (float, optional): 流速倍率。
+        """
+        self.timing_group = timing_group
+        self.context = context
+        self.speed = speed
+        timeline = timing_group.bpm_timeline
+        self.timeline = timeline
+        self.start_time = min(0.0, float(timeline.start_times[0]))
+        bpm = float(timeline.bpms[timeline.segment_index(0.0)])
+        if bpm == 0:
+            nonzero_bpms = timeline.bpms[timeline.bpms != 0]
+            bpm = abs(float(nonzero_bpms[0])) if len(nonzero_bpms) else DEFAULT_BPM
+        self.bpm = abs(bpm)
+        # 累计位置差换算为 floorPosition 的系数：∑(BPM / 判定线 BPM × 秒) = 位置差 / (判定线 BPM × POSITION_SCALE × 1000)
+        self._floor_scale = speed / (self.bpm * POSITION_SCALE * 1000)
+        self._speed_scale = speed / self.bpm
+        self._start_position = timeline.position_at(self.start_time)
+
+    def time_units(self, play_time):
+        """该函数用来将毫秒换算为该判定线的时间单位。
+
+        Args:
+            play_time (float | np.ndarray): 以毫秒为单位的时间。
+
+        Returns:
+            float | np.ndarray: 以 1/32 拍为单位的时间。
+        """
+        return np.asarray(play_time, dtype=np.float64) * (self.bpm / TIME_UNIT_SCALE)
+
+    def floor_position(self, play_time) -> np.ndarray:
+        """该函数用来计算某一时间判定线的 floorPosition，即速度事件的值对时间（秒）的积分。
+
+        Args:
+            play_time (float | np.ndarray): 以毫秒为单位的时间。
+
+        Returns:
+            np.ndarray: 该时间的 floorPosition。
+        """
+        return (np.asarray(self.timeline.position_at(play_time)) - self._start_position) * self._floor_scale
+
+    def speed_events(self) -> dict[str, np.ndarray]:
+        """该函数用来由 BPM 组生成判定线的速度事件，并合并相邻且速度相同的事件。
+
+        Returns:
+            dict[str, np.ndarray]: 以 startTime，endTime，floorPosition 和 value 为键的等长数组。
+        """
+        keep = merge_constant_events(self.timeline.start_times, self.timeline.bpms)
+        start_times = self.timeline.start_times[keep].copy()
+        start_times[0] = self.start_time
+        start_units = self.time_units(start_times)
+        return {
+            "startTime": start_units,
+            "endTime": np.append(start_units[1:], END_TIME),
+            "floorPosition": self.floor_position(start_times),
+            "value": self.timeline.bpms[keep] * self._speed_scale,
+        }
+
+    def notes(self) -> dict[str, np.ndarray]:
+        """该函数用来将该 Timing Group 中的 Note 转换为 Phigros 的 Note，按时间排序。
+
+        Tap 和 Arctap 转换为 Tap，Hold 转换为 Hold，非黑线 Arc 在其自适应关键帧处转换为 Drag。
+        首尾相接的 Arc 在连接处只保留一个 Drag。noinput 的 Timing Group 中的 Note 无法判定，不进行转换。
+
+        Returns:
+            dict[str, np.ndarray]: 以 type，time，positionX，holdTime，speed 和 floorPosition 为键的等长数组。
+        """
+        if "noinput" in self.timing_group.attributes:
+            logger.debug("Timing Group %d 为 noinput，跳过其中的 %d 个 Note", self.timing_group.tg_num,
+                         len(self.timing_group.notes))
+            empty = np.empty(0)
+            return {"type": np.empty(0, dtype=np.int8), "time": empty, "positionX": empty, "holdTime": empty,
+                    "speed": empty, "floorPosition": empty}
+        table = self.timing_group.notes
+        taps, holds, arcs, arctaps = table.taps, table.holds, table.arcs, table.arctaps
+
+        solid_arcs = np.flatnonzero(~arcs["is_trace"])
+        with phase(PHASE_ARC_EASING, self.timing_group.tg_num) as record:
+            keyframes = adaptive_arc_keyframes(
+                arcs[solid_arcs], self.context.arc_tolerance, self.context.sampling_resolution)
+            record.add_notes(len(solid_arcs))
+        drag_times, drag_x = keyframes["time"], keyframes["x"]
+        # 首尾相接的 Arc 在连接处产生的关键帧重合
+        if len(drag_times):
+            _, unique_index = np.unique(np.round(np.stack((drag_times, drag_x), axis=1), 6), axis=0, return_index=True)
+            drag_times, drag_x = drag_times[unique_index], drag_x[unique_index]
+        arctap_x, _ = arc_positions(arcs, arctaps["touch_time"], arctaps["arc"])
+
+        note_types = np.concatenate((
+            np.full(len(taps) + len(arctaps), NOTE_TAP, dtype=np.int8), np.full(len(holds), NOTE_HOLD, dtype=np.int8),
+            np.full(len(drag_times), NOTE_DRAG, dtype=np.int8)))
+        touch_times = np.concatenate((taps["touch_time"], arctaps["touch_time"], holds["touch_time"], drag_times))
+        x_positions = np.concatenate((trace_to_x(taps["trace"]), arctap_x, trace_to_x(holds["trace"]), drag_x))
+        hold_times = np.zeros(len(touch_times))
+        hold_times[note_types == NOTE_HOLD] = self.time_units(holds["end_time"] - holds["touch_time"])
+        # Hold 的长度由其开始时判定线的速度决定，其余 Note 的速度恒为 1
+        speeds = np.ones(len(touch_times))
+        speeds[note_types == NOTE_HOLD] = \
+            self.timeline.bpms[self.timeline.segment_index(holds["touch_time"])] * self._speed_scale
+
+        order = np.argsort(touch_times, kind="stable")
+        return {
+            "type": note_types[order],
+            "time": self.time_units(touch_times[order]),
+            "positionX": (x_positions[order] - 0.5) * POSITION_X_SCALE,
+            "holdTime": hold_times[order],
+            "speed": speeds[order],
+            "floorPosition": self.floor_position(touch_times[order]),
+        }
+
+    def iter_json(self, notes: dict[str, np.ndarray] = None, speed_events: dict[str, np.ndarray] = None,
+                  visible: bool = True) -> Iterator[str]:
+        """该函数用来分块产出该判定线的 JSON 文本。
+
+        Args:
+            notes (dict[str, np.ndarray], optional): notes 的结果。未给出时重新计算。
+            speed_events (dict[str, np.ndarray], optional): speed_events 的结果。未给出时重新计算。
+            visible (bool, optional): 判定线本身是否可见。
+
+        Yields:
+            str: JSON 文本块，依次连接即为该判定线的 JSON 对象。
+        """
+        notes = self.notes() if notes is None else notes
+        speed_events = self.speed_events() if speed_events is None else speed_events
+        start_unit = float(self.time_units(self.start_time))
+        x_position, y_position = JUDGE_LINE_POSITION
+        yield (f'{{"numOfNotes":{len(notes["type"])},"numOfNotesAbove":{len(notes["type"])},"numOfNotesBelow":0,'
+               f'"bpm":{self.bpm!r},"speedEvents":[')
+        yield ",".join(_SPEED_EVENT_FORMAT % row for row in zip(*(
+            speed_events[key].tolist() for key in ("startTime", "endTime", "floorPosition", "value"))))
+        yield '],"notesAbove":['
+        columns = [notes[key] for key in ("type", "time", "positionX", "holdTime", "speed", "floorPosition")]
+        for chunk_start in range(0, len(columns[0]), WRITE_CHUNK_SIZE):
+            chunk = zip(*(column[chunk_start:chunk_start + WRITE_CHUNK_SIZE].tolist() for column in columns))
+            yield ("," if chunk_start else "") + ",".join(_NOTE_FORMAT % row for row in chunk)
+        yield '],"notesBelow":[],"judgeLineDisappearEvents":['
+        yield _VALUE_EVENT_FORMAT % (start_unit, END_TIME, float(visible), float(visible))
+        yield '],"judgeLineMoveEvents":['
+        yield _MOVE_EVENT_FORMAT % (start_unit, END_TIME, x_position, x_position, y_position, y_position)
+        yield '],"judgeLineRotateEvents":['
+        yield _VALUE_EVENT_FORMAT % (start_unit, END_TIME, 0.0, 0.0)
+        yield "]}"
+
+
+class JudgeLineCache:
+    """该类用来在多次编译之间缓存每条判定线的 Note 和速度事件。
+
+    缓存以 Timing Group 的内容（属性、BPM 列表和除行号以外的所有 Note 列）、arc_tolerance 和流速倍率为键，
+    因此同一个 Timing Group 在谱面被编辑、其行号或编号改变后仍然命中，Arc 的缓动计算和自适应采样只需进行一次。
+    超出条目数上限时，淘汰最久未使用的条目。该类可以在多个线程之间共享。
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """该函数用来创建一个判定线缓存。
+
+        Args:
+            max_entries (int, optional): 缓存条目数的上限。
+        """
+        if max_entries < 1:
+            raise ValueError(f"缓存条目数的上限必须为正整数，而不是 {max_entries}。")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[dict, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(compiler: "JudgeLineCompiler") -> tuple:
+        """该函数用来计算一条判定线的缓存键。
+
+        Args:
+            compiler (JudgeLineCompiler): 该判定线的编译器。
+
+        Returns:
+            tuple: 该判定线的缓存键。
+        """
+        timing_group = compiler.timing_group
+        digest = hashlib.blake2b(
+            repr((timing_group.attributes, compiler.timeline.bpm_list)).encode("utf-8"), digest_size=16)
+        for name, rows in timing_group.notes.to_arrays().items():
+            digest.update(f"|{name}:{len(rows)}".encode("utf-8"))
+            for field in rows.dtype.names:
+                if field != "line":
+                    digest.update(np.ascontiguousarray(rows[field]).tobytes())
+        return digest.hexdigest(), compiler.context.arc_tolerance, compiler.speed
+
+    def compile(self, compiler: "JudgeLineCompiler") -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        """该函数用来取得一条判定线的 Note 和速度事件：命中缓存时直接返回，否则编译后写入缓存。
+
+        返回的数组在多次编译之间共享，不应被修改。
+
+        Args:
+            compiler (JudgeLineCompiler): 该判定线的编译器。
+
+        Returns:
+            tuple[dict[str, np.ndarray], dict[str, np.ndarray]]: notes 和 speed_events 的结果。
+        """
+        key = self.key(compiler)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        # 编译在锁外进行，多个线程同时编译同一条判定线时，结果相同，只保留其中一个
+        compiled = compiler.notes(), compiler.speed_events()
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
+
+
+def write_chart(
+    timing_groups: Iterable[TimingGroup], fp: IO[str], context: ConversionContext, offset: float = 0,
+    speed: float = 1.0, cache: JudgeLineCache = None
+) -> CompileStats:
+    """该函数用来将多个 Timing Group 编译为 Phigros 谱面，并逐块写入文件。
+
+    每一个 Timing Group 在写入后即可被释放，因此可以直接传入 iter_timing_groups 的结果，以流式编译任意大小的谱面。
+    所有 Timing Group 的判定线都位于同一位置，只有 Timing Group 0 的判定线可见。
+
+    Args:
+        timing_groups (Iterable[TimingGroup]): 按编号顺序排列的 Timing Group。
+        fp (IO[str]): 以文本模式打开的输出文件。
+        context (ConversionContext): 该谱面的转换设定。
+        offset (float, optional): 谱面音乐延迟（毫秒）。
+        speed (float, optional): 流速倍率。
+        cache (JudgeLineCache, optional): 用来复用之前编译结果的判定线缓存。
+
+    Returns:
+        CompileStats: 写入的判定线、Note 和速度事件的数量。
+    """
+    judge_lines = notes_count = speed_events_count = 0
+    fp.write(f'{{"formatVersion":{FORMAT_VERSION},"offset":{offset / 1000!r},"judgeLineList":[')
+    for timing_group in timing_groups:
+        compiler = JudgeLineCompiler(timing_group, context, speed)
+        if cache is not None:
+            notes, speed_events = cache.compile(compiler)
+        else:
+            notes, speed_events = compiler.notes(), compiler.speed_events()
+        if judge_lines:
+            fp.write(",")
+        fp.writelines(compiler.iter_json(notes, speed_events, visible=not judge_lines))
+        judge_lines += 1
+        notes_count += len(notes["type"])
+        speed_events_count += len(speed_events["value"])
+        logger.debug("Timing Group %d 编译为 %d 个 Note 和 %d 个速度事件", timing_group.tg_num, len(notes["type"]),
+                     len(speed_events["value"]))
+    fp.write(f'],"numOfNotes":{notes_count}}}')
+    return CompileStats(judge_lines, notes_count, speed_events_count)
+
+
+def compile_chart(
+    parsed_chart: ParsedChart, fp: IO[str], speed: float = 1.0, cache: JudgeLineCache = None
+) -> CompileStats:
+    """该函数用来将一个谱面解析结果编译为 Phigros 谱面，并写入文件。
+
+    Args:
+        parsed_chart (ParsedChart): 谱面解析结果。
+        fp (IO[str]): 以文本模式打开的输出文件。
+        speed (float, optional): 流速倍率。
+        cache (JudgeLineCache, optional): 用来复用之前编译结果的判定线缓存。
+
+    Returns:
+        CompileStats: 写入的判定线、Note 和速度事件的数量。
+    """
+    context = parsed_chart.context
+    offset = context.audio_offset if context is not None and context.audio_offset is not None else parsed_chart.offset
+    return write_chart(parsed_chart.timing_group_list, fp, context, offset, speed, cache)
+
+
+def compile_stream(
+    chart_fp: Iterable[str], fp: IO[str], context: ConversionContext, speed: float = 1.0
+) -> CompileStats:
+    """该函数用来从文件中逐行读取 Arcaea 谱面，并在每一个 Timing Group 闭合时立即将其编译并写入 Phigros 谱面。
+
+    Args:
+        chart_fp (Iterable[str]): 以文本模式打开的 Arcaea 谱面文件。
+        fp (IO[str]): 以文本模式打开的输出文件。
+        context (ConversionContext): 该谱面的转换设定。
+        speed (float, optional): 流速倍率。
+
+    Raises:
+        ArcChartException: 当解析谱面文件时发生任意错误，即抛出该错误。此时输出文件中的 JSON 不完整。
+
+    Returns:
+        CompileStats: 写入的判定线、Note 和速度事件的数量。
+    """
+    headers = {}
+    timing_groups = iter_timing_groups(chart_fp, headers, context)
+    # 谱面头部在第一个 Timing Group 之前读取完毕，先取出第一个 Timing Group 以得到 AudioOffset
+    first_group = next(timing_groups, None)
+    offset = context.audio_offset if context.audio_offset is not None else float(headers.get("AudioOffset", 0))
+    first_groups = [first_group] if first_group is not None else []
+    return write_chart(itertools.chain(first_groups, timing_groups), fp, context, offset, speed)
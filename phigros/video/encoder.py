@@ -0,0 +1,512 @@
+"""这个模块用来将谱面解析结果绘制为预览视频。
+
+编码过程分为三个阶段，由有界队列连接：
+    1. 规划线程按批计算每一帧中可见 Note 的画面坐标，一批中所有帧的坐标只需一次向量化的透视变换。
+    2. 多个绘制线程从预先分配的帧缓冲环中取得空闲的缓冲区，在其中绘制一帧。OpenCV 的绘制函数会释放 GIL，
+       因此多个绘制线程可以同时工作。
+    3. 调用线程按帧编号顺序将绘制完成的帧写入 cv2.VideoWriter，并将缓冲区归还到帧缓冲环中。
+
+绘制线程总是先取得缓冲区再取得帧，因此按顺序等待写入的帧一定已经持有缓冲区，帧缓冲环不会因乱序完成而耗尽。
+预览视频不包含音频。
+"""
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from arcaea.assets.easing import arc_positions
+from arcaea.assets.visibility import DEFAULT_VISIBLE_TIME, visible_depth
+from arcaea.chartparser import ParsedChart, TimingGroup
+from arcaea.transform.returnPerspecitveTransform import X_RANGE, return_perspective_transform, trace_to_x
+
+logger = logging.getLogger(__name__)
+
+# 透视变换中测得的梯形顶点所在画面的大小，绘制时按输出视频的大小缩放。
+REFERENCE_SIZE = (1366, 768)
+# 坐标以 1/16 像素的精度传给 OpenCV。
+SUBPIXEL_BITS = 4
+
+# 颜色（BGR）
+BACKGROUND_COLOR = (24, 18, 18)
+TRACK_COLOR = (60, 48, 48)
+LANE_COLOR = (110, 100, 100)
+JUDGE_LINE_COLOR = (230, 230, 230)
+TAP_COLOR = (250, 240, 220)
+HOLD_COLOR = (220, 200, 150)
+ARCTAP_COLOR = (160, 230, 250)
+TRACE_COLOR = (150, 150, 150)
+ARC_COLORS = ((235, 190, 90), (150, 110, 245), (120, 225, 120))
+
+# Note 的大小（Arcaea 坐标）。Tap 和 Hold 占据轨道宽度的 80%，纵深的半厚度为可见深度的 1.5%。
+NOTE_HALF_WIDTH = (X_RANGE[1] - X_RANGE[0]) / 4 * 0.4
+ARCTAP_HALF_WIDTH = 0.12
+NOTE_HALF_THICKNESS = 0.015
+
+# 绘制的图层，依次为 Hold、Tap、Arctap 的四边形和 Arc、黑线的线段
+LAYER_HOLD, LAYER_TAP, LAYER_ARCTAP = range(3)
+
+
+class FrameScene(NamedTuple):
+    """一帧中需要绘制的全部图形，坐标为已按 SUBPIXEL_BITS 放大的画面坐标。
+
+    quads 的形状为 (n, 4, 2)，quad_layers 为每个四边形的图层。segments 的形状为 (m, 2, 2)，segment_colors 为每条
+    线段在 ARC_COLORS 中的编号，-1 表示黑线。
+    """
+    frame: int
+    quads: np.ndarray
+    quad_layers: np.ndarray
+    segments: np.ndarray
+    segment_colors: np.ndarray
+
+
+class _NoteSet(NamedTuple):
+    """同一种需要绘制的 Note 的开始和结束时间、位置和坐标。
+
+    Tap 和 Arctap 的开始和结束相同，Arc 以其每一条关键帧线段为一个元素。style 为四边形的图层或线段的颜色编号。
+    """
+    start_time: np.ndarray
+    end_time: np.ndarray
+    start_position: np.ndarray
+    end_position: np.ndarray
+    start_x: np.ndarray
+    end_x: np.ndarray
+    start_y: np.ndarray
+    end_y: np.ndarray
+    style: np.ndarray
+
+
+class ScenePlanner:
+    """该类用来按批计算每一帧中可见 Note 的画面坐标。
+
+    Note 的纵深为其位置与当前帧位置之差，只有纵深在 0 到 depth 之间的部分可见，depth 参见 visible_depth。
+    每一批帧只需从各 Timing Group 的可见区间索引中取出这批帧中可见的 Note，其代价与画面中的 Note 数量成正比。
+    """
+
+    def __init__(
+        self, parsed_chart: ParsedChart, size: tuple[int, int], frame_rate: float,
+        visible_time: float = DEFAULT_VISIBLE_TIME
+    ) -> None:
+        """该函数用来创建一个帧规划器，并预先计算每个 Timing Group 中 Note 的位置和 Arc 的关键帧。
+
+        Args:
+            parsed_chart (ParsedChart): 谱面解析结果。
+            size (tuple[int, int]): 输出视频的宽和高（像素）。
+            frame_rate (float): 输出视频的帧率。
+            visible_time (float, optional): 以基准 BPM 计算时，Note 从出现到抵达判定线的时间（毫秒）。
+        """
+        self.frame_rate = frame_rate
+        self.depth = visible_depth(parsed_chart.base_bpm, visible_time)
+        self.transform = return_perspective_transform(self.depth)
+        self.scale = np.array([size[0] / REFERENCE_SIZE[0], size[1] / REFERENCE_SIZE[1]]) * (1 << SUBPIXEL_BITS)
+        self._groups = [self._prepare(timing_group) for timing_group in parsed_chart.timing_group_list]
+
+    def _prepare(self, timing_group: TimingGroup) -> dict:
+        # 预先计算与帧无关的数据：各 Note 的开始和结束时间、位置、坐标，以及 Arc 中每条关键帧线段的端点
+        timeline, table = timing_group.bpm_timeline, timing_group.notes
+        taps, holds, arcs, arctaps = table.taps, table.holds, table.arcs, table.arctaps
+        keyframes = timing_group.arc_keyframes()
+        # 同一个 Arc 中相邻的两个关键帧组成一条线段，每个 Arc 的线段在数组中连续排列
+        first = np.flatnonzero(keyframes["arc"][1:] == keyframes["arc"][:-1])
+        second = first + 1
+        arctap_x, arctap_y = arc_positions(arcs, arctaps["touch_time"], arctaps["arc"])
+        return {
+            "timeline": timeline,
+            "index": timing_group.visibility_index(self.depth),
+            "arc_segments": np.searchsorted(keyframes["arc"][first], np.arange(len(arcs) + 1)),
+            "taps": _NoteSet(
+                taps["touch_time"], taps["touch_time"], timeline.position_at(taps["touch_time"]),
+                timeline.position_at(taps["touch_time"]), trace_to_x(taps["trace"]), trace_to_x(taps["trace"]),
+                np.zeros(len(taps)), np.zeros(len(taps)), np.full(len(taps), LAYER_TAP)),
+            "arctaps": _NoteSet(
+                arctaps["touch_time"], arctaps["touch_time"], timeline.position_at(arctaps["touch_time"]),
+                timeline.position_at(arctaps["touch_time"]), arctap_x, arctap_x, arctap_y, arctap_y,
+                np.full(len(arctaps), LAYER_ARCTAP)),
+            "holds": _NoteSet(
+                holds["touch_time"], holds["end_time"], timeline.position_at(holds["touch_time"]),
+                timeline.position_at(holds["end_time"]), trace_to_x(holds["trace"]), trace_to_x(holds["trace"]),
+                np.zeros(len(holds)), np.zeros(len(holds)), np.full(len(holds), LAYER_HOLD)),
+            "segments": _NoteSet(
+                keyframes["time"][first], keyframes["time"][second], timeline.position_at(keyframes["time"][first]),
+                timeline.position_at(keyframes["time"][second]), keyframes["x"][first], keyframes["x"][second],
+                keyframes["y"][first], keyframes["y"][second],
+                np.where(arcs["is_trace"], -1, arcs["arc_color"] % len(ARC_COLORS))[keyframes["arc"][first]]),
+        }
+
+    def frame_time(self, frame) -> np.ndarray:
+        """该函数用来计算某一帧对应的谱面时间。
+
+        Args:
+            frame (int | np.ndarray): 帧编号。
+
+        Returns:
+            np.ndarray: 谱面时间（毫秒）。
+        """
+        return np.asarray(frame, dtype=np.float64) * (1000.0 / self.frame_rate)
+
+    def plan(self, start_frame: int, end_frame: int) -> list[FrameScene]:
+        """该函数用来计算一批连续帧中所有可见 Note 的画面坐标。
+
+        Args:
+            start_frame (int): 第一帧的编号。
+            end_frame (int): 最后一帧的下一帧编号。
+
+        Returns:
+            list[FrameScene]: 每一帧需要绘制的图形。
+        """
+        frames = np.arange(start_frame, end_frame)
+        times = self.frame_time(frames)
+        # 所有四边形的四个顶点和所有线段的两个端点都以 (x, y, z) 收集，一批中的所有帧只需一次透视变换
+        quad_parts, segment_parts = [], []
+        for group in self._groups:
+            frame_positions = group["timeline"].position_at(times)
+            visible = group["index"].query(times[0], times[-1])
+            for name in ("holds", "taps", "arctaps"):
+                quad_parts.append(self._quads(group[name], visible[name], times, frame_positions, name))
+            # 可见 Arc 的所有关键帧线段
+            segment_starts = group["arc_segments"][visible["arcs"]]
+            segment_counts = group["arc_segments"][visible["arcs"] + 1] - segment_starts
+            segment_index = np.arange(segment_counts.sum()) + np.repeat(
+                segment_starts - np.cumsum(segment_counts) + segment_counts, segment_counts)
+            segment_parts.append(self._segments(group["segments"], segment_index, times, frame_positions))
+
+        quad_frames, quad_points, quad_layers = (np.concatenate(column) for column in zip(*quad_parts))
+        segment_frames, segment_points, segment_colors = (np.concatenate(column) for column in zip(*segment_parts))
+        quads = self.to_screen(quad_points).reshape(-1, 4, 2)
+        segments = self.to_screen(segment_points).reshape(-1, 2, 2)
+        # 按帧拆分。四边形在同一帧中按图层排序，使 Tap 绘制在 Hold 之上
+        quad_order = np.lexsort((quad_layers, quad_frames))
+        segment_order = np.argsort(segment_frames, kind="stable")
+        quad_bounds = np.searchsorted(quad_frames[quad_order], np.arange(len(frames) + 1))
+        segment_bounds = np.searchsorted(segment_frames[segment_order], np.arange(len(frames) + 1))
+        scenes = []
+        for index, frame in enumerate(frames.tolist()):
+            quad_index = quad_order[quad_bounds[index]:quad_bounds[index + 1]]
+            segment_index = segment_order[segment_bounds[index]:segment_bounds[index + 1]]
+            scenes.append(FrameScene(
+                frame, quads[quad_index], quad_layers[quad_index], segments[segment_index],
+                segment_colors[segment_index]))
+        return scenes
+
+    def to_screen(self, points: np.ndarray) -> np.ndarray:
+        """该函数用来将 Arcaea 坐标变换为输出视频中的画面坐标。
+
+        Args:
+            points (np.ndarray): 形状为 (..., 3) 的 (x, y, z) 坐标，z 为与判定线之间的位置差。
+
+        Returns:
+            np.ndarray: 形状为 (..., 2) 的画面坐标，已按 SUBPIXEL_BITS 放大为整数。
+        """
+        screen = self.transform.transform(points[..., 0], points[..., 1], points[..., 2])
+        return np.rint(screen * self.scale).astype(np.int32)
+
+    def _clip(
+        self, notes: _NoteSet, candidates: np.ndarray, times: np.ndarray, frame_positions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """该函数用来找出一批帧中每一帧可见的 Note，并将其裁剪到可见范围内。
+
+        Args:
+            notes (_NoteSet): 需要裁剪的 Note。
+            candidates (np.ndarray): 在这批帧中可能可见的 Note 的编号。
+            times (np.ndarray): 每一帧的谱面时间。
+            frame_positions (np.ndarray): 每一帧的位置。
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: 可见的 (帧, Note) 组合中帧在批中的编号、Note 的编号，
+                以及形状为 (k, 2) 的可见部分在 Note 中的起止比例（由近到远）。
+        """
+        start_depths = notes.start_position[candidates][None, :] - frame_positions[:, None]
+        end_depths = notes.end_position[candidates][None, :] - frame_positions[:, None]
+        near, far = np.minimum(start_depths, end_depths), np.maximum(start_depths, end_depths)
+        # 尚未结束，且与可见范围有交集的 Note
+        frame_index, candidate_index = np.nonzero(
+            (notes.end_time[candidates][None, :] >= times[:, None]) & (far >= 0) & (near <= self.depth))
+        start_depths = start_depths[frame_index, candidate_index]
+        span = end_depths[frame_index, candidate_index] - start_depths
+        # 纵深随 Note 中的比例线性变化，求出纵深在 [0, depth] 中的比例区间
+        safe_span = np.where(span == 0, 1.0, span)
+        bounds = np.sort(np.stack((-start_depths / safe_span, (self.depth - start_depths) / safe_span), axis=1), axis=1)
+        bounds = np.clip(np.where((span == 0)[:, None], (0.0, 1.0), bounds), 0, 1)
+        return frame_index, candidates[candidate_index], bounds
+
+    @staticmethod
+    def _interpolate(notes: _NoteSet, note_index: np.ndarray, frame_positions: np.ndarray,
+                     bounds: np.ndarray) -> np.ndarray:
+        # 计算 Note 中给定比例处的 (x, y, z)，frame_positions 为每个 (帧, Note) 组合中帧的位置，结果形状为 bounds.shape + (3,)
+        columns = []
+        for start, end in ((notes.start_x[note_index], notes.end_x[note_index]),
+                           (notes.start_y[note_index], notes.end_y[note_index]),
+                           (notes.start_position[note_index] - frame_positions,
+                            notes.end_position[note_index] - frame_positions)):
+            columns.append(start[:, None] + (end - start)[:, None] * bounds)
+        return np.stack(columns, axis=-1)
+
+    def _quads(
+        self, notes: _NoteSet, candidates: np.ndarray, times: np.ndarray, frame_positions: np.ndarray, name: str
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        frame_index, note_index, bounds = self._clip(notes, candidates, times, frame_positions)
+        half_width = ARCTAP_HALF_WIDTH if name == "arctaps" else NOTE_HALF_WIDTH
+        depths = np.sort(self._interpolate(notes, note_index, frame_positions[frame_index], bounds)[..., 2], axis=1)
+        if name != "holds":
+            # Tap 和 Arctap 在纵深方向上具有一定厚度
+            half_thickness = NOTE_HALF_THICKNESS * self.depth
+            depths = depths + (-half_thickness, half_thickness)
+        near, far = np.clip(depths[:, 0], 0, self.depth), np.clip(depths[:, 1], 0, self.depth)
+        corner_x = notes.start_x[note_index, None] + np.array([-half_width, half_width, half_width, -half_width])
+        corner_y = np.broadcast_to(notes.start_y[note_index, None], corner_x.shape)
+        corner_z = np.stack((far, far, near, near), axis=1)
+        return frame_index, np.stack((corner_x, corner_y, corner_z), axis=-1), notes.style[note_index]
+
+    def _segments(
+        self, notes: _NoteSet, candidates: np.ndarray, times: np.ndarray, frame_positions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        frame_index, note_index, bounds = self._clip(notes, candidates, times, frame_positions)
+        points = self._interpolate(notes, note_index, frame_positions[frame_index], bounds)
+        points[..., 2] = np.clip(points[..., 2], 0, self.depth)
+        return frame_index, points, notes.style[note_index]
+
+
+class FrameRenderer:
+    """该类用来将一帧的图形绘制到帧缓冲区中。
+    """
+
+    def __init__(self, size: tuple[int, int], planner: ScenePlanner) -> None:
+        """该函数用来创建一个绘制器，并预先绘制所有帧共用的背景。
+
+        Args:
+            size (tuple[int, int]): 输出视频的宽和高（像素）。
+            planner (ScenePlanner): 用来计算轨道平面画面坐标的帧规划器。
+        """
+        width, height = size
+        self.line_width = max(1, round(height / 360))
+        self.background = np.empty((height, width, 3), dtype=np.uint8)
+        self.background[:] = BACKGROUND_COLOR
+        depth = planner.depth
+        track = planner.to_screen(np.array([
+            [X_RANGE[0], 0, depth], [X_RANGE[1], 0, depth], [X_RANGE[1], 0, 0], [X_RANGE[0], 0, 0]]))
+        cv2.fillConvexPoly(self.background, track, TRACK_COLOR, cv2.LINE_AA, SUBPIXEL_BITS)
+        lane_x = X_RANGE[0] + (X_RANGE[1] - X_RANGE[0]) * np.arange(1, 4) / 4
+        lanes = planner.to_screen(np.stack((
+            np.repeat(lane_x, 2), np.zeros(6), np.tile([0, depth], 3)), axis=1)).reshape(-1, 2, 2)
+        cv2.polylines(self.background, list(lanes), False, LANE_COLOR, 1, cv2.LINE_AA, SUBPIXEL_BITS)
+        cv2.polylines(
+            self.background, [track[2:]], False, JUDGE_LINE_COLOR, 2 * self.line_width, cv2.LINE_AA, SUBPIXEL_BITS)
+        self.background.flags.writeable = False
+
+    def render(self, scene: FrameScene, buffer: np.ndarray):
+        """该函数用来在帧缓冲区中绘制一帧。缓冲区中原有的内容将被覆盖。
+
+        Args:
+            scene (FrameScene): 该帧需要绘制的图形。
+            buffer (np.ndarray): 形状为 (高, 宽, 3) 的帧缓冲区。
+        """
+        np.copyto(buffer, self.background)
+        for layer, color in ((LAYER_HOLD, HOLD_COLOR), (LAYER_TAP, TAP_COLOR), (LAYER_ARCTAP, ARCTAP_COLOR)):
+            quads = scene.quads[scene.quad_layers == layer]
+            if len(quads):
+                cv2.fillPoly(buffer, list(quads), color, cv2.LINE_AA, SUBPIXEL_BITS)
+        for color_index in np.unique(scene.segment_colors).tolist():
+            segments = list(scene.segments[scene.segment_colors == color_index])
+            if color_index < 0:
+                cv2.polylines(buffer, segments, False, TRACE_COLOR, self.line_width, cv2.LINE_AA, SUBPIXEL_BITS)
+            else:
+                cv2.polylines(
+                    buffer, segments, False, ARC_COLORS[color_index], 4 * self.line_width, cv2.LINE_AA, SUBPIXEL_BITS)
+
+
+class PreviewEncoder:
+    """该类用来以流水线的方式将谱面解析结果绘制并编码为预览视频。
+    """
+
+    def __init__(
+        self, parsed_chart: ParsedChart, size: tuple[int, int] = (1920, 1080), frame_rate: float = None,
+        render_threads: int = None, ring_size: int = None, batch_frames: int = 32,
+        visible_time: float = DEFAULT_VISIBLE_TIME
+    ) -> None:
+        """该函数用来创建一个预览视频编码器。
+
+        Args:
+            parsed_chart (ParsedChart): 谱面解析结果。
+            size (tuple[int, int], optional): 输出视频的宽和高（像素）。
+            frame_rate (float, optional): 输出视频的帧率。未给出时使用转换设定中的帧率。
+            render_threads (int, optional): 绘制线程数。未给出时使用 CPU 核心数。
+            ring_size (int, optional): 帧缓冲环中缓冲区的数量，必须大于绘制线程数。未给出时为绘制线程数的 2 倍加 2。
+            batch_frames (int, optional): 规划线程每批计算的帧数。
+            visible_time (float, optional): 以基准 BPM 计算时，Note 从出现到抵达判定线的时间（毫秒）。
+
+        Raises:
+            ValueError: 当绘制线程数、缓冲区数量或每批帧数不合法时，抛出该异常。
+        """
+        context = parsed_chart.context
+        self.size = size
+        self.frame_rate = frame_rate or (context.frame_rate if context is not None else 60)
+        self.render_threads = render_threads or os.cpu_count() or 1
+        self.ring_size = ring_size or 2 * self.render_threads + 2
+        self.batch_frames = batch_frames
+        if self.render_threads < 1 or self.ring_size <= self.render_threads or batch_frames < 1:
+            raise ValueError(
+                f"绘制线程数和每批帧数必须为正整数，且缓冲区数量必须大于绘制线程数，而不是 {self.render_threads}、"
+                f"{batch_frames} 和 {self.ring_size}。")
+        song_total_time = context.song_total_time if context is not None else 0.0
+        self.total_frames = math.ceil(song_total_time * self.frame_rate / 1000)
+        self.planner = ScenePlanner(parsed_chart, size, self.frame_rate, visible_time)
+        self.renderer = FrameRenderer(size, self.planner)
+
+    def scenes(self) -> Iterator[FrameScene]:
+        """该函数用来按帧编号顺序产出每一帧需要绘制的图形。
+
+        Yields:
+            FrameScene: 一帧需要绘制的图形。
+        """
+        for start_frame in range(0, self.total_frames, self.batch_frames):
+            yield from self.planner.plan(start_frame, min(start_frame + self.batch_frames, self.total_frames))
+
+    def encode(self, path: str, fourcc: str = "mp4v") -> int:
+        """该函数用来将预览视频编码并写入文件。
+
+        Args:
+            path (str): 输出视频的文件路径。
+            fourcc (str, optional): 视频编码的 FourCC。
+
+        Raises:
+            OSError: 当无法创建视频文件时，抛出该异常。
+
+        Returns:
+            int: 写入的帧数。
+        """
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), self.frame_rate, self.size)
+        if not writer.isOpened():
+            raise OSError(f"无法以 {fourcc} 编码创建视频文件 {path}。")
+        try:
+            return self.run(writer)
+        finally:
+            writer.release()
+
+    def run(self, writer) -> int:
+        """该函数用来运行规划、绘制和写入三个阶段，并按帧编号顺序将每一帧交给 writer。
+
+        交给 writer 的帧缓冲区在 writer.write 返回后即会被重新使用，writer 不应保留对它的引用。
+
+        Args:
+            writer: 具有 write(frame) 方法的对象，例如 cv2.VideoWriter。
+
+        Raises:
+            Exception: 任一线程中发生的异常将在停止所有线程后重新抛出。
+
+        Returns:
+            int: 写入的帧数。
+        """
+        width, height = self.size
+        buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.ring_size)]
+        free_buffers = queue.Queue()
+        for buffer_index in range(self.ring_size):
+            free_buffers.put(buffer_index)
+        tasks = queue.Queue(maxsize=2 * self.render_threads)
+        rendered = queue.Queue(maxsize=self.ring_size)
+        stop = threading.Event()
+        errors = []
+
+        def put(target: queue.Queue, item) -> bool:
+            # 在队列已满时等待，直到放入成功或流水线被停止
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(source: queue.Queue):
+            # 在队列为空时等待，直到取得元素或流水线被停止
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            raise _PipelineStopped()
+
+        def produce():
+            try:
+                for scene in self.scenes():
+                    if not put(tasks, scene):
+                        return
+                for _ in range(self.render_threads):
+                    put(tasks, None)
+            except _PipelineStopped:
+                pass
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+                stop.set()
+
+        def render():
+            try:
+                while True:
+                    # 先取得缓冲区再取得帧，保证下一个需要写入的帧总能完成绘制
+                    buffer_index = get(free_buffers)
+                    scene = get(tasks)
+                    if scene is None:
+                        put(rendered, None)
+                        return
+                    self.renderer.render(scene, buffers[buffer_index])
+                    put(rendered, (scene.frame, buffer_index))
+            except _PipelineStopped:
+                pass
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+                stop.set()
+
+        threads = [threading.Thread(target=produce, name="preview-planner", daemon=True)] + [
+            threading.Thread(target=render, name=f"preview-render-{index}", daemon=True)
+            for index in range(self.render_threads)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        next_frame, finished_threads, pending = 0, 0, {}
+        try:
+            while finished_threads < self.render_threads:
+                item = get(rendered)
+                if item is None:
+                    finished_threads += 1
+                    continue
+                pending[item[0]] = item[1]
+                while next_frame in pending:
+                    buffer_index = pending.pop(next_frame)
+                    writer.write(buffers[buffer_index])
+                    free_buffers.put(buffer_index)
+                    next_frame += 1
+        except _PipelineStopped:
+            pass
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+        seconds = time.perf_counter() - start_time
+        logger.info("已写入预览视频的 %d 帧，耗时 %.1fs（%.1f 帧/秒）", next_frame, seconds, next_frame / max(seconds, 1e-9))
+        return next_frame
+
+
+class _PipelineStopped(Exception):
+    """流水线被停止时，用来结束正在等待队列的线程。
+    """
+
+
+def encode_preview(parsed_chart: ParsedChart, path: str, **settings) -> int:
+    """该函数用来将谱面解析结果绘制为预览视频并写入文件。
+
+    Args:
+        parsed_chart (ParsedChart): 谱面解析结果。
+        path (str): 输出视频的文件路径。
+        **settings: 其余的编码设定，参见 PreviewEncoder.__init__。
+
+    Returns:
+        int: 写入的帧数。
+    """
+    return PreviewEncoder(parsed_chart, **settings).encode(path)
@@ -0,0 +1,129 @@
+"""这个模块用来对批量转换流程进行测试。
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from arc2phi.batch import DONE, FAILED, MANIFEST_FILE, BatchConverter, convert_job, find_jobs, read_manifest
+from arc2phi.cli import main
+
+CHART_TEXT = "AudioOffset:0\n-\ntiming(0,100.00,4.00);\n(1000,1);\nhold(0,500,3);\n"
+
+
+def write_song(songs_dir: str, song_id: str, charts: dict[str, str]):
+    """该函数用来在曲包文件夹中写入一首测试用的歌曲。
+
+    Args:
+        songs_dir (str): 曲包文件夹路径。
+        song_id (str): 歌曲文件夹名。
+        charts (dict[str, str]): 键为谱面文件名，值为谱面内容。
+    """
+    song_dir = os.path.join(songs_dir, song_id)
+    os.makedirs(song_dir, exist_ok=True)
+    with open(os.path.join(song_dir, "base.ogg"), "wb"):
+        pass
+    with open(os.path.join(song_dir, "song_total_time.txt"), "w", encoding="utf-8") as total_time_file:
+        total_time_file.write("2000")
+    for chart_name, chart_text in charts.items():
+        with open(os.path.join(song_dir, chart_name), "w", encoding="utf-8") as chart_file:
+            chart_file.write(chart_text)
+
+
+def convert_or_exit(job, *args):
+    """该函数用来在子进程中模拟转换 crash.aff 时进程意外退出。其余任务稍作等待，使进程退出时它们仍在执行。
+    """
+    if job.chart.endswith("crash.aff"):
+        os._exit(1)
+    time.sleep(0.1)
+    return convert_job(job, *args)
+
+
+class TestBatchConverter(unittest.TestCase):
+    """该类用来对批量转换流程做单元测试。
+    """
+
+    def test_find_chart_and_audio_pairs(self):
+        """该函数用来测试能否在曲包文件夹中找到所有谱面与音频的组合。
+        """
+        with tempfile.TemporaryDirectory() as songs_dir:
+            write_song(songs_dir, "b_song", {"2.aff": CHART_TEXT})
+            write_song(songs_dir, "a_song", {"0.aff": CHART_TEXT, "3.aff": CHART_TEXT})
+            jobs = list(find_jobs(songs_dir, "output"))
+        self.assertEqual([job.chart for job in jobs], ["a_song/0.aff", "a_song/3.aff", "b_song/2.aff"])
+        self.assertEqual(os.path.basename(jobs[0].audio_path), "base.ogg")
+        self.assertEqual(jobs[2].output_dir, os.path.join("output", "b_song/2"))
+
+    def test_convert_resumes_from_manifest(self):
+        """该函数用来测试批量转换能否记录失败的任务，并在再次运行时跳过已完成且未被修改的谱面。
+        """
+        with tempfile.TemporaryDirectory() as songs_dir, tempfile.TemporaryDirectory() as output_dir:
+            write_song(songs_dir, "song", {"0.aff": CHART_TEXT, "1.aff": CHART_TEXT + "(0,9);\n"})
+            converter = BatchConverter(output_dir, workers=1)
+            results = converter.run(find_jobs(songs_dir, output_dir))
+            self.assertEqual({result.chart: result.status for result in results}, {
+                "song/0.aff": DONE, "song/1.aff": FAILED})
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "song", "0", "header.json")))
+            self.assertEqual(results[0].notes, 2)
+
+            # 修复失败的谱面后再次运行，只应重新转换该谱面
+            write_song(songs_dir, "song", {"1.aff": CHART_TEXT})
+            self.assertEqual(main(["convert", songs_dir, "-o", output_dir, "-j", "2"]), 0)
+            manifest = read_manifest(os.path.join(output_dir, MANIFEST_FILE))
+            self.assertEqual({chart: entry["status"] for chart, entry in manifest.items()}, {
+                "song/0.aff": DONE, "song/1.aff": DONE})
+            with open(os.path.join(output_dir, MANIFEST_FILE), "r", encoding="utf-8") as manifest_file:
+                self.assertEqual([json.loads(line)["chart"] for line in manifest_file], [
+                    "song/0.aff", "song/1.aff", "song/1.aff"])
+
+    def test_dead_worker_fails_only_its_own_job(self):
+        """该函数用来测试一个任务使子进程意外退出时，只有该任务记为失败，其余任务在新的进程池中完成。
+        """
+        charts = {f"{index}.aff": CHART_TEXT for index in range(7)}
+        charts["crash.aff"] = CHART_TEXT
+        with tempfile.TemporaryDirectory() as songs_dir, tempfile.TemporaryDirectory() as output_dir:
+            write_song(songs_dir, "song", charts)
+            with mock.patch("arc2phi.batch.convert_job", convert_or_exit):
+                results = BatchConverter(output_dir, workers=4).run(find_jobs(songs_dir, output_dir))
+            statuses = {result.chart: result.status for result in results}
+            self.assertEqual(len(results), 8)
+            self.assertEqual(statuses.pop("song/crash.aff"), FAILED)
+            self.assertEqual(set(statuses.values()), {DONE})
+            manifest = read_manifest(os.path.join(output_dir, MANIFEST_FILE))
+            self.assertEqual(manifest["song/crash.aff"]["diagnostics"], {})
+
+    def test_convert_exports_profile(self):
+        """该函数用来测试 --profile 能否将每个任务各阶段的统计写入 JSON 文件，且不写入任务清单。
+        """
+        with tempfile.TemporaryDirectory() as songs_dir, tempfile.TemporaryDirectory() as output_dir:
+            write_song(songs_dir, "song", {"0.aff": CHART_TEXT})
+            profile_path = os.path.join(output_dir, "profile.json")
+            self.assertEqual(
+                main(["-q", "convert", songs_dir, "-o", output_dir, "-j", "1", "--profile", profile_path]), 0)
+            with open(profile_path, "r", encoding="utf-8") as profile_file:
+                report = json.load(profile_file)
+            self.assertEqual(report["total"]["phases"]["parse_chart"]["notes"], 2)
+            self.assertIn("note_table", report["jobs"]["song/0.aff"]["phases"])
+            self.assertNotIn("profile", read_manifest(os.path.join(output_dir, MANIFEST_FILE))["song/0.aff"])
+
+    def test_lint_reports_charts_with_errors(self):
+        """该函数用来测试 lint 子命令能否检查曲包文件夹中的所有谱面，并在存在错误时以退出码 1 退出。
+        """
+        with tempfile.TemporaryDirectory() as songs_dir:
+            write_song(songs_dir, "song", {"0.aff": CHART_TEXT, "1.aff": CHART_TEXT + "(0,9);\nhold(0,500,3);\n"})
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(main(["-q", "lint", songs_dir]), 1)
+            self.assertIn("1.aff：1 个错误，1 个警告", output.getvalue())
+            self.assertIn("第 6 行", output.getvalue())
+            self.assertNotIn("0.aff", output.getvalue())
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(main(["-q", "lint", os.path.join(songs_dir, "song", "0.aff")]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
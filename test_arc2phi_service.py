@@ -0,0 +1,208 @@
+"""这个模块用来对谱面转换服务进行测试。
+"""
+import asyncio
+import io
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+
+from arc2phi.service import ConversionService, _ConversionCancelled
+from arcaea.assets import ConversionContext
+from arcaea.chartparser import parse_chart
+from phigros.chart.compiler import compile_chart
+
+CHART_TEXT = """AudioOffset:0
+-
+timing(0,120.00,4.00);
+(500,1);
+hold(1000,1500,4);
+arc(2000,2500,0.00,1.00,s,1.00,1.00,0,none,false)[arctap(2250)];
+timinggroup(noinput){
+timing(0,60.00,4.00);
+(1000,2);
+};
+timinggroup(){
+timing(0,240.00,4.00);
+arc(0,1000,0.00,1.00,si,1.00,0.00,0,none,true);
+};
+"""
+
+
+def decode_chunked(body: bytes) -> bytes:
+    """该函数用来还原以分块传输编码的响应体。
+    """
+    content = b""
+    while True:
+        size_line, body = body.split(b"\r\n", 1)
+        size = int(size_line, 16)
+        if size == 0:
+            return content
+        content, body = content + body[:size], body[size + 2:]
+
+
+async def send(address, method: str, path: str, body: bytes = b"", headers: dict = None, half_close: bool = False):
+    """该函数用来向服务发送一个请求，并读取完整的响应。half_close 为 True 时，发送请求后关闭写入端。
+
+    Returns:
+        tuple[int, dict, bytes]: 状态码、响应头（名称为小写）和响应体。
+    """
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address[:2])
+    lines = [f"{method} {path} HTTP/1.1", f"Content-Length: {len(body)}"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    if half_close:
+        writer.write_eof()
+    response = await reader.read()
+    writer.close()
+    head, response_body = response.split(b"\r\n\r\n", 1)
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    response_headers = dict(
+        (name.strip().lower(), value.strip()) for name, value in (line.split(":", 1) for line in header_lines))
+    if response_headers.get("transfer-encoding") == "chunked":
+        response_body = decode_chunked(response_body)
+    return int(status_line.split(" ")[1]), response_headers, response_body
+
+
+def abort(writer: asyncio.StreamWriter):
+    """该函数用来模拟客户端意外断开连接：以 RST 而不是 FIN 关闭连接。
+    """
+    writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    writer.transport.abort()
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    """该函数用来等待条件成立。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.01)
+
+
+class TestConversionService(unittest.IsolatedAsyncioTestCase):
+    """该类用来对谱面转换服务做单元测试。
+    """
+
+    async def test_convert_streams_chart_and_shares_caches(self):
+        """该函数用来测试服务返回的谱面是否与 compile_chart 相同，并在请求之间复用解析和编译结果。
+        """
+        expected = io.StringIO()
+        compile_chart(parse_chart(CHART_TEXT.splitlines(), ConversionContext(5000)), expected, 1.5)
+
+        async with ConversionService(workers=2, chunk_size=256, max_buffered_chunks=1) as service:
+            address = await service.start(port=0)
+            path = "/convert?song_total_time=5000&speed=1.5"
+            headers = {"X-Chart-Id": "song/2"}
+            status, response_headers, body = await send(address, "POST", path, CHART_TEXT.encode(), headers)
+            self.assertEqual(status, 200)
+            self.assertEqual(response_headers["x-rebuilt-groups"], "0,1,2")
+            self.assertEqual(json.loads(body), json.loads(expected.getvalue()))
+            misses = service.judge_lines.misses
+
+            edited = CHART_TEXT.replace("(1000,2);", "(1000,3);")
+            status, response_headers, body = await send(address, "POST", path, edited.encode(), headers)
+            self.assertEqual(status, 200)
+            self.assertEqual(response_headers["x-rebuilt-groups"], "1")
+            self.assertEqual(service.judge_lines.hits, 2)
+            self.assertEqual(service.judge_lines.misses, misses + 1)
+
+            status, _, body = await send(address, "POST", "/convert", b"AudioOffset:0\n-\n(0,9);\n")
+            self.assertEqual(status, 400)
+            self.assertIn("error", json.loads(body))
+            status, _, body = await send(address, "GET", "/status")
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(body)["requests"], {"requests": 3, "completed": 2, "failed": 1})
+
+        if os.name == "posix":
+            with tempfile.TemporaryDirectory() as socket_dir:
+                async with ConversionService(workers=1) as service:
+                    socket_path = await service.start(unix_path=os.path.join(socket_dir, "arc2phi.sock"))
+                    status, _, body = await send(
+                        socket_path, "POST", "/convert?song_total_time=5000&speed=1.5", CHART_TEXT.encode())
+                    self.assertEqual(status, 200)
+                    self.assertEqual(json.loads(body), json.loads(expected.getvalue()))
+
+    async def test_backpressure_and_cancellation(self):
+        """该函数用来测试服务在繁忙时拒绝新的请求，在客户端断开连接时取消等待中和执行中的转换，而只关闭写入端的客户端不被取消。
+        """
+        async with ConversionService(workers=1, max_pending=2, chunk_size=64, max_buffered_chunks=1) as service:
+            address = await service.start(port=0)
+            parse, compile_ = service._parse, service._compile
+            parsing_started, release_parsing = threading.Event(), threading.Event()
+            compile_stopped = threading.Event()
+
+            def blocked_parse(*args):
+                parsing_started.set()
+                release_parsing.wait(5)
+                return parse(*args)
+
+            def endless_compile(parsed_chart, speed, sink):
+                # 客户端不断开连接时，编译永远不会结束
+                try:
+                    while True:
+                        sink.write("x" * 64)
+                except _ConversionCancelled:
+                    compile_stopped.set()
+                    raise
+                finally:
+                    sink.finish()
+
+            service._parse = blocked_parse
+            request = ("POST /convert HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(CHART_TEXT)).encode()
+            request += CHART_TEXT.encode()
+            _, running = await asyncio.open_connection(*address[:2])
+            running.write(request)
+            await asyncio.get_running_loop().run_in_executor(None, parsing_started.wait, 5)
+            _, waiting = await asyncio.open_connection(*address[:2])
+            waiting.write(request)
+            await wait_until(lambda: service.status()["pending"] == 2)
+
+            status, response_headers, _ = await send(address, "POST", "/convert", CHART_TEXT.encode())
+            self.assertEqual(status, 503)
+            self.assertEqual(response_headers["retry-after"], "1")
+
+            abort(waiting)
+            await wait_until(lambda: service.stats["cancelled"] == 1)
+            abort(running)
+            await asyncio.sleep(0.1)
+            # 解析无法中途停止，在其结束之前该请求仍占用执行槽位
+            self.assertEqual(service.status()["pending"], 1)
+            self.assertEqual(service.stats["cancelled"], 1)
+            release_parsing.set()
+            await wait_until(lambda: service.stats["cancelled"] == 2 and service.status()["pending"] == 0)
+
+            service._parse, service._compile = parse, endless_compile
+            reader, writer = await asyncio.open_connection(*address[:2])
+            writer.write(request)
+            self.assertTrue((await reader.readuntil(b"\r\n\r\n")).startswith(b"HTTP/1.1 200"))
+            await reader.readexactly(64)
+            abort(writer)
+            await wait_until(lambda: service.stats["cancelled"] == 3 and service.status()["pending"] == 0)
+            self.assertTrue(compile_stopped.is_set())
+
+            # 发送请求后关闭写入端的客户端在解析期间只读到 EOF，不应被视为断开连接
+            service._parse, service._compile = blocked_parse, compile_
+            parsing_started.clear()
+            release_parsing.clear()
+            sending = asyncio.ensure_future(send(address, "POST", "/convert", CHART_TEXT.encode(), half_close=True))
+            await asyncio.get_running_loop().run_in_executor(None, parsing_started.wait, 5)
+            await asyncio.sleep(0.05)
+            release_parsing.set()
+            status, _, body = await sending
+            self.assertEqual(status, 200)
+            self.assertEqual(len(json.loads(body)["judgeLineList"]), 3)
+            self.assertEqual(service.stats["cancelled"], 3)
+            self.assertEqual(service.status()["requests"]["rejected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,21 @@
 """这个模块用来对 Arcaea 谱面解析器进行测试。
 """
+import contextlib
+import io
+import os
+import pickle
 import random
+import tempfile
 import unittest
 
+import numpy as np
+from arcfutil.aff.easing import slicer
+
 from arcaea.chartparser.__init__ import *
+from arcaea.assets.profiler import profile
+from arcaea.chartparser.cache import ChartCache
+from arcaea.chartparser.incremental import IncrementalParser
+from arcaea.chartparser.lint import lint_chart
 
 
 class TestArcChartParser(unittest.TestCase):
@@ -20,20 +32,26 @@ class TestArcChartParser(unittest.TestCase):
         """该函数用来测试 Arcaea 谱面解析器是否会对正的谱面音乐延迟进行处理。
         """
         offset_is_given = random.randint(0, 5000)
-        bytes_to_give = [f'AudioOffset: {offset_is_given}', '---', '(1,1)']
-        ArcChart(bytes_to_give)
-        with open('../base_info_offset.txt', 'r', encoding='utf-8') as offset_file:
-            offset_in_file = offset_file.read()
+        bytes_to_give = [f'AudioOffset: {offset_is_given}', '---', 'timing(0,3)', '(1,1)']
+        parsed_chart = parse_chart(bytes_to_give)
+        self.assertEqual(parsed_chart.offset, offset_is_given)
+        with tempfile.TemporaryDirectory() as export_dir:
+            parsed_chart.export(export_dir)
+            with open(os.path.join(export_dir, 'base_info_offset.txt'), 'r', encoding='utf-8') as offset_file:
+                offset_in_file = offset_file.read()
         self.assertEqual(int(offset_in_file), offset_is_given)
 
     def test_if_set_negative_offset_works(self):
         """该函数用来测试 Arcaea 谱面解析器是否会对负的谱面音乐延迟进行处理。
         """
         offset_is_given = random.randint(-5000, 0)
-        bytes_to_give = [f'AudioOffset: {offset_is_given}', '---', '(1,1)']
-        ArcChart(bytes_to_give)
-        with open('../base_info_offset.txt', 'r', encoding='utf-8') as offset_file:
-            offset_in_file = offset_file.read()
+        bytes_to_give = [f'AudioOffset: {offset_is_given}', '---', 'timing(0,3)', '(1,1)']
+        parsed_chart = parse_chart(bytes_to_give)
+        self.assertEqual(parsed_chart.offset, offset_is_given)
+        with tempfile.TemporaryDirectory() as export_dir:
+            parsed_chart.export(export_dir)
+            with open(os.path.join(export_dir, 'base_info_offset.txt'), 'r', encoding='utf-8') as offset_file:
+                offset_in_file = offset_file.read()
         self.assertEqual(int(offset_in_file), offset_is_given)
 
     def test_create_timing_group_only_0(self):
@@ -41,9 +59,7 @@ class TestArcChartParser(unittest.TestCase):
         """
         offset_is_given = random.randint(-5000, 0)
         bytes_to_give = [f'AudioOffset: {offset_is_given}', '---', 'timing(0,3)', '(1,1)', 'hold(2,3,4)']
-        ArcChart(bytes_to_give)
-        with open("../../timing_group_list.txt", "rb") as tg_list_file:
-            timing_group_list = pickle.load(tg_list_file)
+        timing_group_list = parse_chart(bytes_to_give).timing_group_list
         self.assertEqual(timing_group_list[0].tg_num, 0)
         self.assertEqual(timing_group_list[0].tap_list[0].trace, 1)
 
@@ -53,11 +69,11 @@ class TestArcChartParser(unittest.TestCase):
         """
         offset_is_given = random.randint(-5000, 0)
         bytes_to_give = [f'AudioOffset: {offset_is_given}', '---', 'timing(0,3)', '(1,1)', 'hold(2,3,4)',
-                         'timinggroup(){', 'timing(114514,1919810)', '(2,2)', '}', 'timinggroup(){',
-                         'timing(114514,1919810)', '(3,3)', '}']
-        ArcChart(bytes_to_give)
-        with open("timing_group_list.txt", "rb") as tg_list_file:
-            timing_group_list = pickle.load(tg_list_file)
+                         'timinggroup(){', 'timing(0,1919810)', '(2,2)', '}', 'timinggroup(){',
+                         'timing(0,1919810)', '(3,3)', '}']
+        with tempfile.TemporaryDirectory() as export_dir:
+            parse_chart(bytes_to_give).export(export_dir)
+            timing_group_list = ParsedChart.load(export_dir, mmap_mode=None).timing_group_list
         self.assertEqual(timing_group_list[0].tg_num, 0)
         self.assertEqual(timing_group_list[0].tap_list[0].trace, 1)
         self.assertEqual(timing_group_list[1].tg_num, 1)
@@ -65,14 +81,444 @@ class TestArcChartParser(unittest.TestCase):
         self.assertEqual(timing_group_list[2].tg_num, 2)
         self.assertEqual(timing_group_list[2].tap_list[0].trace, 3)
 
+    def test_parse_chart_has_no_file_side_effects(self):
+        """该函数用来测试解析谱面时是否不会写入任何文件。
+        """
+        with tempfile.TemporaryDirectory() as working_dir:
+            previous_dir = os.getcwd()
+            os.chdir(working_dir)
+            try:
+                parsed_chart = parse_chart(['AudioOffset:10', '-', 'timing(0,100)', '(1,1)', 'hold(2,3,4)'])
+                self.assertEqual(os.listdir(working_dir), [])
+            finally:
+                os.chdir(previous_dir)
+        self.assertEqual(len(parsed_chart), 2)
+        self.assertEqual(parsed_chart.notes[0].holds["trace"].tolist(), [4])
+
     def test_if_it_can_get_initial_position(self):
         """该函数用来测试 Arcaea 谱面解析器能否获得正确的 Note 初始位置。
         """
-        with open("song_total_time.txt", "w", encoding="utf-8") as total_time_file:
-            total_time_file.write("2")
-        test_note = NoteBase(1500, 1, {0:100, 1000:200})
+        test_note = NoteBase(1500, 1, {0:100, 1000:200}, ConversionContext(2))
         self.assertEqual(test_note.time_0_position, 200000 * 0.000001)
 
+    def test_bpm_timeline_position_and_time(self):
+        """该函数用来测试 BPM 时间轴能否正确地在时间与累计位置之间互相换算。
+        """
+        timeline = BpmTimeline({1000: 200, 0: 100, 3000: 0, 4000: 50})
+        self.assertAlmostEqual(timeline.position_at(1500), 0.2)
+        self.assertAlmostEqual(timeline.position_at(3500), 0.5)
+        self.assertAlmostEqual(timeline.time_at(0.2), 1500)
+        # 位于 BPM 为 0 的 BPM 组中的位置，应当返回最早到达该位置的时间。
+        self.assertAlmostEqual(timeline.time_at(timeline.position_at(3500)), 3000)
+        play_times = [0, 999, 1000, 2500, 3999, 4100]
+        positions = timeline.position_at(play_times)
+        for play_time, position in zip(play_times, positions):
+            self.assertAlmostEqual(position, timeline.position_at(play_time))
+
+    def test_notes_share_bpm_timeline(self):
+        """该函数用来测试同一个 Timing Group 中的所有 Note 是否共用同一个 BPM 时间轴。
+        """
+        timing_group = TimingGroup(
+            0, ['timing(0,100)', 'timing(1000,200)', '(1000,1)', '(1500,2)'], context=ConversionContext(2))
+        self.assertIs(timing_group.tap_list[0].bpm_timeline, timing_group.bpm_timeline)
+        self.assertIs(timing_group.tap_list[1].bpm_timeline, timing_group.bpm_timeline)
+        self.assertAlmostEqual(timing_group.tap_list[1].time_0_position, 0.2)
+
+    def test_pos_per_frame_is_shared_view(self):
+        """该函数用来测试 Note 的逐帧位置是否由 Timing Group 共享的位置表按需求得。
+        """
+        timeline = BpmTimeline({0: 100, 1: 200})
+        context = ConversionContext(2)
+        first_note, second_note = NoteBase(1, 1, timeline, context), NoteBase(2, 1, timeline, context)
+        self.assertEqual(len(first_note.pos_per_frame), 3)
+        self.assertAlmostEqual(first_note.pos_per_frame[0], 100 * 0.000001)
+        self.assertAlmostEqual(second_note.pos_per_frame[1], 200 * 0.000001)
+        self.assertIs(first_note.pos_per_frame.shared_positions, second_note.pos_per_frame.shared_positions)
+        self.assertFalse(first_note.pos_per_frame.shared_slice(0, 2).flags.owndata)
+        with self.assertRaises(KeyError):
+            first_note.pos_per_frame[3]
+
+    def test_note_table_columns(self):
+        """该函数用来测试 Timing Group 是否将 Note 按列保存，并能由其生成兼容旧接口的 Note 实例。
+        """
+        timing_group = TimingGroup(0, [
+            'timing(0,100)', '(1000,1)', '(1500,2)', 'hold(2000,3000,4)',
+            'arc(0,1000,0.00,1.00,si,0.00,1.00,0,none,false)[arctap(500),arctap(750)]'], context=ConversionContext(2))
+        self.assertEqual(timing_group.notes.taps["trace"].tolist(), [1, 2])
+        self.assertEqual(timing_group.notes.holds["end_time"].tolist(), [3000])
+        self.assertEqual(MOVEMENT_TYPES[timing_group.notes.arcs["movement_type"][0]], "si")
+        self.assertEqual(EASING_TYPES[timing_group.notes.arcs["movement_for_y"][0]], "s")
+        self.assertEqual(timing_group.notes.arctaps["arc"].tolist(), [0, 0])
+        self.assertEqual(len(timing_group.notes), 6)
+        self.assertFalse(timing_group.notes.arcs["is_trace"][0])
+        self.assertEqual(timing_group.hold_list[0].trace, 4)
+        self.assertEqual(timing_group.arc_list[0].arctap_list, [500, 750])
+        self.assertAlmostEqual(timing_group.arctap_list[0].x_position, slicer(500, 0, 1000, 0, 1, "si"))
+        restored_group = pickle.loads(pickle.dumps(timing_group))
+        self.assertEqual(restored_group.notes.taps.tolist(), timing_group.notes.taps.tolist())
+        self.assertEqual(restored_group.tap_list[1].trace, 2)
+
+    def test_tokenize_chart_lines(self):
+        """该函数用来测试词法分析器能否一次性取出谱面行中的全部字段，并在出错时给出行号。
+        """
+        tokens = list(tokenize([
+            'AudioOffset:-120', '-', 'timing(0,126.00,4.00);', '(1000,1);', 'hold(1000,2000,4);',
+            'arc(0,1000,0.00,1.00,siso,0.50,1.00,0,none,true)[arctap(250),arctap(500)];',
+            'timinggroup(noinput_fadingholds){', '  (500,2);', '};']))
+        self.assertEqual([token.kind for token in tokens], [
+            HEADER, SEPARATOR, TIMING, TAP, HOLD, ARC, GROUP_START, TAP, GROUP_END])
+        self.assertEqual(tokens[0].fields, ("AudioOffset", -120))
+        self.assertEqual(tokens[2].fields, (0.0, 126.0, 4.0))
+        self.assertEqual(tokens[5].fields, (0.0, 1000.0, 0.0, 1.0, "siso", 0.5, 1.0, 0, "none", True, (250.0, 500.0)))
+        self.assertEqual(tokens[6].fields, ("noinput", "fadingholds"))
+        self.assertEqual(tokens[7].line_num, 8)
+        with self.assertRaises(ArcChartException) as context:
+            list(tokenize(['timing(0,126.00,4.00);', 'arc(0,1000,broken);']))
+        self.assertIn("第 2 行", str(context.exception))
+
+    def test_arc_chart_groups_in_one_pass(self):
+        """该函数用来测试 Arcaea 谱面解析器能否在一次遍历中正确拆分 Timing Group 并读取其属性。
+        """
+        chart = ArcChart([
+            'AudioOffset:250', '-', 'timing(0,100.00,4.00);', '(1000,1);',
+            'timinggroup(noinput){', '  timing(0,200.00,4.00);', '  hold(0,500,3);', '};'], ConversionContext(2))
+        self.assertEqual(chart.offset, 250)
+        self.assertEqual(chart.timing_group_value_dict, {2: 4, 5: 8})
+        self.assertEqual(chart.timing_group_list[1].attributes, ("noinput",))
+        self.assertEqual(chart.timing_group_list[1].bpm_list_dict, {0.0: 200.0})
+        self.assertEqual(chart.timing_group_list[1].notes.holds["line"].tolist(), [7])
+
+    def test_iter_timing_groups_from_stream(self):
+        """该函数用来测试能否从文件中逐行读取谱面，并在每一个 Timing Group 闭合时立即产出。
+        """
+        chart_text = "AudioOffset:100\n-\ntiming(0,100.00,4.00);\n(1000,1);\ntiminggroup(){\n" \
+                     "  timing(0,100.00,4.00);\n  (500,2);\n};\ntiminggroup(){\n  timing(0,100.00,4.00);\n" \
+                     "  (600,3);\n};\n"
+        read_lines = []
+
+        def read_chart():
+            for line in io.StringIO(chart_text):
+                read_lines.append(line)
+                yield line
+
+        headers = {}
+        timing_groups = iter_timing_groups(read_chart(), headers, ConversionContext(2))
+        first_group = next(timing_groups)
+        self.assertEqual(first_group.tg_num, 0)
+        self.assertEqual(len(read_lines), 5)
+        self.assertEqual(headers["AudioOffset"], 100)
+        self.assertEqual([group.tg_num for group in timing_groups], [1, 2])
+        chart = ArcChart.from_stream(io.StringIO(chart_text), ConversionContext(2))
+        self.assertIsNone(chart.file_lines)
+        self.assertEqual(chart.timing_group_list[2].notes.taps["trace"].tolist(), [3])
+        with self.assertRaises(ArcChartException):
+            ArcChart.from_stream(io.StringIO(chart_text + "(700,4);\n"), ConversionContext(2))
+
+    def test_chart_cache_hit_and_eviction(self):
+        """该函数用来测试谱面解析结果缓存能否命中，并按最近使用时间淘汰。
+        """
+        chart_bytes = b"AudioOffset:10\n-\ntiming(0,100.00,4.00);\n(1000,1);\n" \
+                      b"timinggroup(){\n  timing(0,200.00,4.00);\n  hold(0,500,3);\n};\n"
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ChartCache(cache_dir)
+            context = ConversionContext(3000)
+            self.assertIsNone(cache.get(chart_bytes, context))
+            parsed_chart = cache.parse(chart_bytes, context)
+            cached_chart = cache.get(chart_bytes, context)
+            self.assertEqual(cached_chart.offset, 10)
+            # 命中缓存时的转换设定与解析时相同
+            self.assertEqual(cached_chart.context, parsed_chart.context)
+            self.assertEqual(cached_chart.context.audio_offset, 10)
+            self.assertEqual(cached_chart.timing_group_value_dict, parsed_chart.timing_group_value_dict)
+            self.assertEqual(cached_chart.notes[1].holds.tolist(), parsed_chart.notes[1].holds.tolist())
+            self.assertIsInstance(cached_chart.notes[1].holds, np.memmap)
+            cached_timeline = cached_chart.timing_group_list[1].bpm_timeline
+            self.assertIsInstance(cached_timeline.frame_positions(3000), np.memmap)
+            self.assertAlmostEqual(cached_timeline.position_at(1500), 0.3)
+            # 歌曲总时长不同时不应命中缓存
+            self.assertIsNone(cache.get(chart_bytes, ConversionContext(4000)))
+            cache.parse(chart_bytes, ConversionContext(4000))
+            self.assertEqual(len(cache.entries()), 2)
+            cache.max_bytes = cache.size() - 1
+            cache.evict()
+            self.assertEqual(len(cache.entries()), 1)
+            self.assertIsNotNone(cache.get(chart_bytes, ConversionContext(4000)))
+
+    def test_conversion_context_replaces_file_reads(self):
+        """该函数用来测试转换设定能否代替 song_total_time.txt，使不同时长的谱面在同一进程中同时解析。
+        """
+        with tempfile.TemporaryDirectory() as working_dir:
+            previous_dir = os.getcwd()
+            os.chdir(working_dir)
+            try:
+                chart_lines = ['AudioOffset:-30', '-', 'timing(0,100)', '(1,1)', 'hold(2,3,4)']
+                short_chart = parse_chart(chart_lines, ConversionContext(1000, frame_rate=30))
+                long_chart = parse_chart(chart_lines, ConversionContext(5000, audio_offset=0))
+            finally:
+                os.chdir(previous_dir)
+        self.assertEqual(len(short_chart.timing_group_list[0].tap_list[0].pos_per_frame), 1001)
+        self.assertEqual(len(long_chart.timing_group_list[0].tap_list[0].pos_per_frame), 5001)
+        self.assertEqual(short_chart.context.audio_offset, -30)
+        self.assertEqual(short_chart.timing_group_list[0].hold_list[0].context.frame_rate, 30)
+        self.assertEqual(long_chart.context.audio_offset, 0)
+
+    def test_batch_easing_matches_slicer(self):
+        """该函数用来测试批量缓动计算的结果是否与 arcfutil 的 slicer 一致。
+        """
+        play_times = np.linspace(100, 1100, 101)
+        for easing_code, easing_type in enumerate(EASING_TYPES):
+            expected = [slicer(play_time, 100, 1100, 0.25, 1.5, easing_type) for play_time in play_times]
+            np.testing.assert_allclose(slice_positions(play_times, 100, 1100, 0.25, 1.5, easing_code), expected)
+
+    def test_timing_group_arc_positions(self):
+        """该函数用来测试 Timing Group 能否一次性计算所有 Arc 的相对位置，并与单个 Arc 的计算结果一致。
+        """
+        timing_group = TimingGroup(0, [
+            'timing(0,100)', 'arc(0,10,0.00,1.00,sosi,0.00,1.00,0,none,false);',
+            'arc(20,24,1.00,0.00,b,1.00,0.50,1,none,true);'], context=ConversionContext(100))
+        positions = timing_group.arc_positions()
+        self.assertEqual(positions["arc"].tolist(), [0] * 11 + [1] * 5)
+        for arc_num, arc in enumerate(timing_group.arc_list):
+            arc.get_self_relative_position()
+            samples = positions["arc"] == arc_num
+            np.testing.assert_allclose(positions["x"][samples], arc.xy_relative_position[:, 0])
+            np.testing.assert_allclose(positions["y"][samples], arc.xy_relative_position[:, 1])
+            np.testing.assert_allclose(positions["z"][samples], arc.z_relative_position)
+        self.assertAlmostEqual(positions["x"][5], slicer(5, 0, 10, 0, 1, "so"))
+        self.assertAlmostEqual(positions["y"][5], slicer(5, 0, 10, 0, 1, "si"))
+
+    def test_adaptive_arc_keyframes_are_error_bounded(self):
+        """该函数用来测试自适应采样得到的关键帧在线性插值时是否不超过允许误差，且直线 Arc 只保留两个端点。
+        """
+        timing_group = TimingGroup(0, [
+            'timing(0,100)', 'arc(0,10000,0.00,1.00,s,0.00,1.00,0,none,true);',
+            'arc(0,5000,0.00,1.00,sisi,1.00,0.00,0,none,false);',
+            'arc(0,8000,-0.50,1.50,b,0.00,1.00,1,none,false);'], context=ConversionContext(10000))
+        keyframes = timing_group.arc_keyframes(tolerance=0.001)
+        dense_positions = timing_group.arc_positions(resolution=1)
+        self.assertEqual(keyframes["time"][keyframes["arc"] == 0].tolist(), [0, 10000])
+        for arc_num in range(3):
+            arc_keyframes = keyframes["arc"] == arc_num
+            dense_samples = dense_positions["arc"] == arc_num
+            self.assertLess(np.count_nonzero(arc_keyframes), np.count_nonzero(dense_samples) / 20)
+            for axis in ("x", "y"):
+                interpolated = np.interp(
+                    dense_positions["time"][dense_samples], keyframes["time"][arc_keyframes],
+                    keyframes[axis][arc_keyframes])
+                self.assertLessEqual(np.abs(interpolated - dense_positions[axis][dense_samples]).max(), 0.001)
+
+    def test_parallel_parsing_matches_serial(self):
+        """该函数用来测试多进程并行解析的结果是否与单进程解析的结果完全相同，且按 Timing Group 编号排列。
+        """
+        chart_lines = ['AudioOffset:40', '-', 'timing(0,100.00,4.00);', '(1000,1);']
+        for tg_num in range(1, 7):
+            chart_lines += [
+                'timinggroup(noinput){', f'  timing(0,{tg_num * 50}.00,4.00);',
+                f'  hold({tg_num},500,{tg_num % 4 + 1});',
+                f'  arc(0,{tg_num * 100},0.00,1.00,si,1.00,0.00,0,none,false)[arctap({tg_num * 50})];', '};']
+        context = ConversionContext(3000)
+        serial_chart = parse_chart(chart_lines, context)
+        parallel_chart = parse_chart(chart_lines, context, workers=3)
+        self.assertEqual(parallel_chart.timing_group_value_dict, serial_chart.timing_group_value_dict)
+        self.assertEqual(parallel_chart.context, serial_chart.context)
+        self.assertEqual([group.tg_num for group in parallel_chart.timing_group_list], list(range(7)))
+        for serial_group, parallel_group in zip(serial_chart.timing_group_list, parallel_chart.timing_group_list):
+            self.assertEqual(parallel_group.attributes, serial_group.attributes)
+            self.assertEqual(parallel_group.bpm_timeline, serial_group.bpm_timeline)
+            for name, array in serial_group.notes.to_arrays().items():
+                self.assertEqual(getattr(parallel_group.notes, name).tolist(), array.tolist())
+            np.testing.assert_array_equal(
+                parallel_group.bpm_timeline.frame_positions(3000), serial_group.bpm_timeline.frame_positions(3000))
+        with self.assertRaises(ArcChartException):
+            parse_chart(chart_lines[:-2] + ['  (100,7);', '};'], context, workers=2)
+        # 结构不规则的谱面退回到单进程解析，给出相同的异常
+        with self.assertRaises(ArcChartException):
+            parse_chart(chart_lines[:-1], context, workers=2)
+
+    def test_parsing_is_quiet_and_summarizes_out_of_range_notes(self):
+        """该函数用来测试解析谱面时默认不输出任何内容，并按 Timing Group 汇总超界 Note 的数量。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,100.00,4.00);', 'arc(0,100,-0.50,1.00,s,0.00,1.00,0,none,true);',
+            'timinggroup(){', '  timing(0,100.00,4.00);', '  arc(0,100,0.00,1.00,s,0.00,1.50,0,none,false);',
+            '  arc(0,100,0.00,2.00,s,0.00,1.50,0,none,false);', '};']
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            parsed_chart = parse_chart(chart_lines, ConversionContext(1000))
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(parsed_chart.diagnostics, {
+            0: {"Arc 横向坐标超界": 1}, 1: {"Arc 横向坐标超界": 1, "Arc 纵向坐标超界": 2}})
+        self.assertEqual(parsed_chart.diagnostics_report().count("\n"), 1)
+        with tempfile.TemporaryDirectory() as export_dir:
+            parsed_chart.save(export_dir)
+            self.assertEqual(ParsedChart.load(export_dir).diagnostics, parsed_chart.diagnostics)
+        with self.assertLogs("arcaea", "DEBUG") as logs:
+            parse_chart(chart_lines, ConversionContext(1000))
+        self.assertTrue(any("正在分析行 7 类型为 arc" in message for message in logs.output))
+        self.assertTrue(any("Timing Group 1：" in message for message in logs.output))
+
+    def test_profile_records_phases_per_timing_group(self):
+        """该函数用来测试转换流程统计能否按阶段和 Timing Group 记录耗时和计数，并在未启用时不记录任何内容。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,100.00,4.00);', '(1000,1);', 'hold(0,500,3);', 'timinggroup(){',
+            '  timing(0,100.00,4.00);', '  arc(0,100,0.00,1.00,si,0.00,1.00,0,none,false);', '};']
+        with profile(trace_memory=True) as profiler:
+            parsed_chart = parse_chart(chart_lines, ConversionContext(1000))
+            parsed_chart.timing_group_list[1].arc_keyframes()
+            self.assertAlmostEqual(parsed_chart.timing_group_list[0].tap_list[0].pos_per_frame[1000], 0)
+        report = profiler.to_dict()
+        self.assertEqual(report["phases"]["split_timing_groups"]["calls"], 3)
+        self.assertEqual(report["timing_groups"]["0"]["note_table"]["notes"], 2)
+        self.assertEqual(report["timing_groups"]["1"]["arc_easing"]["notes"], 1)
+        self.assertEqual(report["phases"]["note_front_position"]["calls"], 1)
+        self.assertEqual(report["phases"]["frame_positions"]["calls"], 1)
+        self.assertGreater(report["phases"]["note_table"]["peak_memory"], 0)
+        self.assertGreater(report["max_rss"], 0)
+        with profile() as idle_profiler:
+            pass
+        parse_chart(chart_lines, ConversionContext(1000))
+        self.assertEqual(idle_profiler.phases, {})
+
+    def test_visibility_index_matches_brute_force(self):
+        """该函数用来测试可见区间索引的查询和扫描结果是否与逐个检查所有区间的结果相同。
+        """
+        rng = np.random.default_rng(3)
+        starts = rng.uniform(0, 10000, 500)
+        ends = starts + np.where(rng.random(500) < 0.8, rng.uniform(0, 50, 500), rng.uniform(0, 5000, 500))
+        starts[:5] = -np.inf
+        index = IntervalIndex(starts, ends)
+        for start_time, end_time in [(0, None), (2500, None), (3000, 3100), (9990, 20000), (-100, -50)]:
+            end = start_time if end_time is None else end_time
+            np.testing.assert_array_equal(
+                index.query(start_time, end_time), np.flatnonzero((starts <= end) & (ends >= start_time)))
+        times = np.arange(0, 10000, 16.7)
+        for play_time, active in zip(times, index.sweep(times)):
+            np.testing.assert_array_equal(active, index.query(play_time))
+        with self.assertRaises(ValueError):
+            list(index.sweep([10, 5]))
+
+    def test_visible_notes_of_parsed_chart(self):
+        """该函数用来测试谱面中每个 Note 的可见区间是否由其位置和 BPM 时间轴求得。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,100.00,4.00);', 'timing(500,200.00,4.00);', '(1000,1);',
+            'hold(1000,3000,2);', 'arc(1500,2500,0.00,1.00,s,1.00,1.00,0,none,false)[arctap(2000)];', 'timinggroup(){',
+            '  timing(0,-100.00,4.00);', '  (3000,4);', '};']
+        parsed_chart = parse_chart(chart_lines, ConversionContext(4000))
+        self.assertEqual(parsed_chart.base_bpm, 100)
+        # 可见深度为 BPM 100 下的 800 毫秒，BPM 为 200 时 Tap 在 600 毫秒时出现
+        visible = parsed_chart.visible_notes(599)
+        self.assertEqual([len(visible[0][kind]) for kind in ("taps", "holds", "arcs", "arctaps")], [0, 0, 0, 0])
+        visible = parsed_chart.visible_notes(600)
+        self.assertEqual([len(visible[0][kind]) for kind in ("taps", "holds", "arcs", "arctaps")], [1, 1, 0, 0])
+        visible = parsed_chart.visible_notes(1001, 1600)
+        self.assertEqual([len(visible[0][kind]) for kind in ("taps", "holds", "arcs", "arctaps")], [0, 1, 1, 1])
+        # 含有负 BPM 的 Timing Group 中的 Note 始终视为可能可见，直到其结束
+        self.assertEqual(len(parsed_chart.visible_notes(0)[1]["taps"]), 1)
+        self.assertEqual(len(parsed_chart.visible_notes(3001)[1]["taps"]), 0)
+        timing_group = parsed_chart.timing_group_list[0]
+        depth = visible_depth(parsed_chart.base_bpm)
+        self.assertIs(timing_group.visibility_index(depth), timing_group.visibility_index(depth))
+        sweep = list(timing_group.visibility_index(depth).sweep([0, 600, 1200, 2600]))
+        self.assertEqual([len(frame["holds"]) for frame in sweep], [0, 1, 1, 1])
+
+    def test_incremental_parse_rebuilds_only_edited_groups(self):
+        """该函数用来测试增量解析是否只重新创建被修改的 Timing Group，且结果与完整解析相同。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,100.00,4.00);', '(1000,1);', 'timinggroup(){',
+            '  timing(0,100.00,4.00);', '  hold(0,500,3);', '};', 'timinggroup(noinput){', '  timing(0,50.00,4.00);',
+            '  (2000,4);', '};']
+        context = ConversionContext(3000)
+        parser = IncrementalParser(context)
+
+        def assert_same_as_full_parse(parsed_chart, lines):
+            expected = parse_chart(lines, context)
+            self.assertEqual(parsed_chart.timing_group_value_dict, expected.timing_group_value_dict)
+            self.assertEqual(parsed_chart.context, expected.context)
+            for group, expected_group in zip(parsed_chart.timing_group_list, expected.timing_group_list):
+                self.assertEqual(
+                    (group.tg_num, group.attributes, group.bpm_timeline),
+                    (expected_group.tg_num, expected_group.attributes, expected_group.bpm_timeline))
+                for name, array in expected_group.notes.to_arrays().items():
+                    np.testing.assert_array_equal(group.notes.to_arrays()[name], array)
+
+        first = parser.parse(chart_lines)
+        self.assertEqual(parser.rebuilt, [0, 1, 2])
+        assert_same_as_full_parse(first, chart_lines)
+        positions = first.timing_group_list[2].bpm_timeline.frame_positions(context.last_frame)
+
+        # 只修改 Timing Group 1，未修改的 Timing Group 及其逐帧位置表被直接复用
+        edited_lines = chart_lines[:6] + ['  hold(0,800,3);'] + chart_lines[7:]
+        edited = parser.parse(edited_lines)
+        self.assertEqual(parser.rebuilt, [1])
+        self.assertIs(edited.timing_group_list[2], first.timing_group_list[2])
+        self.assertIs(edited.timing_group_list[2].bpm_timeline.frame_positions(context.last_frame), positions)
+        assert_same_as_full_parse(edited, edited_lines)
+
+        # 插入行后，其后的 Timing Group 被复用，但其中 Note 的行号随之改变
+        inserted_lines = edited_lines[:7] + ['  (100,2);'] + edited_lines[7:]
+        inserted = parser.parse(inserted_lines)
+        self.assertEqual(parser.rebuilt, [1])
+        self.assertEqual(inserted.timing_group_list[2].notes.taps["line"].tolist(), [12])
+        assert_same_as_full_parse(inserted, inserted_lines)
+
+        # 解析失败时保留上一次的结果，结构不规则的谱面退回到完整解析
+        with self.assertRaises(ArcChartException):
+            parser.parse(inserted_lines[:7] + ['  (100,9);'] + inserted_lines[8:])
+        parser.parse(inserted_lines)
+        self.assertEqual(parser.rebuilt, [])
+        irregular = parser.parse(['timing(0,100.00,4.00);', '(1000,1);'])
+        self.assertEqual(parser.rebuilt, [0])
+        self.assertEqual(len(irregular), 1)
+
+    def test_bulk_validation_reports_every_issue(self):
+        """该函数用来测试批量校验能否在一次遍历中报告所有问题及其行号，并区分严格模式和宽松模式。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,100.00,4.00);', '(100,5);', 'hold(0,500,2);', 'hold(200,300,2);',
+            'hold(200,300,3);', 'hold(600,500,1);', 'arc(100,0,0.00,1.50,s,0.00,1.00,0,none,true)[arctap(50)];',
+            'broken', '(300,300);', 'timinggroup(){', '  timing(0,100.00,4.00);', '  hold(0,500,2);', '};']
+        report = lint_chart(chart_lines)
+        self.assertEqual([(issue.line, issue.issue) for issue in report.errors], [
+            (4, TRACE_OUT_OF_RANGE), (8, NEGATIVE_DURATION), (9, NEGATIVE_DURATION), (10, UNRECOGNIZED_LINE),
+            (11, TRACE_OUT_OF_RANGE)])
+        # 超出 int8 范围的轨道编号报告其原始值
+        self.assertEqual(report.errors[-1].detail, "轨道为 300")
+        self.assertEqual([(issue.line, issue.tg_num, issue.issue) for issue in report.warnings], [
+            (6, 0, OVERLAPPING_HOLDS), (9, 0, X_OUT_OF_RANGE), (9, 0, OUTSIDE_ARC)])
+        self.assertEqual(report.counts(WARNING)["Hold 与同一轨道上的 Hold 重叠"], 1)
+        with self.assertRaises(ArcChartException) as context:
+            lint_chart(chart_lines, strict=True)
+        self.assertIn("第 11 行", str(context.exception))
+
+        # 解析时以一个异常报告 Timing Group 中的所有错误，宽松模式下保留存在错误的 Note
+        valid_lines = chart_lines[:9] + chart_lines[11:]
+        with self.assertRaises(ArcChartException) as context:
+            parse_chart(valid_lines, ConversionContext(1000))
+        self.assertIn("3 个错误", str(context.exception))
+        timing_group = TimingGroup(0, valid_lines[2:9], context=ConversionContext(1000), strict=False)
+        self.assertEqual(len(timing_group.notes.holds), 4)
+        self.assertEqual(timing_group.diagnostics["Arctap 不在 Arc 的时间范围内"], 1)
+        self.assertEqual(len(timing_group.validate().errors), 3)
+        # 首尾相接的 Hold 不视为重叠
+        self.assertEqual(len(lint_chart(valid_lines[:3] + ['hold(0,500,2);', 'hold(500,600,2);'])), 0)
+
+    def test_bulk_validation_checks_timing_order(self):
+        """该函数用来测试批量校验能否报告缺失、不从 0 时刻开始和顺序颠倒的 timing 行及其行号。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,100.00,4.00);', 'timing(2000,50.00,4.00);', 'timing(1000,80.00,4.00);',
+            '(100,1);', 'timinggroup(){', '  timing(500,100.00,4.00);', '  (100,2);', '};', 'timinggroup(){',
+            '  (100,3);', '};']
+        report = lint_chart(chart_lines)
+        self.assertEqual([(issue.line, issue.tg_num, issue.issue) for issue in report.errors], [
+            (5, 0, TIMING_OUT_OF_ORDER), (8, 1, FIRST_TIMING_NOT_AT_ZERO), (12, 2, MISSING_TIMING)])
+        with self.assertRaises(ArcChartException) as context:
+            parse_chart(chart_lines[:6], ConversionContext(1000))
+        self.assertIn("第 5 行", str(context.exception))
+
 
 if __name__ == "__main__":
     unittest.main()
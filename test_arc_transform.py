@@ -0,0 +1,48 @@
+"""这个模块用来对透视变换进行测试。
+"""
+import unittest
+
+import cv2
+import numpy as np
+
+from arcaea.transform.returnPerspecitveTransform import (
+    POINT_SET_Y_0, POINT_SET_Y_HALF, X_RANGE, return_perspective_transform
+)
+
+
+class TestPerspectiveTransform(unittest.TestCase):
+    """该类用来对透视变换做单元测试。
+    """
+
+    def test_reference_quads_and_interpolation(self):
+        """该函数用来测试轨道平面的四个顶点是否被变换到已测得的画面坐标，且中间高度的顶点是否按高度线性插值。
+        """
+        transform = return_perspective_transform(depth=2.0)
+        self.assertIs(return_perspective_transform(depth=2.0), transform)
+        corners_x = np.array([X_RANGE[0], X_RANGE[1], X_RANGE[0], X_RANGE[1]])
+        corners_z = np.array([2.0, 2.0, 0.0, 0.0])
+        np.testing.assert_allclose(transform.transform(corners_x, 0, corners_z), POINT_SET_Y_0, atol=1e-3)
+        np.testing.assert_allclose(transform.transform(corners_x, 0.5, corners_z), POINT_SET_Y_HALF, atol=1e-3)
+        np.testing.assert_allclose(
+            transform.transform(corners_x, 0.25, corners_z), (POINT_SET_Y_0 + POINT_SET_Y_HALF) / 2, atol=1e-3)
+
+    def test_vectorized_transform_matches_per_point(self):
+        """该函数用来测试一次性变换多个坐标的结果是否与逐个使用 cv2.perspectiveTransform 的结果相同。
+        """
+        transform = return_perspective_transform()
+        rng = np.random.default_rng(0)
+        x_positions = rng.uniform(-0.5, 1.5, 200)
+        y_positions, z_positions = rng.uniform(0, 1, 200), rng.uniform(0, 1, 200)
+        screen = transform.transform(x_positions, y_positions, z_positions)
+        self.assertEqual(screen.shape, (200, 2))
+        for index in range(0, 200, 37):
+            matrix = transform.matrices[transform.level_of(y_positions[index])]
+            expected = cv2.perspectiveTransform(np.array([[[x_positions[index], z_positions[index]]]]), matrix)
+            np.testing.assert_allclose(screen[index], expected.reshape(2))
+        level_points = np.stack((x_positions, z_positions), axis=1)
+        np.testing.assert_allclose(
+            transform.transform_level(level_points, 30), transform.transform(x_positions, 0.3, z_positions))
+
+
+if __name__ == "__main__":
+    unittest.main()
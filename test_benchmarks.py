@@ -0,0 +1,60 @@
+"""这个模块用来对基准测试中的合成谱面生成器和结果比较进行测试。
+"""
+import unittest
+
+from arcaea.assets import ConversionContext
+from arcaea.chartparser import parse_chart
+from benchmarks.suite import STARTUP_MODULES, build_grid, compare, import_startup, run, run_parallel_case
+from benchmarks.synthetic import ChartSpec, generate_chart
+
+
+class TestBenchmarks(unittest.TestCase):
+    """该类用来对基准测试做单元测试。
+    """
+
+    def test_synthetic_chart_is_seeded_and_parsable(self):
+        """该函数用来测试合成谱面是否由随机种子唯一确定，且其中各种 Note 的数量与规格相符。
+        """
+        spec = ChartSpec(taps=50, holds=20, arcs=9, arctaps=30, timing_groups=3, timing_changes=4, duration=10000)
+        lines = generate_chart(spec)
+        self.assertEqual(generate_chart(spec), lines)
+        self.assertNotEqual(generate_chart(spec.replace(seed=1)), lines)
+        parsed_chart = parse_chart(lines, ConversionContext(spec.duration))
+        self.assertEqual(len(parsed_chart), spec.notes)
+        self.assertEqual([len(group.bpm_timeline) for group in parsed_chart.timing_group_list], [4, 4, 4])
+        self.assertEqual(sum(len(notes.arctaps) for notes in parsed_chart.notes), 30)
+
+    def test_run_and_compare_results(self):
+        """该函数用来测试基准测试的结果格式，以及比较时能否找出性能退化的项目。
+        """
+        base = ChartSpec(taps=20, holds=5, arcs=5, arctaps=5, duration=2000)
+        self.assertEqual([case[0] for case in build_grid({"notes": (1, 2)}, base)], ["notes-1", "notes-2"])
+        results = run({"duration": (1000, 2000)}, repeats=1, note_objects=False, parallel=False)
+        self.assertEqual([result["case"] for result in results["results"]], ["duration-1000", "duration-2000"])
+        self.assertIn("duration", results["scaling"]["parse"])
+        parse_time = results["results"][0]["metrics"]["parse"]["min"]
+        slower = {"schema": results["schema"], "results": [
+            {"case": "duration-1000", "metrics": {"parse": {"min": 2 * parse_time}}}]}
+        rows = compare(results, slower)
+        self.assertEqual(len(rows), 1)
+        self.assertTrue(rows[0][5])
+
+        parallel = run_parallel_case(base.replace(timing_groups=4), workers=(2,), repeats=1)
+        self.assertEqual(list(parallel["metrics"]), ["serial", "workers-2"])
+        self.assertGreater(parallel["speedup"]["workers-2"], 0)
+        rows = compare({**results, "parallel": parallel}, {**results, "parallel": parallel})
+        self.assertEqual({row[1] for row in rows if row[0] == "parallel"}, {"serial", "workers-2"})
+
+    def test_startup_defers_heavy_dependencies(self):
+        """该函数用来测试只需解析或编译谱面时，导入各入口模块不会加载 OpenCV 和进程池等重量级依赖，且导入耗时接近 NumPy 本身。
+        """
+        numpy_time = min(import_startup("numpy")[0] for _ in range(3))
+        for module in STARTUP_MODULES:
+            startup_times, loaded = zip(*(import_startup(module) for _ in range(3)))
+            self.assertEqual(loaded[0], [], module)
+            # NumPy 是 Note 列表的基础，其余部分的导入耗时应远小于 NumPy
+            self.assertLess(min(startup_times), 2 * numpy_time + 0.1, module)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""这个模块用来对 Phigros 谱面编译器进行测试。
+"""
+import io
+import json
+import unittest
+
+import numpy as np
+
+from arcaea.assets import ConversionContext
+from arcaea.assets.profiler import profile
+from arcaea.chartparser import parse_chart
+from benchmarks.synthetic import ChartSpec, generate_chart
+from phigros.chart.compiler import (
+    END_TIME, NOTE_DRAG, NOTE_HOLD, NOTE_TAP, compile_chart, compile_stream, merge_constant_events
+)
+
+CHART_TEXT = """AudioOffset:250
+-
+timing(0,120.00,4.00);
+timing(1000,120.00,4.00);
+timing(2000,240.00,4.00);
+(500,1);
+hold(1000,1500,4);
+arc(2000,2500,0.00,1.00,s,1.00,1.00,0,none,false)[arctap(2250)];
+arc(2500,3000,1.00,1.00,s,1.00,1.00,0,none,false);
+arc(3000,3500,0.00,0.50,s,1.00,1.00,0,none,true)[arctap(3500)];
+timinggroup(noinput){
+timing(0,60.00,4.00);
+(1000,2);
+};
+"""
+
+
+class TestChartCompiler(unittest.TestCase):
+    """该类用来对 Phigros 谱面编译器做单元测试。
+    """
+
+    def test_compile_judge_lines(self):
+        """该函数用来测试编译得到的判定线、速度事件和 Note 是否与谱面一致。
+        """
+        parsed_chart = parse_chart(CHART_TEXT.splitlines(), ConversionContext(5000))
+        output = io.StringIO()
+        stats = compile_chart(parsed_chart, output)
+        chart = json.loads(output.getvalue())
+        self.assertEqual((chart["formatVersion"], chart["offset"]), (3, 0.25))
+        self.assertEqual(stats.judge_lines, len(chart["judgeLineList"]))
+        self.assertEqual(stats.notes, chart["numOfNotes"])
+
+        line = chart["judgeLineList"][0]
+        self.assertEqual(line["bpm"], 120.0)
+        # 两个 BPM 为 120 的 BPM 组合并为一个速度事件，时间单位为 1/32 拍
+        self.assertEqual([(event["startTime"], event["endTime"], event["value"]) for event in line["speedEvents"]], [
+            (0.0, 128.0, 1.0), (128.0, END_TIME, 2.0)])
+        self.assertEqual(line["speedEvents"][1]["floorPosition"], 2.0)
+        notes = line["notesAbove"]
+        self.assertEqual([note["type"] for note in notes], [
+            NOTE_TAP, NOTE_HOLD, NOTE_DRAG, NOTE_TAP, NOTE_DRAG, NOTE_DRAG, NOTE_TAP])
+        self.assertEqual([note["time"] for note in notes], [32.0, 64.0, 128.0, 144.0, 160.0, 192.0, 224.0])
+        self.assertEqual((notes[0]["positionX"], notes[1]["positionX"]), (-3.0, 3.0))
+        self.assertEqual((notes[1]["holdTime"], notes[1]["floorPosition"]), (32.0, 1.0))
+        # 位于黑线上的 Arctap 取黑线在该时间的横向坐标
+        self.assertEqual(notes[6]["positionX"], 0.0)
+        self.assertEqual(notes[6]["floorPosition"], 2.0 + 2 * 1.5)
+        # noinput 的 Timing Group 只保留不可见的判定线
+        self.assertEqual(chart["judgeLineList"][1]["notesAbove"], [])
+        self.assertEqual(chart["judgeLineList"][1]["judgeLineDisappearEvents"][0]["start"], 0.0)
+
+    def test_stream_output_scales_with_timing_changes(self):
+        """该函数用来测试流式编译的结果是否与先解析后编译的结果相同，且输出大小与歌曲时长无关。
+        """
+        spec = ChartSpec(taps=40, holds=10, arcs=10, arctaps=10, timing_groups=2, timing_changes=8, duration=10000)
+        lines = generate_chart(spec)
+        compiled = io.StringIO()
+        compile_chart(parse_chart(lines, ConversionContext(spec.duration)), compiled)
+        streamed = io.StringIO()
+        stats = compile_stream(iter(lines), streamed, ConversionContext(spec.duration))
+        self.assertEqual(streamed.getvalue(), compiled.getvalue())
+        self.assertLessEqual(stats.speed_events, 2 * 8)
+
+        longer = io.StringIO()
+        compile_chart(parse_chart(lines, ConversionContext(spec.duration * 100)), longer)
+        self.assertEqual(len(longer.getvalue()), len(compiled.getvalue()))
+
+    def test_drag_keyframes_follow_sampling_resolution(self):
+        """该函数用来测试 Arc 转换为 Drag 时是否遵守转换设定中的最小采样间隔，并计入 Arc 缓动阶段的统计。
+        """
+        chart_lines = [
+            'AudioOffset:0', '-', 'timing(0,120.00,4.00);', 'arc(0,1000,0.00,1.00,si,1.00,1.00,0,none,false);']
+        drag_counts = []
+        for sampling_resolution in (1, 500):
+            context = ConversionContext(2000, arc_tolerance=0.001, sampling_resolution=sampling_resolution)
+            output = io.StringIO()
+            with profile() as profiler:
+                compile_chart(parse_chart(chart_lines, context), output)
+            self.assertEqual(profiler.to_dict()["timing_groups"]["0"]["arc_easing"]["notes"], 1)
+            notes = json.loads(output.getvalue())["judgeLineList"][0]["notesAbove"]
+            drag_counts.append(len(notes))
+        self.assertGreater(drag_counts[0], 3)
+        self.assertEqual(drag_counts[1], 3)
+
+    def test_merge_constant_events(self):
+        """该函数用来测试只有相邻且所有取值都相同的事件才会被合并。
+        """
+        start_times = np.array([0, 1, 2, 3, 4])
+        values = np.array([[0.5, 0.2], [0.5, 0.2], [0.5, 0.3], [0.5, 0.2], [0.5, 0.2]])
+        np.testing.assert_array_equal(merge_constant_events(start_times, values), [0, 2, 3])
+        np.testing.assert_array_equal(merge_constant_events(start_times, [1, 1, 1, 1, 1]), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
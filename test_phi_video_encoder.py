@@ -0,0 +1,94 @@
+"""这个模块用来对预览视频编码器进行测试。
+"""
+import hashlib
+import os
+import tempfile
+import unittest
+
+import cv2
+
+from arcaea.assets import ConversionContext
+from arcaea.chartparser import parse_chart
+from benchmarks.synthetic import ChartSpec, generate_chart
+from phigros.video.encoder import LAYER_HOLD, LAYER_TAP, PreviewEncoder
+
+CHART_TEXT = """AudioOffset:0
+-
+timing(0,120.00,4.00);
+(1000,1);
+hold(1000,1500,3);
+arc(500,1500,0.00,1.00,s,1.00,1.00,0,none,false);
+"""
+
+
+class FrameHashWriter:
+    """该类用来代替 cv2.VideoWriter，记录每一帧内容的哈希值。
+    """
+
+    def __init__(self) -> None:
+        self.hashes = []
+
+    def write(self, frame):
+        """该函数用来记录一帧的哈希值。
+
+        Args:
+            frame (np.ndarray): 帧缓冲区。
+        """
+        self.hashes.append(hashlib.sha1(frame.tobytes()).hexdigest())
+
+
+class TestPreviewEncoder(unittest.TestCase):
+    """该类用来对预览视频编码器做单元测试。
+    """
+
+    def test_planner_visibility(self):
+        """该函数用来测试 Note 是否只在抵达判定线前的可见时间内出现，且 Hold 在结束前保持可见。
+        """
+        parsed_chart = parse_chart(CHART_TEXT.splitlines(), ConversionContext(2000))
+        encoder = PreviewEncoder(parsed_chart, size=(320, 180), frame_rate=10, visible_time=500)
+        scenes = {scene.frame: scene for scene in encoder.scenes()}
+        self.assertEqual(len(scenes), encoder.total_frames)
+        self.assertEqual(list(scenes[4].quad_layers), [])
+        self.assertEqual(list(scenes[6].quad_layers), [LAYER_HOLD, LAYER_TAP])
+        self.assertEqual(list(scenes[12].quad_layers), [LAYER_HOLD])
+        self.assertEqual(list(scenes[16].quad_layers), [])
+        self.assertGreater(len(scenes[7].segments), 0)
+        self.assertEqual(len(scenes[16].segments), 0)
+
+    def test_threaded_frames_are_ordered(self):
+        """该函数用来测试多个绘制线程复用帧缓冲区时，写入的帧是否与单线程绘制的结果完全相同。
+        """
+        spec = ChartSpec(taps=60, holds=10, arcs=10, arctaps=10, duration=3000)
+        parsed_chart = parse_chart(generate_chart(spec), ConversionContext(spec.duration))
+        serial, threaded = FrameHashWriter(), FrameHashWriter()
+        frames = PreviewEncoder(parsed_chart, (320, 180), render_threads=1, ring_size=2, batch_frames=7).run(serial)
+        PreviewEncoder(parsed_chart, (320, 180), render_threads=4, ring_size=5, batch_frames=16).run(threaded)
+        self.assertEqual(frames, 180)
+        self.assertEqual(threaded.hashes, serial.hashes)
+        self.assertGreater(len(set(serial.hashes)), 1)
+        with self.assertRaises(ValueError):
+            PreviewEncoder(parsed_chart, render_threads=2, ring_size=2)
+
+    def test_encode_video_file(self):
+        """该函数用来测试能否将预览视频写入文件，以及绘制线程中的异常能否传递给调用者。
+        """
+        parsed_chart = parse_chart(CHART_TEXT.splitlines(), ConversionContext(1000))
+        encoder = PreviewEncoder(parsed_chart, size=(320, 180), frame_rate=30, render_threads=2)
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "preview.mp4")
+            self.assertEqual(encoder.encode(path), 30)
+            capture = cv2.VideoCapture(path)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 30)
+            self.assertEqual(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 320)
+            capture.release()
+
+        def failing_render(scene, buffer):
+            raise RuntimeError(f"第 {scene.frame} 帧绘制失败")
+
+        encoder.renderer.render = failing_render
+        with self.assertRaises(RuntimeError):
+            encoder.run(FrameHashWriter())
+
+
+if __name__ == "__main__":
+    unittest.main()